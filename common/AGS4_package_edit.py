@@ -19,9 +19,22 @@
 # https://gitlab.com/ags-data-format-wg/ags-python-library
 
 
+import csv
+import functools
+import re
+from collections.abc import Mapping, MutableMapping
+
+# Data descriptors that start a new row in an AGS4 file
+_DATA_DESCRIPTORS = ('"GROUP"', '"HEADING"', '"UNIT"', '"TYPE"', '"DATA"')
+
+# DATA row with every field in double quotes, no quotes within the fields and a <CR><LF> ending,
+# which cannot break any of the line rules other than Rule 1 and the field count of Rule 4
+_CLEAN_DATA_LINE = re.compile(r'"DATA"(?:,"[^"\r\n]*")*\r\n')
+
+
 # Read functions #
 
-def AGS4_to_dict(filepath_or_buffer, encoding='utf-8', get_line_numbers=False, rename_duplicate_headers=True):
+def AGS4_to_dict(filepath_or_buffer, encoding='utf-8', get_line_numbers=False, rename_duplicate_headers=True, get_repair_report=False):
     """Load all the data in a AGS4 file to a dictionary of dictionaries.
     This GROUP in the AGS4 file is assigned its own dictionary.
 
@@ -41,6 +54,9 @@ def AGS4_to_dict(filepath_or_buffer, encoding='utf-8', get_line_numbers=False, r
         Rename duplicate headers if found. Neither AGS4 tables nor Pandas
         dataframes allow duplicate headers, therefore a number will be appended
         to duplicates to make them unique. (default True)
+    get_repair_report : bool
+        Return a list with details of every row that was repaired by joining
+        misplaced line-breaks onto the line above (default False)
 
     Returns
     -------
@@ -53,35 +69,29 @@ def AGS4_to_dict(filepath_or_buffer, encoding='utf-8', get_line_numbers=False, r
     line_numbers : dict (Only if get_line_numbers=True)
         Dictionary with the starting line numbers of GROUP and HEADING rows. This is only
         required for checking a .ags file with 'check_file() function.
+    repairs : list (Only if get_repair_report=True)
+        List of dictionaries with the 'line', 'group', 'heading' and number of
+        'lines_joined' for each repaired row. The source file is never modified.
     """
 
-    from rich import print as rprint
-
-    if _is_file_like(filepath_or_buffer):
-        f = filepath_or_buffer
-        close_file = False
-    else:
-        # Read file with errors="replace" to catch UnicodeDecodeErrors
-        f = open(filepath_or_buffer, "r", encoding=encoding, errors="replace")
-        close_file = True
+    f, close_file = _open_file(filepath_or_buffer, encoding=encoding)
 
-    try:
+    data = {}
 
-        data = {}
+    # dict to save and output the headings. This is not really necessary
+    # for the read AGS4 function but will be needed to write the columns
+    # of pandas dataframes when writing them back to AGS4 files.
+    # (The HEADING column needs to be the first column in order to preserve
+    # the AGS data format. Other columns in certain groups have a
+    # preferred order as well)
 
-        # dict to save and output the headings. This is not really necessary
-        # for the read AGS4 function but will be needed to write the columns
-        # of pandas dataframes when writing them back to AGS4 files.
-        # (The HEADING column needs to be the first column in order to preserve
-        # the AGS data format. Other columns in certain groups have a
-        # preferred order as well)
+    headings = {}
+    line_numbers = {}
+    repairs = []
 
-        headings = {}
-        line_numbers = {}
+    try:
 
-        for i, line in enumerate(f, start=1):
-            temp = line.rstrip().split('","')
-            temp = [item.strip('"') for item in temp]
+        for i, temp in _iter_records(f, rename_duplicate_headers=rename_duplicate_headers, repairs=repairs):
 
             if temp[0] == 'GROUP':
                 group = temp[1]
@@ -94,33 +104,6 @@ def AGS4_to_dict(filepath_or_buffer, encoding='utf-8', get_line_numbers=False, r
 
             elif temp[0] == 'HEADING':
 
-                # Catch HEADER rows with duplicate entries as it will result in a dictionary with
-                # arrays of unequal lengths and cause a ValueError when trying to convert to a
-                # Pandas DataFrame
-                if len(temp) != len(set(temp)):
-
-                    if rename_duplicate_headers is False:
-                        raise AGS4Error(f"HEADER row in {group} (Line {i}) has duplicate entries")
-
-                    rprint(f"[yellow]  WARNING: HEADER row in [bold]{group}[/bold] (Line {i}) has duplicate entries.[/yellow]")
-
-                    # Rename duplicate headers by appending a number
-                    item_count = {}
-
-                    for i, item in enumerate(temp):
-                        if item not in item_count:
-                            item_count[item] = {'i': i, 'count': 0}
-                        else:
-                            item_count[item]['i'] = i
-                            item_count[item]['count'] += 1
-                            count = item_count[item]['count']
-
-                            temp[i] = temp[i]+'_'+str(item_count[item]['count'])
-
-                            rprint(f'[blue]  INFO: Duplicate column {item} found and renamed as {item}_{count}.[/blue]')
-                            rprint('[blue]        Automatically renamed columns do not conform to AGS4 Rules 19a and 19b.[/blue]')
-                            rprint('[blue]        Therefore, please review the data and rename or drop duplicate columns as appropriate.[/blue]')
-
                 # Store HEADING line number
                 line_numbers[group]['HEADING'] = i
 
@@ -133,31 +116,14 @@ def AGS4_to_dict(filepath_or_buffer, encoding='utf-8', get_line_numbers=False, r
                 for item in temp:
                     data[group][item] = []
 
-            elif temp[0] in ['TYPE', 'UNIT', 'DATA']:
+            else:
 
                 # Append line number
                 if get_line_numbers is True:
                     temp.append(i)
 
-                # Check whether line has the same number of entries as the number of headings in the group
-                # If not, print error and exit
-                if len(temp) != len(headings[group]):
-                    # instead of raising an error and exiting, print the line number and the error along with its heading and data
-                    # then, attempt to concatenate the error line with the line below and continue after removing all line breaks in "DATA", "UNIT" and "TYPE" rows
-                    line_data = temp[0:len(temp)]
-                    error_heading = headings[group][len(line_data)-1]
-                    error_data = str(line_data).rsplit(',',1)[1]
-                    rprint(f"[red]  Error: Line {i} does not have the same number of entries as the HEADING row in [bold]{group}[/bold].[/red]")
-                    rprint(AGS4Error(f"Line {i} does not have the same number of entries as the HEADING row in {group}."))
-                    rprint(f"{error_heading} data has a line break after: {error_data}")
-                    # use the {i} variable to get the row of data the error occured on, and pass it as an argument to a new function
-                    return concat_linebreak(line=int(i), filepath_or_buffer=filepath_or_buffer)                    
-
-                for i in range(0, len(temp)):
-                    data[group][headings[group][i]].append(temp[i])
-
-            else:
-                continue
+                for j in range(0, len(temp)):
+                    data[group][headings[group][j]].append(temp[j])
 
     except Exception as e:
         print(e)
@@ -165,38 +131,175 @@ def AGS4_to_dict(filepath_or_buffer, encoding='utf-8', get_line_numbers=False, r
         if close_file:
             f.close()
 
+    output = (data, headings)
+
     if get_line_numbers is True:
-        return data, headings, line_numbers
+        output += (line_numbers,)
 
-    return data, headings
+    if get_repair_report is True:
+        output += (repairs,)
 
-def concat_linebreak(line,filepath_or_buffer,encoding='utf-8'):
-    # now {line} has been passed as an argument, open the readonly file and create a string from the row the error occured on with the row above it
-    try:
-        with open(filepath_or_buffer, "r", encoding=encoding, errors="replace") as f:
-            # get the line in the file 
-            raw_data = f.readlines()
-            fix = str(raw_data[line-1] + raw_data[line])
-            fix = str(fix.replace("\n", ""))
-            # need to append a carriage return at the end of the string, or the fixed line will append to the end of another line
-            fix = fix + "\n"
-            f.close()
+    return output
 
-        with open(filepath_or_buffer, "w", encoding=encoding, errors="replace") as f:
-            raw_data.insert(line+1, fix)
-            # need to delete the two lines that have been concatenated, and insert the fixed line
-            del raw_data[line]
-            del raw_data[line-1]
-            f.writelines(raw_data)
-            f.close()
-    except Exception as e:
-        print(e)
-        pass
-    finally:
-        return AGS4_to_dict(filepath_or_buffer, encoding='utf-8', get_line_numbers=False, rename_duplicate_headers=True)
 
+def _iter_records(lines, rename_duplicate_headers=True, repairs=None, start=1, group='', headings=None):
+    """Iterate over the GROUP, HEADING, UNIT, TYPE and DATA rows of an AGS4 file.
+
+    Rows that have fewer entries than the HEADING row because of a misplaced
+    line-break are repaired in a single pass by joining the following lines
+    onto them with a look-ahead buffer, so the source is only read once and is
+    never modified.
+
+    Parameters
+    ----------
+    lines : iterable
+        Lines of the AGS4 file (e.g. an open file or StringIO)
+    rename_duplicate_headers: bool
+        Rename duplicate headers if found (default True)
+    repairs : list, optional
+        List to which details of repaired rows are appended
+    start : int
+        Line number of the first line in 'lines' (default 1)
+    group : str
+        Name of the GROUP that the first line belongs to, for blocks of lines
+        that start part way through a GROUP (default '')
+    headings : list, optional
+        HEADING row of the GROUP that the first line belongs to
+
+    Yields
+    ------
+    tuple
+        Line number and list of entries in the row
+    """
+
+    from rich import print as rprint
+
+    headings = list(headings) if headings is not None else []
+    lookahead = None
+    lines = enumerate(lines, start=start)
+
+    while True:
+        # A line read ahead while repairing the previous row is the start of the next row
+        if lookahead is not None:
+            i, line = lookahead
+            lookahead = None
+        else:
+            try:
+                i, line = next(lines)
+            except StopIteration:
+                return
+
+        temp = _split_line(line)
+
+        if temp[0] == 'GROUP':
+            group = temp[1]
+            headings = []
+
+        elif temp[0] == 'HEADING':
+
+            temp = _rename_duplicate_headings(temp, group, i, rename_duplicate_headers=rename_duplicate_headers)
+
+            # Keep a copy as the caller is free to modify the yielded list
+            headings = list(temp)
+
+        elif temp[0] in ['TYPE', 'UNIT', 'DATA']:
+
+            # Rows with fewer entries than the HEADING row have a line-break in one of their fields,
+            # so keep joining the lines below until the row is complete or a new row begins
+            lines_joined = 0
+            error_heading = headings[len(temp)-1] if 0 < len(temp) <= len(headings) else ''
+
+            while len(temp) < len(headings):
+                lookahead = next(lines, None)
+
+                if lookahead is None or lookahead[1].startswith(_DATA_DESCRIPTORS):
+                    break
+
+                line = line.rstrip('\r\n') + lookahead[1]
+                temp = _split_line(line)
+                lookahead = None
+                lines_joined += 1
+
+            if lines_joined > 0:
+                rprint(f"[yellow]  WARNING: Line {i} in [bold]{group}[/bold] has a line-break in {error_heading}, "
+                       f"joined {lines_joined} line(s) onto it.[/yellow]")
+
+                if repairs is not None:
+                    repairs.append({'line': i, 'group': group, 'heading': error_heading, 'lines_joined': lines_joined})
+
+            # Check whether line has the same number of entries as the number of headings in the group
+            # If not, print error and exit
+            if len(temp) != len(headings):
+                rprint(f"[red]  Error: Line {i} does not have the same number of entries as the HEADING row in [bold]{group}[/bold].[/red]")
+                raise AGS4Error(f"Line {i} does not have the same number of entries as the HEADING row in {group}.")
+
+        else:
+            continue
+
+        yield i, temp
+
+
+def _rename_duplicate_headings(temp, group, i, rename_duplicate_headers=True):
+    """Append a number to duplicate entries in a HEADING row so that they are unique."""
+
+    from rich import print as rprint
+
+    # Catch HEADER rows with duplicate entries as it will result in a dictionary with
+    # arrays of unequal lengths and cause a ValueError when trying to convert to a
+    # Pandas DataFrame
+    if len(temp) != len(set(temp)):
+
+        if rename_duplicate_headers is False:
+            raise AGS4Error(f"HEADER row in {group} (Line {i}) has duplicate entries")
+
+        rprint(f"[yellow]  WARNING: HEADER row in [bold]{group}[/bold] (Line {i}) has duplicate entries.[/yellow]")
 
-def AGS4_to_dataframe(filepath_or_buffer, encoding='utf-8', get_line_numbers=False, rename_duplicate_headers=True):
+        # Rename duplicate headers by appending a number
+        item_count = {}
+
+        for j, item in enumerate(temp):
+            if item not in item_count:
+                item_count[item] = {'i': j, 'count': 0}
+            else:
+                item_count[item]['i'] = j
+                item_count[item]['count'] += 1
+                count = item_count[item]['count']
+
+                temp[j] = temp[j]+'_'+str(item_count[item]['count'])
+
+                rprint(f'[blue]  INFO: Duplicate column {item} found and renamed as {item}_{count}.[/blue]')
+                rprint('[blue]        Automatically renamed columns do not conform to AGS4 Rules 19a and 19b.[/blue]')
+                rprint('[blue]        Therefore, please review the data and rename or drop duplicate columns as appropriate.[/blue]')
+
+    return temp
+
+
+def _split_line(line):
+    """Split a line from an AGS4 file into a list of entries.
+
+    Double-double quotes within a field (AGS4 Rule 5) are returned as a single
+    double quote and fields containing '","' are kept whole. Lines in which
+    every field is quoted and contains no quotes of its own are split with
+    str.split(), the rest are passed to the csv module.
+    """
+
+    line = line.rstrip()
+
+    if line[:1] != '"':
+        # Not a valid AGS4 line, so keep the entries as they are
+        return [item.strip('"') for item in line.split('","')]
+
+    temp = line[1:-1].split('","')
+
+    # Each field in a clean line adds exactly two quotes
+    if line[-1:] == '"' and line.count('"') == 2*len(temp):
+        return temp
+
+    return next(csv.reader((line,), strict=False))
+
+
+def AGS4_to_dataframe(filepath_or_buffer, encoding='utf-8', get_line_numbers=False, rename_duplicate_headers=True, get_repair_report=False,
+                      engine='columnar', workers=None, typed=False):
     """Load all the tables in a AGS4 file to a Pandas dataframes. The output is
     a Python dictionary of dataframes with the name of each AGS4 table (i.e.
     GROUP) as the primary key.
@@ -204,7 +307,8 @@ def AGS4_to_dataframe(filepath_or_buffer, encoding='utf-8', get_line_numbers=Fal
     Parameters
     ----------
     filepath_or_buffer : str, StringIO
-        Path to AGS4 file or any file like object (open file or StringIO)
+        Path to AGS4 file (*.ags, *.ags.gz, *.zip or a member of a zip archive,
+        see 'open_AGS4()') or any file like object (open file or StringIO)
     show_line_number : bool
         Add line number column to each table (default False)
     get_line_numbers : bool
@@ -214,6 +318,24 @@ def AGS4_to_dataframe(filepath_or_buffer, encoding='utf-8', get_line_numbers=Fal
         Rename duplicate headers if found. Neither AGS4 tables nor Pandas
         dataframes allow duplicate headers, therefore a number will be appended
         to duplicates to make them unique. (default True)
+    get_repair_report : bool
+        Return a list with details of every row that was repaired by joining
+        misplaced line-breaks onto the line above (default False)
+    engine : str
+        'columnar' writes each GROUP straight into preallocated column buffers
+        that are handed to Pandas without copying, 'dict' builds the tables
+        from the output of 'AGS4_to_dict()' (default 'columnar')
+    workers : int, optional
+        Number of processes used to parse the file with the 'columnar' engine.
+        The file is split at GROUP boundaries, and large groups into blocks of
+        rows, which are parsed in a process pool. Only used when a file path is
+        given (default None, parse in this process)
+    typed : bool
+        Store DATA entries in columns with a DP, SF or SCI TYPE as floats when
+        formatting the float by its TYPE gives back the original text, so
+        numbers are parsed once on loading (see 'type_numeric_columns()').
+        Other entries keep their text, so the file can be written back
+        unchanged (default False)
 
     Returns
     -------
@@ -226,633 +348,2575 @@ def AGS4_to_dataframe(filepath_or_buffer, encoding='utf-8', get_line_numbers=Fal
     line_numbers : dict (Only if get_line_numbers=True)
         Dictionary with the starting line numbers of GROUP and HEADING rows. This is only
         required for checking a .ags file with 'check_file() function.
+    repairs : list (Only if get_repair_report=True)
+        List of dictionaries with details of each repaired row (see 'AGS4_to_dict()')
     """
 
     from pandas import DataFrame
 
-    # Extract AGS4 file into a dictionary of dictionaries
-    # A dictionary with group line numbers is returned, in addition to data and headings, for checking purposes
-    if get_line_numbers is True:
-        data, headings, line_numbers = AGS4_to_dict(filepath_or_buffer, encoding=encoding, get_line_numbers=get_line_numbers,
-                                                    rename_duplicate_headers=rename_duplicate_headers)
-
-        # Convert dictionary of dictionaries to a dictionary of Pandas dataframes
-        df = {}
-        for key in data:
-            df[key] = DataFrame(data[key])
+    if engine == 'columnar' and workers is not None and not _is_file_like(filepath_or_buffer) and not is_compressed(filepath_or_buffer):
+        return _AGS4_to_columns_parallel(filepath_or_buffer, workers, encoding=encoding, get_line_numbers=get_line_numbers,
+                                         rename_duplicate_headers=rename_duplicate_headers, get_repair_report=get_repair_report,
+                                         typed=typed)
 
-        return df, headings, line_numbers
+    if engine == 'columnar':
+        return _AGS4_to_columns(filepath_or_buffer, encoding=encoding, get_line_numbers=get_line_numbers,
+                                rename_duplicate_headers=rename_duplicate_headers, get_repair_report=get_repair_report,
+                                typed=typed)
 
-    # Otherwise only the data and the headings are returned
-    data, headings = AGS4_to_dict(filepath_or_buffer, encoding=encoding,
-                                  rename_duplicate_headers=rename_duplicate_headers)
+    # Extract AGS4 file into a dictionary of dictionaries
+    # A dictionary with group line numbers and a repair report may be returned, in addition to data and headings
+    data, headings, *extra = AGS4_to_dict(filepath_or_buffer, encoding=encoding, get_line_numbers=get_line_numbers,
+                                          rename_duplicate_headers=rename_duplicate_headers, get_repair_report=get_repair_report)
 
     # Convert dictionary of dictionaries to a dictionary of Pandas dataframes
     df = {}
     for key in data:
         df[key] = DataFrame(data[key])
 
-    return df, headings
+        if typed is True and key in headings:
+            df[key] = type_numeric_columns(df[key])
 
+    return (df, headings, *extra)
 
-def AGS4_to_excel(input_file, output_file, encoding='utf-8', rename_duplicate_headers=True, sort_tables=False):
-    """Load all the tables in a AGS4 file to an Excel spreasheet.
 
-    Parameters
-    ----------
-    input_file : str
-        Path to AGS4 file
-    output_file : str
-        Path to Excel file
-    rename_duplicate_headers: bool
-        Rename duplicate headers if found. Neither AGS4 tables nor Pandas
-        dataframes allow duplicate headers, therefore a number will be appended
-        to duplicates to make them unique. (default False)
-    sort_tables : bool
-        Alphabetically sort worksheets in Excel file. (default False)
-        WARNING: The original order of groups will be lost and cannot be
-        restored when .xlsx file is converted back to .ags.
+def _AGS4_to_columns(filepath_or_buffer, encoding='utf-8', get_line_numbers=False, rename_duplicate_headers=True, get_repair_report=False,
+                     start=1, typed=False):
+    """Load all the tables in a AGS4 file to Pandas dataframes by writing the
+    rows of each GROUP straight into a column buffer (see '_ColumnBuffer').
 
-    Returns
-    -------
-    Excel file populated with data from the input AGS4 file.
+    This avoids building a Python list per heading and copying them into a
+    dataframe, so peak memory is roughly the size of the parsed strings. The
+    parameters and return values are the same as 'AGS4_to_dataframe()', with
+    'start' giving the line number of the first line that is read.
     """
 
-    from pandas import ExcelWriter
-    from rich import print as rprint
-    from openpyxl.utils import get_column_letter
-
-    # Extract AGS4 file into a dictionary of dictionaries
-    tables, headings = AGS4_to_dataframe(input_file, encoding=encoding,
-                                         rename_duplicate_headers=rename_duplicate_headers)
-
-    # Create list of tables that can be sorted
-    if sort_tables is True:
-        list_of_tables = sorted(tables.keys())
-        rprint('[yellow]WARNING: Worksheets in Excel file will be sorted alphabetically.[/yellow]')
-        rprint('[yellow]         The original group order will not be restored if this .xlsx file is converted back to .ags.[/yellow]')
-    else:
-        list_of_tables = tables.keys()
+    f, close_file = _open_file(filepath_or_buffer, encoding=encoding)
 
-    # Exit if there is no AGS4 tables in the input file
-    if len(list_of_tables) == 0:
-        rprint(f'[red]  ERROR: No valid AGS4 data found in input file.[/red]')
-        raise AGS4Error('No valid AGS4 data found in input file.')
+    buffers = {}
+    headings = {}
+    line_numbers = {}
+    repairs = []
 
-    # Write to Excel file
-    with ExcelWriter(output_file, engine='openpyxl') as writer:
-        for key in list_of_tables:
-            rprint(f'[green]Writing data from... [bold]{key}[/bold][/green]')
-
-            # Check table size and issue warning for large files that could crash the program
-            if 25000 < tables[key].shape[0] < 100000:
-                rprint(f'[blue]  INFO: {key} has {tables[key].shape[0]} rows, so it will take about a minute to export.[/blue]')
-            elif tables[key].shape[0] > 100000:
-                rprint(f'[yellow]  WARNING: {key} has {tables[key].shape[0]} rows, so it may take a few minutes to export.[/yellow]')
-                rprint('[yellow]           The program will terminate if it runs out of memory in the process.[/yellow]')
+    try:
 
-            tables[key].to_excel(writer, sheet_name=key, index=False)
+        for i, temp in _iter_records(f, rename_duplicate_headers=rename_duplicate_headers, repairs=repairs, start=start):
 
-            # Update column widths in xlxs file to fit contents
-            for i, col in enumerate(tables[key], start=1):
-                # 13 < colummn_width < 75 characters (approximately)
-                max_width = min(max(13, tables[key][col].map(len).max() + 1), 75)
+            if temp[0] == 'GROUP':
+                group = temp[1]
+                buffers[group] = None
 
-                writer.sheets[key].column_dimensions[get_column_letter(i)].width = max_width
+                # Store GROUP line number
+                # (A default 'HEADING' entry is added to avoid KeyErrors in case of missing
+                # HEADING rows)
+                line_numbers[group] = {'GROUP': i, 'HEADING': '-'}
 
+            elif temp[0] == 'HEADING':
 
-# Write functions #
+                # Store HEADING line number
+                line_numbers[group]['HEADING'] = i
 
-def dataframe_to_AGS4(data, headings, filepath, mode='w', index=False, encoding='utf-8', warnings=True):
-    """Write Pandas dataframes that have been extracted using
-    'AGS4_to_dataframe()' function back to an AGS4 file.
+                buffers[group] = _ColumnBuffer(temp, line_numbers=get_line_numbers)
 
-    Parameters
-    ----------
-    data : dict
-        Dictionary of Pandas dataframes (output from 'AGS4_to_dataframe()')
-    headings : dict
-        Dictionary of lists containing AGS4 headings in the correct order (e.g.
-        output from 'AGS4_to_dataframe()') Columns can be dropped as well from
-        the exported file using this option. An empty dictionary {} can be
-        passed to export data without explicitly ensuring column order.
-    filepath : str
-        Path to output file
-    mode : str, optional
-        Option to write ('w') or append ('a') data ('w' by default)
-    index : bool, optional
-        Include the index column when writing to file. (False by default)
-        WARNING: The output will not be a valid AGS4 file if set to True.
+                if get_line_numbers is True:
+                    temp = temp + ['line_number']
 
-    Returns
-    -------
-    AGS4 file with data in the dictionary of dataframes that is input.
-    """
+                headings[group] = temp
 
-    from rich import print as rprint
+            else:
+                buffers[group].append(temp, i)
 
-    # Open file and write/append data
-    with open(filepath, mode, newline='', encoding=encoding) as f:
-        for key in data:
-            # First make copy of table to avoid unexpected side-effects
-            df = data[key].copy()
-
-            # Take care of an edge case where quoted text is present in a field.
-            # The to_csv function automatically adds an extra pair of quotes
-            # around any quoted strings that is encountered and there is no way
-            # work around it as of Pandas v1.1.5. Therefore, double-double
-            # quotes required by AGS4 Rule 5 are changed to single-double quotes
-            # before the to_csv function is called. This ensures that the output
-            # file has the quoted string in double-double quotes.
-            for col in df.select_dtypes(include='object'):
-                # Loop through columns that contain strings, find entries with '""', and replace
-                # them with '""
-                mask = df[col].str.contains('""', na=False)
-                df.loc[mask, :] = df.loc[mask, :].apply(lambda x: x.str.replace('""', '"'))
+    except Exception as e:
+        print(e)
+    finally:
+        if close_file:
+            f.close()
 
-            try:
-                columns = headings[key]
+    df = {}
+    for key, buffer in buffers.items():
+        df[key] = buffer.to_dataframe(typed=typed) if buffer is not None else _empty_dataframe()
 
-                rprint(f'[green]Writing data from... [bold]{key}[/bold][green]')
-                f.write('"GROUP"'+","+'"'+key+'"'+'\r\n')
-                df.to_csv(f, index=index, quoting=1, columns=columns, lineterminator='\r\n', encoding=encoding)
-                f.write("\r\n")
+    output = (df, headings)
 
-            except KeyError:
+    if get_line_numbers is True:
+        output += (line_numbers,)
 
-                rprint(f'[green]Writing data from... [bold]{key}[/bold][green]')
+    if get_repair_report is True:
+        output += (repairs,)
 
-                if warnings is True:
-                    rprint(f"[yellow]  WARNING: Input 'headings' dictionary does not have a entry named [bold]{key}[/bold].[/yellow]")
-                    rprint(f"[italic yellow]           All columns in the {key} table will be exported in the default order.[/italic yellow]")
-                    rprint("[italic yellow]           Please check column order and ensure AGS4 Rule 7 is still satisfied.[/italic yellow]")
+    return output
 
-                f.write('"GROUP"'+","+'"'+key+'"'+'\r\n')
-                df.to_csv(f, index=index, quoting=1, lineterminator='\r\n', encoding=encoding)
-                f.write("\r\n")
 
+def AGS4_to_chunks(filepath_or_buffer, chunk_rows=50000, encoding='utf-8', get_line_numbers=False, rename_duplicate_headers=True,
+                   repairs=None, typed=False):
+    """Read a AGS4 file in batches of rows, for files that are too large to
+    load with 'AGS4_to_dataframe()'.
 
-def excel_to_AGS4(input_file, output_file, format_numeric_columns=True, dictionary=None):
-    """Export AGS4 data in Excel file to .ags file.
+    The file is read line by line and only the rows of the current batch are
+    held in memory. Misplaced line-breaks are repaired and duplicate headers
+    are renamed in the same way as 'AGS4_to_dict()'.
 
     Parameters
     ----------
-    input_file : str
-        Path to Excel file (Note: Each GROUP should be in a separate worksheet.
-        e.g. output from AGS4.AGS4_to_excel)
-    output_file : str
-        Path to AGS4 file
-    format_numeric_columns : bool, optional
-        Format numeric columns to match specified TYPE
-    dictionary : str
-        Filepath to dictionary if the UNIT and TYPE data in tables need to be
-        overridden.
+    filepath_or_buffer : str, StringIO
+        Path to AGS4 file or any file like object (open file or StringIO)
+    chunk_rows : int
+        Maximum number of rows in each dataframe (default 50000)
+    get_line_numbers : bool
+        Add line number column to each dataframe (default False)
+    rename_duplicate_headers: bool
+        Rename duplicate headers if found (default True)
+    repairs : list, optional
+        List that details of each repaired row (see 'AGS4_to_dict()') are
+        added to as they are found
+    typed : bool
+        Store numeric entries as floats (see 'AGS4_to_dataframe()')
+        (default False)
+
+    Yields
+    ------
+    group : str
+        Name of the GROUP
+    headings : list
+        Headings of the GROUP, in the same form as the output of
+        'AGS4_to_dataframe()'
+    df : Pandas DataFrame
+        Batch of up to 'chunk_rows' rows. Every GROUP gives at least one
+        dataframe, and its first one holds the UNIT and TYPE rows. The index
+        of each dataframe starts from zero.
+
+    Raises
+    ------
+    AGS4Error
+        If a row cannot be repaired to match its HEADING row. The rows read
+        before it are yielded first.
 
-    Returns
-    -------
-    AGS4 file with data from the input Excel file.
+    e.g.
+    >>from python_ags4 import AGS4
+    >>
+    >>for group, headings, df in AGS4.AGS4_to_chunks('Data.ags', chunk_rows=100000):
+    >>    counts[group] = counts.get(group, 0) + (df.HEADING == 'DATA').sum()
     """
 
-    from pandas import read_excel
-    from rich import print as rprint
+    f, close_file = _open_file(filepath_or_buffer, encoding=encoding)
 
-    # Read data from Excel file in to DataFrames
-    tables = read_excel(input_file, sheet_name=None, engine='openpyxl')
+    try:
+        for group, headings, df in _iter_chunks(f, chunk_rows=chunk_rows, rename_duplicate_headers=rename_duplicate_headers,
+                                                repairs=repairs, typed=typed, get_line_numbers=get_line_numbers):
+            if get_line_numbers is True and headings:
+                headings = headings + ['line_number']
 
-    # Not all worksheets in the spreadsheet may contain valid AGS4 tables, therefore
-    # initiate variable to keep track of worksheets to export
-    valid_tables = []
+            yield group, list(headings), df
 
-    for key, df in tables.items():
-        # Assume that only worksheets with a 'HEADING' column contain valid AGS4 data
-        if 'HEADING' in df:
-            valid_tables.append(key)
-        else:
-            rprint(f'[yellow]  WARNING: Worksheet [bold]{key}[/bold] dropped as it does not have a HEADING column.[/yellow]')
-            continue
+    finally:
+        if close_file:
+            f.close()
 
-        # List column names that don't conform to Rule 19 (using a negative look-ahead regex)
-        for col_name in df.filter(regex=r'^(?!HEADING|^[A-Z0-9]{4}_[A-Z0-9]{1,4}$)', axis='columns'):
-            rprint(f'[yellow]  WARNING: Column [bold]{col_name}[/bold] dropped as name does not conform to AGS4 Rule 19.[/yellow]')
 
-        # Drop columns that don't conform to Rule 19
-        df = df.filter(regex=r'HEADING|^[A-Z0-9]{4}_[A-Z0-9]{1,4}$', axis='columns')
+def _iter_chunks(lines, chunk_rows=None, grow=False, rename_duplicate_headers=True, repairs=None, start=1, typed=False,
+                 get_line_numbers=False):
+    """Parse the lines of an AGS4 file into dataframes of at most 'chunk_rows'
+    rows each.
 
-        # Drop rows that are not 'UNIT', 'TYPE', or 'DATA'
-        df = df.loc[df.HEADING.isin(['UNIT', 'TYPE', 'DATA']), :]
+    Every GROUP gives at least one dataframe, and its first one holds the UNIT
+    and TYPE rows. The index of each dataframe starts from zero.
 
-        # Finally format numeric column if required
-        if format_numeric_columns is True:
-            rprint(f'[green]Formatting columns in... [bold]{key}[/bold][/green]')
-            tables[key] = convert_to_text(df, dictionary=dictionary)
+    Parameters
+    ----------
+    lines : iterable
+        Lines of an AGS4 file (e.g. open file or StringIO)
+    chunk_rows : int, optional
+        Maximum number of rows in each dataframe (default None, one dataframe
+        per GROUP)
+    grow : bool
+        Double the number of rows after each dataframe, so that the first rows
+        are available quickly while large groups are read in few chunks
+        (default False)
+
+    The remaining parameters are the same as for '_iter_records()' and
+    'AGS4_to_dataframe()'.
+
+    Yields
+    ------
+    tuple
+        GROUP name, list of headings and Pandas dataframe
+    """
 
-    # Export dictionary of DataFrames to AGS4 file
-    if len(valid_tables) == 0:
-        rprint(f'[red]  ERROR: No valid AGS4 data found in input file. Please see warning messages above.[/red]')
-    else:
-        dataframe_to_AGS4({key: tables[key] for key in valid_tables}, {}, output_file, warnings=False)
+    group = None
+    headings = []
+    buffer = None
+    types = None
+    yielded = False
+    size = chunk_rows
 
+    records = _iter_records(lines, rename_duplicate_headers=rename_duplicate_headers, repairs=repairs, start=start)
 
-# Formatting functions #
+    try:
+        for i, temp in records:
 
-def convert_to_numeric(dataframe):
-    """The AGS4_to_dataframe() function extracts the data from an AGS4 file and
-    puts each table into a Pandas DataFrame as text. This function reads the
-    TYPE row and coverts the columns with data types 0DP, 1DP, 2DP, 3DP, 4DP,
-    5DP, and MC into numerical data. This allows the data to be plotted and
-    used in calculations/formulas.
+            if temp[0] in ['GROUP', 'HEADING'] and buffer is not None and (buffer.rows > 0 or not yielded):
+                # End of the rows of the previous GROUP
+                yield group, headings, buffer.to_dataframe(typed=typed, types=types)
+                buffer = None
+                yielded = True
 
-    Parameters
-    ----------
-    dataframe : Pandas DataFrame
-        Pandas DataFrame outputted by AGS4.AGS4_to_dataframe() function
+            if temp[0] == 'GROUP':
+                if group is not None and not yielded:
+                    yield group, headings, _empty_dataframe()
 
-    Returns
-    -------
-    A Pandas DataFrame with numerical columns to converted from
-    text to numeric datatypes, the TYPE and UNIT rows (i.e. rows 1 and 2)
-    removed, and the index reset.
+                group = temp[1]
+                headings = []
+                buffer = None
+                types = None
+                yielded = False
+                size = chunk_rows
 
-    e.g.
-    >>from python_ags4 import AGS4
-    >>
-    >>data, headings = AGS4.AGS4_to_dataframe(filepath)
-    >>
-    >>LNMC = AGS4.convert_to_numeric(data['LNMC'])
-    """
+            elif temp[0] == 'HEADING':
+                headings = temp
+                buffer = _ColumnBuffer(temp, line_numbers=get_line_numbers)
 
-    from pandas import to_numeric
+            else:
+                buffer.append(temp, i)
 
-    # First create a copy of the DataFrame to avoid overwriting the
-    # original data
-    df = dataframe.copy()
+                if size is not None and buffer.rows == size:
+                    df = buffer.to_dataframe(typed=typed, types=types)
+                    types = df.attrs.get('typed_columns')
+                    yield group, headings, df
 
-    # Convert to appropriate columns to numeric
-    numeric_df = df.loc[:, df.iloc[1].str.contains('DP|MC|SF|SCI')].apply(to_numeric, errors='coerce')
+                    buffer = _ColumnBuffer(headings, line_numbers=get_line_numbers)
+                    yielded = True
 
-    # Replace columns in input dataframe with numeric columns
-    df[numeric_df.columns] = numeric_df
+                    if grow is True:
+                        size *= 2
 
-    # Remove TYPE and UNIT rows and reset index
-    df = df.iloc[2:, :].reset_index(drop=True)
+    except Exception:
+        # Hand over the rows read before the error, as the other parsers do, before passing it on
+        if buffer is not None and (buffer.rows > 0 or not yielded):
+            yield group, headings, buffer.to_dataframe(typed=typed, types=types)
+        raise
 
-    return df
+    if buffer is not None and (buffer.rows > 0 or not yielded):
+        yield group, headings, buffer.to_dataframe(typed=typed, types=types)
 
+    elif group is not None and not yielded:
+        yield group, headings, _empty_dataframe()
 
-def convert_to_text(dataframe, dictionary=None):
-    """Convert AGS4 DataFrame with numeric columns back to formatted text ready for exporting
-    back to a csv file.
+
+# Groups that describe the project or the file rather than test data. These
+# are deduplicated instead of concatenated when several files are merged.
+_SHARED_GROUPS = ('PROJ', 'TRAN', 'DICT', 'UNIT', 'ABBR', 'TYPE')
+
+
+def AGS4_files_to_dataframe(filepaths, workers=None, encoding='utf-8', rename_duplicate_headers=True, typed=False,
+                            source_column='source_file'):
+    """Load several AGS4 files in a process pool and merge them into a single
+    dictionary of dataframes, as if they were one file.
+
+    The DATA rows of each GROUP are concatenated in the order the files are
+    given, with the name of the file they came from in an extra column. The
+    UNIT and TYPE rows are taken from the first file with a value for each
+    heading. Groups in '_SHARED_GROUPS' (PROJ, TRAN, DICT, UNIT, ABBR and TYPE)
+    are deduplicated instead, so rows repeated in every file appear once.
+
+    The source column is not added to the output headings, so it is left out
+    when the merged tables are written with 'dataframe_to_AGS4()'.
 
     Parameters
     ----------
-    dataframe : Pandas DataFrame
-        Pandas DataFrame with numeric columns. e.g. output from
-        AGS4.convert_to_numeric()
-    dictionary : str, optional
-        Path to AGS4 dictionary file from which to get UNIT and TYPE rows and to
-        convert to numeric fields to required precision. The values from the
-        dictionary will override those already in the UNIT and TYPE rows in the
-        dataframe. A standard dictionary can be picked using the one of the
-        following strings '4.1.1', '4.1', '4.0.4', '4.0.3', '4.0'.
+    filepaths : list
+        Paths to AGS4 files (see 'AGS4_to_dataframe()')
+    workers : int, optional
+        Number of processes to parse the files with (default is the number of CPUs)
+    encoding : str
+        Encoding of text files (default 'utf-8')
+    rename_duplicate_headers: bool
+        Rename duplicate headers if found (default True)
+    typed : bool
+        Store numeric DATA entries as floats (see 'type_numeric_columns()')
+    source_column : str
+        Name of the column with the name of the source file (default 'source_file')
 
     Returns
     -------
-    Pandas DataFrame
+    tables : dict
+        Python dictionary populated with merged Pandas dataframes
+    headings : dict
+        Dictionary with the headings in each GROUP, in the order they are first found
+    repairs : list
+        List of repaired rows (see 'AGS4_to_dict()') with the name of their file under 'file'
+    """
 
-    e.g.
-    >>from python_ags4 import AGS4
-    >>
-    >>tables, headings = AGS4.AGS4_to_dataframe('Data.ags')
-    >>LOCA_numeric = AGS4.convert_to_numeric(tables['LOCA])
-    >>
-    >>LOCA_text = convert_to_text(LOCA, 'DICT.ags')
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+
+    tasks = [(filepath, encoding, rename_duplicate_headers, typed) for filepath in filepaths]
+
+    if len(tasks) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_read_file, tasks))
+    else:
+        results = [_read_file(task) for task in tasks]
+
+    names = [os.path.basename(str(filepath)) for filepath in filepaths]
+
+    frames = {}
+    headings = {}
+    repairs = []
+
+    for name, (file_tables, file_headings, file_repairs) in zip(names, results):
+        for key, df in file_tables.items():
+            frames.setdefault(key, []).append((name, df))
+
+        for key, columns in file_headings.items():
+            merged = headings.setdefault(key, [])
+            merged.extend(col for col in columns if col not in merged)
+
+        repairs.extend(dict(repair, file=name) for repair in file_repairs)
+
+    tables = {}
+
+    for key, group_frames in frames.items():
+        source = None if key in _SHARED_GROUPS else source_column
+        tables[key] = _merge_group(group_frames, headings.get(key, []), source=source)
+
+    return tables, headings, repairs
+
+
+def _read_file(task):
+    """Parse one file for 'AGS4_files_to_dataframe()' in a worker process."""
+
+    import os
+
+    filepath, encoding, rename_duplicate_headers, typed = task
+
+    try:
+        return AGS4_to_dataframe(filepath, encoding=encoding, rename_duplicate_headers=rename_duplicate_headers,
+                                 get_repair_report=True, typed=typed)
+    except AGS4Error as e:
+        raise AGS4Error(f'{os.path.basename(str(filepath))}: {e}') from None
+
+
+def _merge_group(group_frames, headings, source=None):
+    """Merge the dataframes of one GROUP from several files (see
+    'AGS4_files_to_dataframe()'). DATA rows are tagged with their file in the
+    'source' column, or deduplicated if 'source' is None.
     """
 
-    from python_ags4 import check
-    from rich import print as rprint
+    from pandas import DataFrame, concat
 
-    # Make copy of dataframe and reset index to make sure numbering
-    # starts from zero
-    df = dataframe.copy().reset_index(drop=True)
+    columns = list(headings)
+    for _, df in group_frames:
+        columns.extend(col for col in df.columns if col not in columns)
 
-    # Check whether to use UNIT and TYPE rows in dataframe or to
-    # retrieve values from the dictionary file
-    if dictionary is None:
-        # Check whether dataframe has "UNIT" and "TYPE" rows
-        if ('UNIT' in df.HEADING.values) and ('TYPE' in df.HEADING.values):
+    # A heading typed differently in another file is written back as text there,
+    # so that all the floats in the merged column share one TYPE
+    typed_columns = {}
+    for _, df in group_frames:
+        for col, TYPE in df.attrs.get('typed_columns', {}).items():
+            typed_columns.setdefault(col, TYPE)
 
-            for col in df.columns:
-                TYPE = df.loc[df.HEADING == 'TYPE', col].values[0]
-                df = format_numeric_column(df, col, TYPE)
+    header = {'UNIT': {}, 'TYPE': {}}
+    data = []
 
-        else:
-            rprint("[red]  ERROR: Cannot convert to text as UNIT and/or TYPE row(s) are missing.")
-            rprint("[red]         Please provide dictonary file or add UNIT & TYPE rows to input file to proceed.[/red]")
-            raise AGS4Error("Cannot convert to text as UNIT and/or TYPE row(s) are missing. "
-                            "Please provide dictonary file or add UNIT & TYPE rows to input file to proceed.")
+    for name, df in group_frames:
+        is_data = (df['HEADING'] == 'DATA').to_numpy()
 
+        for row in df.loc[~is_data].itertuples(index=False):
+            values = header.get(row[0])
+            if values is not None:
+                for col, value in zip(df.columns, row):
+                    if values.get(col, '') == '':
+                        values[col] = value
+
+        rows = df.loc[is_data]
+
+        conflicting = {col: TYPE for col, TYPE in df.attrs.get('typed_columns', {}).items() if typed_columns[col] != TYPE}
+        if conflicting:
+            rows = rows.copy()
+
+        for col, TYPE in conflicting.items():
+            mask = rows[col].map(lambda x: isinstance(x, float) and x == x)
+            rows.loc[mask, col] = rows.loc[mask, col].map(lambda x: format_numeric_value(x, TYPE))
+
+        if source is not None:
+            rows = rows.assign(**{source: name})
+
+        data.append(rows)
+
+    header_rows = DataFrame([dict(values, HEADING=descriptor) for descriptor, values in header.items() if values])
+    data = concat(data, ignore_index=True)
+
+    if source is None:
+        # Compare as text, as floats and their text in another file are the same entry
+        data = data.loc[~data.astype(str).duplicated()]
     else:
-        # Read dictionary file
-        if dictionary in ['4.1.1', '4.1', '4.0.4', '4.0.3', '4.0']:
-            # Filepath to the standard dictionary will be picked based on version
-            # number if a valid version number is provided. If it is not specified
-            # at all, then the filepath will be selected based on the value of
-            # TRAN_AGS in the TRAN table.
-            dictionary = check.pick_standard_dictionary(dict_version=dictionary)
+        columns.append(source)
 
-        temp, _ = AGS4_to_dataframe(dictionary)
-        DICT = temp['DICT']
+    df = concat([header_rows, data], ignore_index=True).reindex(columns=columns).fillna('')
+    df.attrs['typed_columns'] = {col: TYPE for col, TYPE in typed_columns.items() if col in df.columns}
 
-        # Check whether UNIT and TYPE rows are already in dataframe
-        is_UNIT_row_present = 'UNIT' in df.HEADING.values
-        is_TYPE_row_present = 'TYPE' in df.HEADING.values
+    return df
 
-        # Format columns and add UNIT/TYPE rows if necessary
-        for col in df.columns:
 
-            if col == 'HEADING':
+def _AGS4_to_columns_parallel(filepath, workers, encoding='utf-8', get_line_numbers=False, rename_duplicate_headers=True,
+                              get_repair_report=False, typed=False):
+    """Load all the tables in a AGS4 file by parsing its GROUP blocks in a
+    process pool. The parameters and return values are the same as
+    'AGS4_to_dataframe()'.
+    """
 
-                if not is_UNIT_row_present:
-                    df.loc[-2, 'HEADING'] = 'UNIT'
+    index = AGS4_to_index(filepath, encoding=encoding, rename_duplicate_headers=rename_duplicate_headers)
 
-                if not is_TYPE_row_present:
-                    df.loc[-1, 'HEADING'] = 'TYPE'
+    tables, repairs = _parse_groups(filepath, index, list(index), workers=workers, encoding=encoding,
+                                    get_line_numbers=get_line_numbers, rename_duplicate_headers=rename_duplicate_headers,
+                                    typed=typed)
 
-            else:
+    headings = {}
+    line_numbers = {}
 
-                try:
-                    # Get type and unit from dictionary
-                    TYPE = DICT.loc[DICT.DICT_HDNG == col, 'DICT_DTYP'].iloc[0]
-                    UNIT = DICT.loc[DICT.DICT_HDNG == col, 'DICT_UNIT'].iloc[0]
+    for key, entry in index.items():
+        line_numbers[key] = {'GROUP': entry['line'], 'HEADING': entry['heading_line']}
 
-                    if is_UNIT_row_present:
-                        # Overwrite existing UNIT with one from the dictionary
-                        df.loc[df.HEADING == 'UNIT', col] = UNIT
-                    else:
-                        # Add UNIT row if one is not already there
-                        df.loc[-2, col] = UNIT
+        if entry['headings']:
+            headings[key] = entry['headings'] + ['line_number'] if get_line_numbers is True else list(entry['headings'])
 
-                    if is_TYPE_row_present:
-                        # Overwrite existing TYPE with one from the dictionary
-                        df.loc[df.HEADING == 'TYPE', col] = TYPE
-                    else:
-                        # Add TYPE row if one is not already there
-                        df.loc[-1, col] = TYPE
+    output = (tables, headings)
 
-                    df = format_numeric_column(df, col, TYPE)
+    if get_line_numbers is True:
+        output += (line_numbers,)
 
-                except IndexError:
-                    rprint(f"[yellow]  WARNING: [bold]{col}[/bold] not found in the dictionary file.[/yellow]")
+    if get_repair_report is True:
+        output += (repairs,)
 
-    return df.sort_index().reset_index(drop=True)
+    return output
 
 
-def format_numeric_column(dataframe, column_name, TYPE):
-    '''Format column in dataframe to specified TYPE and convert to string.
+def _parse_groups(filepath, index, groups, workers=None, encoding='utf-8', get_line_numbers=False, rename_duplicate_headers=True,
+                  typed=False):
+    """Parse the blocks of the listed groups from an indexed AGS4 file in a process pool.
 
-    Parameters
-    ----------
-    dataframe : Pandas DataFrame
-        Pandas DataFrame with AGS4 data
-    column_name : str
-        Name of column to be formatted
-    TYPE : str
-        AGS4 TYPE for specified column
+    Groups larger than '_BLOCK_SIZE' are split into blocks of DATA rows so that
+    a single large group (e.g. SCPT) is shared between several processes.
 
     Returns
     -------
-    Pandas DataFrame
-        Pandas DataFrame with formatted data.
-    '''
+    tuple
+        Dictionary of dataframes in the order of 'groups' and list of repaired rows
+    """
 
-    from rich import print as rprint
+    import mmap
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    import numpy as np
+    from pandas import DataFrame
 
-    df = dataframe.copy()
-    col = column_name
+    tasks = []
 
-    try:
-        if 'DP' in TYPE:
-            i = int(TYPE.strip('DP'))
-            # Apply formatting DATA rows with real numbers. NaNs will be avoided so that they will be exported
-            # as "" rather than "nan"
-            mask = (df.HEADING == "DATA") & df[col].notna()
-            df.loc[mask, col] = df.loc[mask, col].apply(lambda x: f"{x:.{i}f}")
+    with open(filepath, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
 
-        elif 'SCI' in TYPE:
-            i = int(TYPE.strip('SCI'))
-            # Apply formatting DATA rows with real numbers. NaNs will be avoided so that they will be exported
-            # as "" rather than "nan"
-            mask = (df.HEADING == "DATA") & df[col].notna()
-            df.loc[mask, col] = df.loc[mask, col].apply(lambda x: f"{x:.{i}E}")
+        try:
+            for key in groups:
+                entry = index[key]
+                line = entry['line']
 
-        elif 'SF' in TYPE:
+                for start, stop in _split_block(mm, entry['offset'], entry['end']):
+                    tasks.append((key, (filepath, start, stop, encoding, key, entry['headings'], line,
+                                        rename_duplicate_headers, get_line_numbers)))
+                    line += _count_lines(mm, start, stop)[1]
+        finally:
+            if isinstance(mm, mmap.mmap):
+                mm.close()
 
-            # Apply formatting DATA rows with real numbers. NaNs will be avoided so that they will be exported
-            # as "" rather than "nan"
-            mask = (df.HEADING == "DATA") & df[col].notna()
-            df.loc[mask, [col]] = df.loc[mask, [col]].applymap(lambda x: _format_SF(x, TYPE))
+    if workers is not None and workers < 1:
+        workers = os.cpu_count()
 
-        else:
-            pass
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_parse_block, [task for _, task in tasks]))
 
-    except ValueError:
-        rprint(f"[yellow]  WARNING: Numeric data in [bold]{col:<9}[/bold] not reformatted as it had one or more non-numeric entries.[/yellow]")
+    # Reassemble the blocks of each group in the original order
+    blocks = {key: [] for key in groups}
+    repairs = []
 
-    except TypeError:
-        rprint(f"[yellow]  WARNING: Numeric data in [bold]{col:<9}[/bold] not reformatted as it had one or more non-numeric entries.[/yellow]")
+    for (key, _), (values, line_numbers, block_repairs) in zip(tasks, results):
+        blocks[key].append((values, line_numbers))
+        repairs.extend(block_repairs)
 
-    return df
+    tables = {}
 
+    for key in groups:
+        headings = index[key]['headings']
 
-def _format_SF(value, TYPE):
-    '''Format a value to specified number of significant figures
-    and return a string.'''
+        if not headings:
+            tables[key] = _empty_dataframe()
+            continue
 
-    from math import log10, floor
+        values = np.concatenate([v for v, _ in blocks[key]], axis=1)
+        typed_columns = _type_values(values, headings) if typed is True else None
+        tables[key] = DataFrame(values.T, columns=headings, copy=False)
 
-    # Avoid log(0) as int(log(0)) will raise an OverflowError
-    if value != 0:
-        i = int(TYPE.strip('SF')) - 1 - int(floor(log10(abs(value))))
+        if typed_columns is not None:
+            tables[key].attrs['typed_columns'] = typed_columns
 
-    else:
-        return f"{value}"
+        if get_line_numbers is True:
+            tables[key]['line_number'] = np.concatenate([n for _, n in blocks[key]])
 
-    if i < 0:
-        return f"{round(value, i):.0f}"
+    return tables, repairs
 
-    else:
-        return f"{value:.{i}f}"
 
+# Size in bytes above which a GROUP is split into several blocks for parallel parsing
+_BLOCK_SIZE = 8*1024*1024
 
-def check_file(input_file, standard_AGS4_dictionary=None, rename_duplicate_headers=True):
-    """This function checks the input AGS4 file for errors.
 
-    Parameters
-    ----------
-    input_file : str
-        Path to AGS4 file (*.ags) to be checked
-    standard_AGS4_dict : str
-        Path to .ags file with standard AGS4 dictionary or version number
-        (should be one of '4.1.1', '4.1', '4.0.4', '4.0.3', '4.0').
-    rename_duplicate_headers: bool
-        Rename duplicate headers if found. Neither AGS4 tables nor Pandas
-        dataframes allow duplicate headers, therefore a number will be appended
-        to duplicates to make them unique. (default True)
+def _split_block(mm, offset, end, block_size=None):
+    """Split the byte range of a GROUP into blocks of about 'block_size' bytes
+    that each start at a DATA row, so rows and their line-breaks stay together.
 
     Returns
     -------
-    dict
-        Dictionary contains AGS4 error in input file.
+    list
+        List of (start, stop) byte positions
     """
 
-    from python_ags4 import check
-    from rich import print as rprint
-    import traceback
+    block_size = block_size or _BLOCK_SIZE
+    blocks = []
+    start = offset
 
-    ags_errors = {}
+    while end - start > block_size:
+        stop = mm.find(b'\n"DATA"', start + block_size, end)
 
-    # Line checks
-    with open(input_file, 'r', newline='', encoding='utf-8', errors='replace') as f:
+        if stop == -1:
+            break
 
-        # Preflight check for AGS3 files
-        for i, line in enumerate(f, start=1):
-            ags_errors = check.is_ags3_like(line, i, ags_errors=ags_errors)
+        blocks.append((start, stop + 1))
+        start = stop + 1
 
-            # Exit if ags3_like line is found
-            if ('AGS Format Rule 3' in ags_errors) and ('AGS3' in ags_errors['AGS Format Rule 3'][0]['desc']):
-                ags_errors = check.add_meta_data(input_file, standard_AGS4_dictionary, ags_errors=ags_errors)
-                return ags_errors
+    blocks.append((start, end))
 
-        # Reset file stream to the beginning to start AGS4 checks
-        f.seek(0)
+    return blocks
 
-        # Initiate group name and headings list
-        group = ''
-        headings = []
 
-        rprint('[green]  Checking lines...[/green]')
-        for i, line in enumerate(f, start=1):
+def _parse_block(task):
+    """Parse a block of rows from an AGS4 file (run in a worker process).
 
-            # Track headings to be used with group checks
-            if line.strip('"').startswith("GROUP"):
-                # Reset group name and headings list at the beginning each group
-                group = ''
-                headings = []
+    Returns
+    -------
+    tuple
+        2D object array with one row per heading, array of line numbers (or
+        None) and list of repaired rows
+    """
 
-                try:
-                    group = line.rstrip().strip('"').split('","')[1]
-
-                except IndexError:
-                    # GROUP name not available (Rule 19 should catch this error)
-                    pass
-
-            elif line.strip('"').startswith("HEADING"):
-                headings = line.rstrip().split('","')
-                headings = [item.strip('"') for item in headings]
-
-            # Call line Checks
-            ags_errors = check.rule_1(line, i, ags_errors=ags_errors)
-            ags_errors = check.rule_2a(line, i, ags_errors=ags_errors)
-            ags_errors = check.rule_3(line, i, ags_errors=ags_errors)
-            ags_errors = check.rule_4_1(line, i, ags_errors=ags_errors)
-            ags_errors = check.rule_4_2(line, i, group=group, headings=headings, ags_errors=ags_errors)
-            ags_errors = check.rule_5(line, i, ags_errors=ags_errors)
-            ags_errors = check.rule_6(line, i, ags_errors=ags_errors)
-            ags_errors = check.rule_7_1(line, i, ags_errors=ags_errors)
-            ags_errors = check.rule_19(line, i, ags_errors=ags_errors)
-            ags_errors = check.rule_19a(line, i, group=group, ags_errors=ags_errors)
-            ags_errors = check.rule_19b_1(line, i, group=group, ags_errors=ags_errors)
+    import io
+
+    filepath, start, stop, encoding, group, headings, line, rename_duplicate_headers, get_line_numbers = task
+
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        text = f.read(stop - start).decode(encoding, errors='replace')
+
+    buffer = _ColumnBuffer(headings, line_numbers=get_line_numbers)
+    repairs = []
 
-    # Import file into Pandas DataFrame to run group checks
     try:
-        rprint('[green]  Loading tables...[/green]')
-        tables, headings, line_numbers = AGS4_to_dataframe(input_file, get_line_numbers=True, rename_duplicate_headers=rename_duplicate_headers)
+        for i, temp in _iter_records(io.StringIO(text), rename_duplicate_headers=rename_duplicate_headers, repairs=repairs,
+                                     start=line, group=group, headings=headings):
+            if temp[0] in ['TYPE', 'UNIT', 'DATA']:
+                buffer.append(temp, i)
 
-    except AGS4Error as err:
-        rprint('[red] ERROR: Could not continue with group checks on file. Please review error log and fix line errors first.[/red]')
-        raise err
+    except Exception as e:
+        print(e)
 
-    except UnboundLocalError:
-        # The presence of a byte-order-mark (BOM) in the same row as first
-        # "GROUP" line can cause this exception. This will be caught by line
-        # checks for Rule 1 (since the BOM is not an ASCII character) and Rule 3
-        # (since the BOM precedes the string "GROUP"). The BOM encoding can be
-        # ignored by setting the 'encoding' argument to 'utf-8-sig'.
-        tables, headings, line_numbers = AGS4_to_dataframe(input_file, encoding='utf-8-sig',
-                                                           get_line_numbers=True, rename_duplicate_headers=rename_duplicate_headers)
+    line_numbers = buffer.line_numbers[:buffer.rows] if buffer.line_numbers is not None else None
 
-        # Add warning to error log
-        msg = 'This file seems to be encoded with a byte-order-mark (BOM). It is highly recommended that the '\
-              'file be saved without BOM encoding to avoid issues with other sofware.'
-        ags_errors = check.add_error_msg(ags_errors, 'General', '', '', msg)
+    return buffer.filled(), line_numbers, repairs
 
-    except Exception:
-        err = traceback.format_exc()
-        rprint('[red] ERROR: Could not continue with group checks on file. Please review error log and fix line errors first.[/red]')
-        rprint(f'[red]\n{err}[/red]')
 
-        # Add metadata
-        ags_errors = check.add_meta_data(input_file, standard_AGS4_dictionary, ags_errors=ags_errors)
+def AGS4_to_index(filepath, encoding='utf-8', rename_duplicate_headers=True):
+    """Pre-scan an AGS4 file and record where each GROUP is without parsing its rows.
 
-        return ags_errors
+    The file is memory-mapped where possible and only the GROUP and HEADING
+    lines are decoded, so the index of a large file is built in a fraction of
+    the time it takes to load all the tables.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to AGS4 file
+    encoding : str
+        Encoding of text file (default 'utf-8')
+    rename_duplicate_headers: bool
+        Rename duplicate headers if found (default True)
 
-    # Group Checks
-    rprint('[green]  Checking headings and groups...[/green]')
-    ags_errors = check.rule_2(tables, headings, line_numbers, ags_errors=ags_errors)
-    ags_errors = check.rule_2b(tables, headings, line_numbers, ags_errors=ags_errors)
-    ags_errors = check.rule_8(tables, headings, line_numbers, ags_errors=ags_errors)
-    ags_errors = check.rule_12(tables, headings, ags_errors=ags_errors)
-    ags_errors = check.rule_13(tables, headings, line_numbers, ags_errors=ags_errors)
-    ags_errors = check.rule_14(tables, headings, line_numbers, ags_errors=ags_errors)
-    ags_errors = check.rule_15(tables, headings, line_numbers, ags_errors=ags_errors)
-    ags_errors = check.rule_20(tables, headings, input_file, ags_errors=ags_errors)
+    Returns
+    -------
+    dict
+        Dictionary with an entry for each GROUP holding the 'offset' and 'end'
+        byte positions of its block, the 'line' numbers of the GROUP row and
+        the 'heading_line', the number of UNIT, TYPE and DATA 'rows', its
+        'headings', and the number of 'others' lines that are neither blank
+        nor start with a data descriptor.
+    """
 
-    # Dictionary Based Checks
+    import mmap
 
-    # Pick path to standard dictionary
-    if standard_AGS4_dictionary in [None, '4.1.1', '4.1', '4.0.4', '4.0.3', '4.0']:
-        # Filepath to the standard dictionary will be picked based on version
-        # number if a valid version number is provided. If it is not specified
-        # at all, then the filepath will be selected based on the value of
-        # TRAN_AGS in the TRAN table.
-        standard_AGS4_dictionary = check.pick_standard_dictionary(tables=tables, dict_version=standard_AGS4_dictionary)
+    index = {}
 
-    # Import standard dictionary into Pandas DataFrames
-    tables_std_dict, _ = AGS4_to_dataframe(standard_AGS4_dictionary)
+    with open(filepath, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be memory-mapped
+            mm = f.read()
 
-    # Combine standard dictionary with DICT table in input file to create an extended dictionary
-    # This extended dictionary is used to check the file schema
-    dictionary = check.combine_DICT_tables(tables_std_dict, tables)
+        try:
+            # Find the start of each GROUP row
+            starts = []
+            pos = mm.find(b'"GROUP"')
 
-    rprint('[green]  Checking file schema...[/green]')
-    ags_errors = check.rule_7_2(headings, dictionary, line_numbers, ags_errors=ags_errors)
-    ags_errors = check.rule_9(headings, dictionary, line_numbers, ags_errors=ags_errors)
-    ags_errors = check.rule_10a(tables, headings, dictionary, line_numbers, ags_errors=ags_errors)
-    ags_errors = check.rule_10b(tables, headings, dictionary, line_numbers, ags_errors=ags_errors)
-    ags_errors = check.rule_10c(tables, headings, dictionary, line_numbers, ags_errors=ags_errors)
-    ags_errors = check.rule_11(tables, headings, dictionary, ags_errors=ags_errors)
-    ags_errors = check.rule_16(tables, headings, dictionary, ags_errors=ags_errors)
-    ags_errors = check.rule_17(tables, headings, dictionary, ags_errors=ags_errors)
-    # Note: rule_18() has to be called after rule_9() as it relies on rule_9() to flag non-standard headings.
-    ags_errors = check.rule_18(tables, headings, ags_errors=ags_errors)
-    ags_errors = check.rule_19b_2(tables, headings, dictionary, line_numbers, ags_errors=ags_errors)
-    ags_errors = check.rule_19b_3(tables, headings, dictionary, line_numbers, ags_errors=ags_errors)
+            while pos != -1:
+                if pos == 0 or mm[pos-1:pos] == b'\n' or (pos == 3 and mm[:3] == b'\xef\xbb\xbf'):
+                    starts.append(pos)
 
-    # Add metadata
-    ags_errors = check.add_meta_data(input_file, standard_AGS4_dictionary, ags_errors=ags_errors)
+                pos = mm.find(b'"GROUP"', pos + 1)
 
-    return ags_errors
+            line = 1 + _count_lines(mm, 0, starts[0])[1] if starts else 1
 
+            for n, offset in enumerate(starts):
+                end = starts[n+1] if n + 1 < len(starts) else len(mm)
 
-# Helper functions/classes #
+                # The GROUP row is normally followed directly by the HEADING row
+                head = bytes(mm[offset:min(end, offset + 65536)]).decode(encoding, errors='replace').splitlines()
+                group = _split_line(head[0])[1] if len(_split_line(head[0])) > 1 else ''
 
-def _is_file_like(obj):
-    """Check if object is file like
+                headings = []
+                heading_line = '-'
+                for i, text in enumerate(head[1:], start=line+1):
+                    temp = _split_line(text)
+                    if temp[0] == 'HEADING':
+                        headings = _rename_duplicate_headings(temp, group, i, rename_duplicate_headers=rename_duplicate_headers)
+                        heading_line = i
+                        break
+                    elif temp[0] in ['GROUP', 'UNIT', 'TYPE', 'DATA']:
+                        break
+
+                rows, lines, others = _count_lines(mm, offset, end)
+
+                index[group] = {'offset': offset, 'end': end, 'line': line, 'heading_line': heading_line, 'rows': rows,
+                                'headings': headings, 'others': others}
+
+                line += lines
+
+        finally:
+            if isinstance(mm, mmap.mmap):
+                mm.close()
+
+    return index
+
+
+def _count_lines(mm, start, end, chunk_size=16*1024*1024):
+    """Count the UNIT, TYPE and DATA rows and the line-breaks between two byte
+    positions, reading the file in chunks to keep memory use low.
+
+    'start' should be at the beginning of a line.
 
     Returns
     -------
-    bool
-        Return True if obj is file like, otherwise return False
+    tuple
+        Number of rows, number of line-breaks and number of lines that are
+        neither blank nor start with a data descriptor (i.e. line-breaks
+        within a row that have to be repaired when it is parsed)
+    """
+
+    rows = 0
+    lines = 0
+    others = 0
+    pos = start
+
+    while pos < end:
+        stop = min(end, pos + chunk_size)
+
+        # Split chunks at the end of a line so that no row is counted twice
+        if stop < end:
+            stop = (mm.rfind(b'\n', pos, stop) + 1) or end
+
+        chunk = bytes(mm[pos:stop])
+
+        for descriptor in (b'"UNIT"', b'"TYPE"', b'"DATA"'):
+            rows += chunk.count(b'\n' + descriptor) + chunk.startswith(descriptor)
+
+        others += chunk.count(b'\n') + (not chunk.endswith(b'\n'))
+        others -= chunk.count(b'\n\n') + chunk.count(b'\n\r\n') + chunk.startswith((b'\n', b'\r\n'))
+        for descriptor in _DATA_DESCRIPTORS:
+            others -= chunk.count(b'\n' + descriptor.encode()) + chunk.startswith(descriptor.encode())
+
+        lines += chunk.count(b'\n')
+        pos = stop
+
+    return rows, lines, others
+
+
+def AGS4_to_excel(input_file, output_file, encoding='utf-8', rename_duplicate_headers=True, sort_tables=False):
+    """Load all the tables in a AGS4 file to an Excel spreasheet.
+
+    Parameters
+    ----------
+    input_file : str
+        Path to AGS4 file
+    output_file : str
+        Path to Excel file
+    rename_duplicate_headers: bool
+        Rename duplicate headers if found. Neither AGS4 tables nor Pandas
+        dataframes allow duplicate headers, therefore a number will be appended
+        to duplicates to make them unique. (default False)
+    sort_tables : bool
+        Alphabetically sort worksheets in Excel file. (default False)
+        WARNING: The original order of groups will be lost and cannot be
+        restored when .xlsx file is converted back to .ags.
+
+    Returns
+    -------
+    Excel file populated with data from the input AGS4 file.
+    """
+
+    from itertools import chain
+    from pandas import ExcelWriter
+    from rich import print as rprint
+    from openpyxl.utils import get_column_letter
+
+    # Tables are read and written in batches of rows with 'AGS4_to_chunks()', so
+    # the whole AGS4 file is never held in memory
+    chunks = AGS4_to_chunks(input_file, chunk_rows=25000, encoding=encoding, rename_duplicate_headers=rename_duplicate_headers)
+    first = next(chunks, None)
+
+    # Exit if there is no AGS4 tables in the input file
+    if first is None:
+        rprint(f'[red]  ERROR: No valid AGS4 data found in input file.[/red]')
+        raise AGS4Error('No valid AGS4 data found in input file.')
+
+    rows = {}
+    widths = {}
+
+    with ExcelWriter(output_file, engine='openpyxl') as writer:
+        for key, headings, df in chain([first], chunks):
+            if key not in rows:
+                rprint(f'[green]Writing data from... [bold]{key}[/bold][/green]')
+                rows[key] = 0
+                widths[key] = {}
+
+            # Issue warnings as large tables are written, as they could crash the program
+            if rows[key] <= 25000 < rows[key] + df.shape[0]:
+                rprint(f'[blue]  INFO: {key} has more than 25000 rows, so it will take about a minute to export.[/blue]')
+            if rows[key] <= 100000 < rows[key] + df.shape[0]:
+                rprint(f'[yellow]  WARNING: {key} has more than 100000 rows, so it may take a few minutes to export.[/yellow]')
+                rprint('[yellow]           The program will terminate if it runs out of memory in the process.[/yellow]')
+
+            # The header row is only written with the first batch of each table
+            df.to_excel(writer, sheet_name=key, index=False, header=rows[key] == 0,
+                        startrow=rows[key] + 1 if rows[key] > 0 else 0)
+            rows[key] += df.shape[0]
+
+            # Track the widest entry of each column to fit the column widths to the contents
+            for col in df:
+                if df.shape[0] > 0:
+                    widths[key][col] = max(widths[key].get(col, 0), df[col].map(len).max())
+
+        # Update column widths in xlxs file to fit contents
+        for key in rows:
+            for i, col in enumerate(widths[key], start=1):
+                # 13 < colummn_width < 75 characters (approximately)
+                max_width = min(max(13, widths[key][col] + 1), 75)
+
+                writer.sheets[key].column_dimensions[get_column_letter(i)].width = max_width
+
+        # Sort worksheets once all tables have been written
+        if sort_tables is True:
+            rprint('[yellow]WARNING: Worksheets in Excel file will be sorted alphabetically.[/yellow]')
+            rprint('[yellow]         The original group order will not be restored if this .xlsx file is converted back to .ags.[/yellow]')
+
+            for position, key in enumerate(sorted(writer.book.sheetnames)):
+                writer.book.move_sheet(key, offset=position - writer.book.sheetnames.index(key))
+
+
+# Write functions #
+
+def dataframe_to_AGS4(data, headings, filepath, mode='w', index=False, encoding='utf-8', warnings=True, workers=None,
+                      progress=None):
+    """Write Pandas dataframes that have been extracted using
+    'AGS4_to_dataframe()' function back to an AGS4 file.
+
+    Parameters
+    ----------
+    data : dict
+        Dictionary of Pandas dataframes (output from 'AGS4_to_dataframe()')
+    headings : dict
+        Dictionary of lists containing AGS4 headings in the correct order (e.g.
+        output from 'AGS4_to_dataframe()') Columns can be dropped as well from
+        the exported file using this option. An empty dictionary {} can be
+        passed to export data without explicitly ensuring column order.
+    filepath : str
+        Path to output file, which is gzip compressed if it ends with .gz
+    mode : str, optional
+        Option to write ('w') or append ('a') data ('w' by default)
+    index : bool, optional
+        Include the index column when writing to file. (False by default)
+        WARNING: The output will not be a valid AGS4 file if set to True.
+    workers : int, optional
+        Format the groups in a process pool with this many processes and
+        write them in their original order. Large groups are split into
+        blocks of rows so that they are formatted in parallel as well. The
+        pool is only used when the tables hold more than _PARALLEL_WRITE_CELLS
+        entries. (None by default, to format the groups in this process)
+    progress : callable, optional
+        Function called with the number of groups written so far after each
+        group is written
+
+    Returns
+    -------
+    AGS4 file with data in the dictionary of dataframes that is input.
+    """
+
+    # Open file and write/append data
+    # Files ending with .gz are gzip compressed as they are written
+    if str(filepath).lower().endswith('.gz'):
+        import gzip
+        f = gzip.open(filepath, mode + 't', newline='', encoding=encoding)
+    else:
+        f = open(filepath, mode, newline='', encoding=encoding, buffering=_WRITE_BUFFER_SIZE)
+
+    tasks = _block_tasks(data, headings, index=index, warnings=warnings)
+
+    if sum(df.size for df in data.values()) < _PARALLEL_WRITE_CELLS:
+        workers = None
+
+    with f:
+        _write_tasks(f, tasks, workers=workers, progress=progress)
+
+
+# Number of rows formatted at a time by 'dataframe_to_AGS4()' and the size of
+# its file buffer, so large groups are written without a copy of the table
+_WRITE_CHUNK_ROWS = 50000
+_WRITE_BUFFER_SIZE = 4*1024*1024
+
+# Number of table entries above which 'dataframe_to_AGS4()' uses a process pool
+# if workers is given. Starting the pool costs more than formatting fewer.
+_PARALLEL_WRITE_CELLS = 2000000
+
+
+def _block_tasks(data, headings, index=False, warnings=True, chunk_rows=None, verbose=True):
+    """Split the tables to be written by 'dataframe_to_AGS4()' into blocks of
+    rows, in the order they are written.
+
+    Yields
+    ------
+    tuple
+        Number of groups written once the block is written (None if it is not
+        the last block of its group) and the block for '_write_block()'
+    """
+
+    from rich import print as rprint
+
+    chunk_rows = chunk_rows or _WRITE_CHUNK_ROWS
+
+    for n, key in enumerate(data, start=1):
+        df = data[key]
+
+        if verbose:
+            rprint(f'[green]Writing data from... [bold]{key}[/bold][green]')
+
+        try:
+            columns = list(headings[key])
+
+            missing = [col for col in columns if col not in df.columns]
+            if missing:
+                raise KeyError(missing)
+
+        except KeyError:
+
+            if warnings is True:
+                rprint(f"[yellow]  WARNING: Input 'headings' dictionary does not have a entry named [bold]{key}[/bold].[/yellow]")
+                rprint(f"[italic yellow]           All columns in the {key} table will be exported in the default order.[/italic yellow]")
+                rprint("[italic yellow]           Please check column order and ensure AGS4 Rule 7 is still satisfied.[/italic yellow]")
+
+            columns = list(df.columns)
+
+        typed_columns = df.attrs.get('typed_columns', {})
+        label = df.index.name or ''
+        starts = range(0, df.shape[0], chunk_rows) or [0]
+
+        for start in starts:
+            last = start + chunk_rows >= df.shape[0]
+            block = df.iloc[start:start + chunk_rows][columns]
+            group = key if start == 0 else None
+
+            yield (n if last else None), (block, typed_columns, group, label if index else None, last)
+
+
+def _write_tasks(f, tasks, workers=None, progress=None):
+    """Write the blocks from '_block_tasks()' to an open text file in order,
+    formatting them in a process pool if 'workers' is given. Blocks can also
+    be bytes, which are written to the file as they are (see
+    'LazyTables.to_AGS4()').
+    """
+
+    if workers is None or workers == 1:
+        for n, task in tasks:
+            _write_task(f, n, task, progress)
+
+        return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Only a few blocks are queued ahead of the one being written, so
+    # the formatted text does not build up in memory
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+
+        for n, task in tasks:
+            pending.append((n, task if isinstance(task, bytes) else executor.submit(_format_block, task)))
+
+            while len(pending) > 2*workers:
+                _write_task(f, *pending.popleft(), progress)
+
+        while pending:
+            _write_task(f, *pending.popleft(), progress)
+
+
+def _write_block(f, task):
+    """Write a block of rows from '_block_tasks()' to an open file as quoted
+    CSV, in the same format as df.to_csv(quoting=csv.QUOTE_ALL). The first
+    block of a group starts with its GROUP and HEADING rows and the last ends
+    with a blank line.
+
+    The entries are prepared a column at a time (blanks for missing values
+    and floats in typed columns in the format given by their TYPE, see
+    'type_numeric_columns()'), and the rows are then quoted by csv.writer.
+    Quotes within a field are read in as single double quotes by
+    '_split_line()' and are doubled again by csv.writer, as required by AGS4
+    Rule 5.
+    """
+
+    import csv
+
+    block, typed_columns, group, index_label, last = task
+    writer = csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator='\r\n')
+
+    if group is not None:
+        f.write('"GROUP"'+","+'"'+group+'"'+'\r\n')
+        writer.writerow(([index_label] if index_label is not None else []) + list(block.columns))
+
+    fields = [_column_values(block.index.to_series(), None)] if index_label is not None else []
+    fields += [_column_values(block.iloc[:, i], typed_columns.get(col)) for i, col in enumerate(block.columns)]
+
+    writer.writerows(zip(*fields))
+
+    if last:
+        f.write("\r\n")
+
+
+def _format_block(task):
+    """Format a block with '_write_block()' in a worker process."""
+
+    import io
+
+    f = io.StringIO(newline='')
+    _write_block(f, task)
+
+    return f.getvalue()
+
+
+def _write_task(f, n, task, progress=None):
+    """Write a block, its formatted text from a worker process or bytes to be
+    copied, and report progress at the end of each group."""
+
+    if isinstance(task, bytes):
+        # Copied as they are, so flush the text written so far first
+        f.flush()
+        f.buffer.write(task)
+    elif isinstance(task, tuple):
+        _write_block(f, task)
+    else:
+        f.write(task.result())
+
+    if progress is not None and n is not None:
+        progress(n)
+
+
+def _column_values(column, TYPE=None):
+    """Return the entries of a column as an object array ready for csv.writer
+    (see '_write_block()')."""
+
+    values = column.to_numpy(dtype=object)
+    missing = column.isna().to_numpy()
+
+    if missing.any() or TYPE is not None:
+        values = values.copy()
+        values[missing] = ''
+
+    if TYPE is not None:
+        is_float = [isinstance(x, float) for x in values]
+        values[is_float] = [format_numeric_value(x, TYPE) for x in values[is_float]]
+
+    return values
+
+
+def excel_to_AGS4(input_file, output_file, format_numeric_columns=True, dictionary=None):
+    """Export AGS4 data in Excel file to .ags file.
+
+    Parameters
+    ----------
+    input_file : str
+        Path to Excel file (Note: Each GROUP should be in a separate worksheet.
+        e.g. output from AGS4.AGS4_to_excel)
+    output_file : str
+        Path to AGS4 file
+    format_numeric_columns : bool, optional
+        Format numeric columns to match specified TYPE
+    dictionary : str
+        Filepath to dictionary if the UNIT and TYPE data in tables need to be
+        overridden.
+
+    Returns
+    -------
+    AGS4 file with data from the input Excel file.
+    """
+
+    from pandas import read_excel
+    from rich import print as rprint
+
+    # Read data from Excel file in to DataFrames
+    tables = read_excel(input_file, sheet_name=None, engine='openpyxl')
+
+    # Not all worksheets in the spreadsheet may contain valid AGS4 tables, therefore
+    # initiate variable to keep track of worksheets to export
+    valid_tables = []
+
+    for key, df in tables.items():
+        # Assume that only worksheets with a 'HEADING' column contain valid AGS4 data
+        if 'HEADING' in df:
+            valid_tables.append(key)
+        else:
+            rprint(f'[yellow]  WARNING: Worksheet [bold]{key}[/bold] dropped as it does not have a HEADING column.[/yellow]')
+            continue
+
+        # List column names that don't conform to Rule 19 (using a negative look-ahead regex)
+        for col_name in df.filter(regex=r'^(?!HEADING|^[A-Z0-9]{4}_[A-Z0-9]{1,4}$)', axis='columns'):
+            rprint(f'[yellow]  WARNING: Column [bold]{col_name}[/bold] dropped as name does not conform to AGS4 Rule 19.[/yellow]')
+
+        # Drop columns that don't conform to Rule 19
+        df = df.filter(regex=r'HEADING|^[A-Z0-9]{4}_[A-Z0-9]{1,4}$', axis='columns')
+
+        # Drop rows that are not 'UNIT', 'TYPE', or 'DATA'
+        df = df.loc[df.HEADING.isin(['UNIT', 'TYPE', 'DATA']), :]
+
+        # Finally format numeric column if required
+        if format_numeric_columns is True:
+            rprint(f'[green]Formatting columns in... [bold]{key}[/bold][/green]')
+            tables[key] = convert_to_text(df, dictionary=dictionary)
+
+    # Export dictionary of DataFrames to AGS4 file
+    if len(valid_tables) == 0:
+        rprint(f'[red]  ERROR: No valid AGS4 data found in input file. Please see warning messages above.[/red]')
+    else:
+        dataframe_to_AGS4({key: tables[key] for key in valid_tables}, {}, output_file, warnings=False)
+
+
+# Formatting functions #
+
+def convert_to_numeric(dataframe):
+    """The AGS4_to_dataframe() function extracts the data from an AGS4 file and
+    puts each table into a Pandas DataFrame as text. This function reads the
+    TYPE row and coverts the columns with data types 0DP, 1DP, 2DP, 3DP, 4DP,
+    5DP, and MC into numerical data. This allows the data to be plotted and
+    used in calculations/formulas.
+
+    Parameters
+    ----------
+    dataframe : Pandas DataFrame
+        Pandas DataFrame outputted by AGS4.AGS4_to_dataframe() function
+
+    Returns
+    -------
+    A Pandas DataFrame with numerical columns to converted from
+    text to numeric datatypes, the TYPE and UNIT rows (i.e. rows 1 and 2)
+    removed, and the index reset.
+
+    e.g.
+    >>from python_ags4 import AGS4
+    >>
+    >>data, headings = AGS4.AGS4_to_dataframe(filepath)
+    >>
+    >>LNMC = AGS4.convert_to_numeric(data['LNMC'])
+    """
+
+    from pandas import to_numeric
+
+    # First create a copy of the DataFrame to avoid overwriting the
+    # original data
+    df = dataframe.copy()
+
+    # Convert to appropriate columns to numeric
+    numeric_df = df.loc[:, df.iloc[1].str.contains('DP|MC|SF|SCI')].apply(to_numeric, errors='coerce')
+
+    # Replace columns in input dataframe with numeric columns
+    df[numeric_df.columns] = numeric_df
+
+    # Remove TYPE and UNIT rows and reset index
+    df = df.iloc[2:, :].reset_index(drop=True)
+
+    return df
+
+
+def convert_to_text(dataframe, dictionary=None):
+    """Convert AGS4 DataFrame with numeric columns back to formatted text ready for exporting
+    back to a csv file.
+
+    Parameters
+    ----------
+    dataframe : Pandas DataFrame
+        Pandas DataFrame with numeric columns. e.g. output from
+        AGS4.convert_to_numeric()
+    dictionary : str, optional
+        Path to AGS4 dictionary file from which to get UNIT and TYPE rows and to
+        convert to numeric fields to required precision. The values from the
+        dictionary will override those already in the UNIT and TYPE rows in the
+        dataframe. A standard dictionary can be picked using the one of the
+        following strings '4.1.1', '4.1', '4.0.4', '4.0.3', '4.0'.
+
+    Returns
+    -------
+    Pandas DataFrame
+
+    e.g.
+    >>from python_ags4 import AGS4
+    >>
+    >>tables, headings = AGS4.AGS4_to_dataframe('Data.ags')
+    >>LOCA_numeric = AGS4.convert_to_numeric(tables['LOCA])
+    >>
+    >>LOCA_text = convert_to_text(LOCA, 'DICT.ags')
+    """
+
+    from rich import print as rprint
+
+    # Make copy of dataframe and reset index to make sure numbering
+    # starts from zero
+    df = dataframe.copy().reset_index(drop=True)
+
+    # Check whether to use UNIT and TYPE rows in dataframe or to
+    # retrieve values from the dictionary file
+    if dictionary is None:
+        # Check whether dataframe has "UNIT" and "TYPE" rows
+        if ('UNIT' in df.HEADING.values) and ('TYPE' in df.HEADING.values):
+
+            for col in df.columns:
+                TYPE = df.loc[df.HEADING == 'TYPE', col].values[0]
+                df = format_numeric_column(df, col, TYPE)
+
+        else:
+            rprint("[red]  ERROR: Cannot convert to text as UNIT and/or TYPE row(s) are missing.")
+            rprint("[red]         Please provide dictonary file or add UNIT & TYPE rows to input file to proceed.[/red]")
+            raise AGS4Error("Cannot convert to text as UNIT and/or TYPE row(s) are missing. "
+                            "Please provide dictonary file or add UNIT & TYPE rows to input file to proceed.")
+
+    else:
+        # Read dictionary file
+        # The standard dictionary will be picked based on version number if a
+        # valid version number is provided. Each dictionary is only parsed once,
+        # so converting many tables does not read it again every time.
+        dictionary = load_dictionary(dictionary)
+
+        # Check whether UNIT and TYPE rows are already in dataframe
+        is_UNIT_row_present = 'UNIT' in df.HEADING.values
+        is_TYPE_row_present = 'TYPE' in df.HEADING.values
+
+        # Format columns and add UNIT/TYPE rows if necessary
+        for col in df.columns:
+
+            if col == 'HEADING':
+
+                if not is_UNIT_row_present:
+                    df.loc[-2, 'HEADING'] = 'UNIT'
+
+                if not is_TYPE_row_present:
+                    df.loc[-1, 'HEADING'] = 'TYPE'
+
+            else:
+
+                # Get type and unit from dictionary
+                entry = dictionary.lookup(col)
+
+                if entry is None:
+                    rprint(f"[yellow]  WARNING: [bold]{col}[/bold] not found in the dictionary file.[/yellow]")
+
+                else:
+                    _, _, TYPE, UNIT = entry
+
+                    if is_UNIT_row_present:
+                        # Overwrite existing UNIT with one from the dictionary
+                        df.loc[df.HEADING == 'UNIT', col] = UNIT
+                    else:
+                        # Add UNIT row if one is not already there
+                        df.loc[-2, col] = UNIT
+
+                    if is_TYPE_row_present:
+                        # Overwrite existing TYPE with one from the dictionary
+                        df.loc[df.HEADING == 'TYPE', col] = TYPE
+                    else:
+                        # Add TYPE row if one is not already there
+                        df.loc[-1, col] = TYPE
+
+                    df = format_numeric_column(df, col, TYPE)
+
+    return df.sort_index().reset_index(drop=True)
+
+
+def type_numeric_columns(dataframe):
+    """Store the DATA entries of the numeric columns of an AGS4 table as floats,
+    so that they do not have to be parsed from text for every calculation, sort
+    or display.
+
+    Columns with a DP, SF or SCI TYPE are converted entry by entry. An entry is
+    only stored as a float if formatting it by its TYPE (see
+    'format_numeric_value()') gives back exactly the same text, otherwise the
+    text is kept (e.g. '1.5' in a 2DP column, blanks and non-numeric entries).
+    The UNIT and TYPE rows stay as text, so the columns keep an object dtype.
+    The converted columns are listed with their TYPE in
+    df.attrs['typed_columns'], which 'dataframe_to_AGS4()' uses to write the
+    floats back in their original format.
+
+    Parameters
+    ----------
+    dataframe : Pandas DataFrame
+        Pandas DataFrame outputted by AGS4.AGS4_to_dataframe() function
+
+    Returns
+    -------
+    Pandas DataFrame
+        Copy of the dataframe with typed numeric columns.
+    """
+
+    from pandas import DataFrame
+
+    values = dataframe.to_numpy(dtype=object, copy=True).T
+    typed_columns = _type_values(values, list(dataframe.columns))
+
+    df = DataFrame(values.T, columns=dataframe.columns, index=dataframe.index, copy=False)
+    df.attrs.update(dataframe.attrs)
+    df.attrs['typed_columns'] = typed_columns
+
+    return df
+
+
+def untype_numeric_columns(dataframe, columns=None):
+    """Convert the typed numeric columns of an AGS4 table (see
+    'type_numeric_columns()') back to text, as they would be if the file was
+    read without typed=True.
+
+    The floats in each column listed in df.attrs['typed_columns'] are
+    formatted by their TYPE (see 'format_numeric_value()'), so the entries are
+    the same text as in the file. This is for code that works on the entries as
+    text, e.g. joining them into match keys or writing them to Excel.
+
+    Parameters
+    ----------
+    dataframe : Pandas DataFrame
+        Pandas DataFrame outputted by AGS4.AGS4_to_dataframe() function
+    columns : list, optional
+        Columns to convert, the other typed columns are kept as they are. All
+        typed columns are converted by default.
+
+    Returns
+    -------
+    Pandas DataFrame
+        Copy of the dataframe with the columns converted to text, or the
+        dataframe itself if none of them are typed.
+    """
+
+    typed_columns = dataframe.attrs.get('typed_columns', {})
+    converted = {col: TYPE for col, TYPE in typed_columns.items()
+                 if col in dataframe.columns and (columns is None or col in columns)}
+
+    if not converted:
+        return dataframe
+
+    df = dataframe.copy()
+    for col, TYPE in converted.items():
+        df[col] = _column_values(df[col], TYPE)
+
+    df.attrs = {key: value for key, value in dataframe.attrs.items() if key != 'typed_columns'}
+    remaining = {col: TYPE for col, TYPE in typed_columns.items() if col not in converted}
+    if remaining:
+        df.attrs['typed_columns'] = remaining
+
+    return df
+
+
+def _type_values(values, headings, types=None):
+    """Convert the DATA entries of the numeric columns in a 2D object array,
+    with one row per heading, to floats in place (see 'type_numeric_columns()').
+
+    The TYPE of each column is read from the TYPE row, unless 'types' (the
+    output from an earlier call, e.g. for the first rows of the same GROUP)
+    is given.
+
+    Returns
+    -------
+    dict
+        Dictionary of the converted headings and their TYPE
+    """
+
+    import re
+    from math import isfinite
+
+    if 'HEADING' not in headings or values.shape[1] == 0:
+        return types or {}
+
+    row_types = values[headings.index('HEADING')]
+
+    if types is None:
+        type_rows = (row_types == 'TYPE').nonzero()[0]
+
+        if len(type_rows) == 0:
+            return {}
+
+        types = {}
+
+        for i, heading in enumerate(headings):
+            TYPE = values[i, type_rows[0]]
+
+            if isinstance(TYPE, str) and re.fullmatch(r'\d+(DP|SF|SCI)', TYPE) is not None:
+                types[heading] = TYPE
+
+    data_rows = (row_types == 'DATA').nonzero()[0]
+
+    for i, heading in enumerate(headings):
+        TYPE = types.get(heading)
+
+        if TYPE is None:
+            continue
+
+        column = values[i]
+
+        for j in data_rows:
+            text = column[j]
+
+            try:
+                value = float(text)
+            except (TypeError, ValueError):
+                continue
+
+            if isfinite(value) and format_numeric_value(value, TYPE) == text:
+                column[j] = value
+
+    return types
+
+
+def format_numeric_value(value, TYPE):
+    """Format a number as text according to an AGS4 TYPE (e.g. 2DP, 3SF, 1SCI).
+    Values with other TYPEs are returned using str().
+
+    Parameters
+    ----------
+    value : float
+        Number to be formatted
+    TYPE : str
+        AGS4 TYPE
+
+    Returns
+    -------
+    str
+        Formatted value
+    """
+
+    if TYPE.endswith('DP'):
+        return f"{value:.{int(TYPE[:-2])}f}"
+
+    elif TYPE.endswith('SCI'):
+        return f"{value:.{int(TYPE[:-3])}E}"
+
+    elif TYPE.endswith('SF'):
+        return _format_SF(value, TYPE)
+
+    return str(value)
+
+
+def format_numeric_column(dataframe, column_name, TYPE):
+    '''Format column in dataframe to specified TYPE and convert to string.
+
+    Parameters
+    ----------
+    dataframe : Pandas DataFrame
+        Pandas DataFrame with AGS4 data
+    column_name : str
+        Name of column to be formatted
+    TYPE : str
+        AGS4 TYPE for specified column
+
+    Returns
+    -------
+    Pandas DataFrame
+        Pandas DataFrame with formatted data.
+    '''
+
+    from rich import print as rprint
+
+    df = dataframe.copy()
+    col = column_name
+
+    try:
+        if 'DP' in TYPE:
+            i = int(TYPE.strip('DP'))
+            # Apply formatting DATA rows with real numbers. NaNs will be avoided so that they will be exported
+            # as "" rather than "nan"
+            mask = (df.HEADING == "DATA") & df[col].notna()
+            df.loc[mask, col] = df.loc[mask, col].apply(lambda x: f"{x:.{i}f}")
+
+        elif 'SCI' in TYPE:
+            i = int(TYPE.strip('SCI'))
+            # Apply formatting DATA rows with real numbers. NaNs will be avoided so that they will be exported
+            # as "" rather than "nan"
+            mask = (df.HEADING == "DATA") & df[col].notna()
+            df.loc[mask, col] = df.loc[mask, col].apply(lambda x: f"{x:.{i}E}")
+
+        elif 'SF' in TYPE:
+
+            # Apply formatting DATA rows with real numbers. NaNs will be avoided so that they will be exported
+            # as "" rather than "nan"
+            mask = (df.HEADING == "DATA") & df[col].notna()
+            df.loc[mask, [col]] = df.loc[mask, [col]].applymap(lambda x: _format_SF(x, TYPE))
+
+        else:
+            pass
+
+    except ValueError:
+        rprint(f"[yellow]  WARNING: Numeric data in [bold]{col:<9}[/bold] not reformatted as it had one or more non-numeric entries.[/yellow]")
+
+    except TypeError:
+        rprint(f"[yellow]  WARNING: Numeric data in [bold]{col:<9}[/bold] not reformatted as it had one or more non-numeric entries.[/yellow]")
+
+    return df
+
+
+def _format_SF(value, TYPE):
+    '''Format a value to specified number of significant figures
+    and return a string.'''
+
+    from math import log10, floor
+
+    # Avoid log(0) as int(log(0)) will raise an OverflowError
+    if value != 0:
+        i = int(TYPE.strip('SF')) - 1 - int(floor(log10(abs(value))))
+
+    else:
+        return f"{value}"
+
+    if i < 0:
+        return f"{round(value, i):.0f}"
+
+    else:
+        return f"{value:.{i}f}"
+
+
+def check_file(input_file, standard_AGS4_dictionary=None, rename_duplicate_headers=True, workers=None, timings=None):
+    """This function checks the input AGS4 file for errors.
+
+    Parameters
+    ----------
+    input_file : str
+        Path to AGS4 file (*.ags, *.ags.gz or in a zip archive) to be checked
+    standard_AGS4_dict : str
+        Path to .ags file with standard AGS4 dictionary or version number
+        (should be one of '4.1.1', '4.1', '4.0.4', '4.0.3', '4.0').
+    rename_duplicate_headers: bool
+        Rename duplicate headers if found. Neither AGS4 tables nor Pandas
+        dataframes allow duplicate headers, therefore a number will be appended
+        to duplicates to make them unique. (default True)
+    workers : int, optional
+        Number of processes to run the group and dictionary rules in at the
+        same time on large files (default None, one rule after the other)
+    timings : dict, optional
+        Dictionary that the wall-clock time in seconds of the line checks
+        ('line_rules') and of each group and dictionary rule (e.g. 'rule_8')
+        is added to
+
+    Returns
+    -------
+    dict
+        Dictionary contains AGS4 error in input file.
+    """
+
+    from python_ags4 import check
+    from rich import print as rprint
+    import time
+    import traceback
+
+    ags_errors = {}
+
+    if timings is None:
+        timings = {}
+
+    # Line checks
+    with _open_file(input_file, encoding='utf-8', newline='')[0] as f:
+
+        # The file is read once, checking each line for signs of the AGS3 format along with the line rules
+        rprint('[green]  Checking lines...[/green]')
+        start = time.perf_counter()
+        ags_errors, is_ags3 = _check_lines(f, ags_errors=ags_errors, preflight=True)
+        timings['line_rules'] = time.perf_counter() - start
+
+    # Exit if ags3_like line is found
+    if is_ags3:
+        ags_errors = _add_meta_data(input_file, standard_AGS4_dictionary, ags_errors=ags_errors)
+        return ags_errors
+
+    # Import file into Pandas DataFrame to run group checks
+    try:
+        rprint('[green]  Loading tables...[/green]')
+        tables, headings, line_numbers = AGS4_to_dataframe(input_file, get_line_numbers=True, rename_duplicate_headers=rename_duplicate_headers)
+
+    except AGS4Error as err:
+        rprint('[red] ERROR: Could not continue with group checks on file. Please review error log and fix line errors first.[/red]')
+        raise err
+
+    except UnboundLocalError:
+        # The presence of a byte-order-mark (BOM) in the same row as first
+        # "GROUP" line can cause this exception. This will be caught by line
+        # checks for Rule 1 (since the BOM is not an ASCII character) and Rule 3
+        # (since the BOM precedes the string "GROUP"). The BOM encoding can be
+        # ignored by setting the 'encoding' argument to 'utf-8-sig'.
+        tables, headings, line_numbers = AGS4_to_dataframe(input_file, encoding='utf-8-sig',
+                                                           get_line_numbers=True, rename_duplicate_headers=rename_duplicate_headers)
+
+        # Add warning to error log
+        msg = 'This file seems to be encoded with a byte-order-mark (BOM). It is highly recommended that the '\
+              'file be saved without BOM encoding to avoid issues with other sofware.'
+        ags_errors = check.add_error_msg(ags_errors, 'General', '', '', msg)
+
+    except Exception:
+        err = traceback.format_exc()
+        rprint('[red] ERROR: Could not continue with group checks on file. Please review error log and fix line errors first.[/red]')
+        rprint(f'[red]\n{err}[/red]')
+
+        # Add metadata
+        ags_errors = _add_meta_data(input_file, standard_AGS4_dictionary, ags_errors=ags_errors)
+
+        return ags_errors
+
+    ags_errors, standard_AGS4_dictionary = _check_groups(tables, headings, line_numbers, input_file,
+                                                         standard_AGS4_dictionary=standard_AGS4_dictionary, ags_errors=ags_errors,
+                                                         workers=workers, timings=timings)
+
+    # Add metadata
+    ags_errors = _add_meta_data(input_file, standard_AGS4_dictionary, ags_errors=ags_errors)
+
+    return ags_errors
+
+
+def check_tables(tables, headings=None, standard_AGS4_dictionary=None, filepath=None, workers=None, timings=None,
+                 versions=None, cache=None, locations=None):
+    """This function checks AGS4 tables that are already loaded for errors,
+    without writing them to a file and reading it back.
+
+    The tables are serialised in memory, one block of rows at a time, exactly
+    as 'dataframe_to_AGS4()' would write them, and the line checks are run on
+    that text. The group and dictionary checks are run on the tables
+    themselves, with the line numbers their rows would have in the written
+    file. The errors are the same as for 'check_file()' on the written file.
+
+    Parameters
+    ----------
+    tables : dict
+        Dictionary of Pandas dataframes (e.g. output from 'AGS4_to_dataframe()')
+    headings : dict, optional
+        Dictionary of lists with the headings of the tables in the order they
+        would be written (all the columns of each table except 'line_number'
+        and 'source_file' by default)
+    standard_AGS4_dict : str
+        Path to .ags file with standard AGS4 dictionary or version number
+        (should be one of '4.1.1', '4.1', '4.0.4', '4.0.3', '4.0').
+    filepath : str, optional
+        Path to the file the tables were loaded from, used for the FILE folder
+        check (Rule 20) and the meta data
+    workers : int, optional
+        Number of processes to run the group and dictionary rules in at the
+        same time on large files (default None, one rule after the other)
+    timings : dict, optional
+        Dictionary that the wall-clock time in seconds of the line checks
+        ('line_rules') and of each group and dictionary rule (e.g. 'rule_8')
+        is added to
+    versions : dict, optional
+        Dictionary with a number for each group that is changed whenever the
+        table is edited in place (tables that are replaced, or that gain or
+        lose rows or columns, are picked up without it)
+    cache : CheckCache, optional
+        Results of the previous check of the same tables. Only the groups that
+        changed since then, and the rules that depend on them, are checked
+        again, and the cache is updated with the new results.
+    locations : dict, optional
+        Dictionary that the line number of each row of each table in the
+        written file is added to, as an array under the name of the group
+        (see 'error_index()')
+
+    Returns
+    -------
+    dict
+        Dictionary contains AGS4 error in tables.
+    """
+
+    import io
+    import time
+    from rich import print as rprint
+
+    ags_errors = {}
+
+    if timings is None:
+        timings = {}
+
+    columns = {}
+    for key, df in tables.items():
+        if headings is not None and key in headings:
+            columns[key] = [col for col in headings[key] if col != 'line_number']
+        else:
+            columns[key] = [col for col in df.columns if col not in ['line_number', 'source_file']]
+
+    # Groups that have not changed since the last check with the same 'cache' are not checked again.
+    # Without one, the results are only kept for the length of this check.
+    incremental = cache is not None
+
+    if cache is None:
+        cache = CheckCache()
+
+    if versions is None:
+        versions = {}
+
+    stamps = {key: (versions.get(key), id(df), tuple(columns[key]), df.shape) for key, df in tables.items()}
+    cache.prune(tables)
+
+    # Line checks, group by group, with the line number each group starts on
+    starts = {}
+    line = 1
+
+    rprint('[green]  Checking lines...[/green]')
+    start = time.perf_counter()
+
+    for key, df in tables.items():
+        starts[key] = line
+        cached = cache.lines.get(key)
+
+        # Line 1 is reported differently by Rule 1, so a group that moves to or from the start is checked again
+        if cached is None or cached[0] != stamps[key] or (cached[1] == 1) != (line == 1):
+            counts = {}
+            errors, is_ags3 = _check_lines(_serialise_lines({key: df}, columns, counts), ags_errors={}, preflight=True, start=line)
+            cached = cache.lines[key] = (stamps[key], line, counts[key], errors, is_ags3)
+
+        _, cached_start, count, errors, is_ags3 = cached
+        errors = _shift_errors(errors, line - cached_start)
+
+        if is_ags3:
+            timings['line_rules'] = time.perf_counter() - start
+            return _add_meta_data(filepath if filepath is not None else io.StringIO(), standard_AGS4_dictionary, ags_errors=errors)
+
+        for rule, items in errors.items():
+            ags_errors.setdefault(rule, []).extend(items)
+
+        line += count
+
+    timings['line_rules'] = time.perf_counter() - start
+
+    # Add line numbers to text copies of the tables to run group checks
+    rprint('[green]  Loading tables...[/green]')
+    text_tables = {}
+    text_headings = {}
+    line_numbers = {}
+
+    try:
+        for key, df in tables.items():
+            cached = cache.tables.get(key)
+
+            if cached is None or cached[0] != stamps[key]:
+                text_table = _text_table(key, df, columns[key], starts[key], cache.lines[key][2])
+                cached = cache.tables[key] = (stamps[key], starts[key]) + text_table
+
+            elif cached[1] != starts[key]:
+                # Rows were added to or removed from a group before this one
+                delta = starts[key] - cached[1]
+                cached[2]['line_number'] += delta
+                cached = cache.tables[key] = (stamps[key], starts[key], cached[2], cached[3],
+                                              {name: number + delta for name, number in cached[4].items()})
+
+            text_tables[key], text_headings[key], line_numbers[key] = cached[2:]
+
+            if locations is not None:
+                locations[key] = text_tables[key]['line_number'].to_numpy(dtype='int64')
+
+    except AGS4Error as err:
+        rprint('[red] ERROR: Could not continue with group checks on file. Please review error log and fix line errors first.[/red]')
+        raise err
+
+    ags_errors, standard_AGS4_dictionary = _check_groups(text_tables, text_headings, line_numbers, filepath or '',
+                                                         standard_AGS4_dictionary=standard_AGS4_dictionary, ags_errors=ags_errors,
+                                                         workers=workers, timings=timings,
+                                                         cache=cache if incremental else None, stamps=stamps, starts=starts)
+
+    # Add metadata
+    ags_errors = _add_meta_data(filepath if filepath is not None else io.StringIO(), standard_AGS4_dictionary, ags_errors=ags_errors)
+
+    return ags_errors
+
+
+def error_index(ags_errors, locations, tables=None):
+    """Collect the errors found by 'check_tables()' in a table with the row
+    and column of the table each error refers to.
+
+    Parameters
+    ----------
+    ags_errors : dict
+        Dictionary of errors returned by 'check_tables()'
+    locations : dict
+        Line numbers of the rows of each table, filled in by 'check_tables()'
+    tables : dict, optional
+        Dictionary of Pandas dataframes that were checked. If given, 'row' is
+        the index label of the row in its table rather than its position, so
+        that it still points at the same row once the table is sorted.
+
+    Returns
+    -------
+    DataFrame
+        Table with one error per row and columns 'line', 'group', 'rule' and
+        'desc' as in the error dictionary, and 'row' and 'column' with the
+        row and heading of the entry the error is about. 'row' is missing for
+        errors that are not about a row (e.g. on a HEADING row), and 'column'
+        if no heading of the group is named in the description.
+    """
+
+    import numpy as np
+    from pandas import DataFrame, Series, factorize, to_numeric
+
+    records = [(item['line'], item['group'], rule, item['desc'])
+               for rule, items in ags_errors.items() if rule != 'Metadata' for item in items]
+    index = DataFrame(records, columns=['line', 'group', 'rule', 'desc'])
+    lines = to_numeric(index['line'], errors='coerce').fillna(-1).to_numpy(dtype='int64')
+
+    # Rows are written out in the order of the groups, so the line numbers of all of them are in order
+    # and each error line is found with a binary search
+    groups = list(locations)
+    row_lines = np.concatenate([locations[key] for key in groups] + [np.empty(0, dtype='int64')])
+    row_groups = np.repeat(np.arange(len(groups)), [len(locations[key]) for key in groups])
+    row_positions = np.concatenate([np.arange(len(locations[key])) for key in groups] + [np.empty(0, dtype='int64')])
+
+    found = np.searchsorted(row_lines, lines).clip(max=max(len(row_lines) - 1, 0))
+    is_row = (lines >= 0) & (row_lines[found] == lines) if len(row_lines) else np.zeros(len(lines), dtype=bool)
+
+    # Errors from the line checks are not always given a group
+    index.loc[is_row, 'group'] = np.array(groups, dtype=object)[row_groups[found[is_row]]]
+
+    rows = np.full(len(index), -1, dtype='int64')
+    rows[is_row] = row_positions[found[is_row]]
+
+    if tables is not None:
+        for key in groups:
+            mask = is_row & (index['group'].to_numpy() == key)
+            if mask.any():
+                rows[mask] = tables[key].index.to_numpy()[rows[mask]]
+
+    index['row'] = Series(rows, dtype='Int64').mask(~is_row)
+
+    # The last heading of the group named in the description, e.g. 'Value 1.5 in SAMP_TOP not of data type 2DP.'
+    columns = np.full(len(index), None, dtype=object)
+
+    for key, positions in index.groupby('group').indices.items():
+        names = [] if tables is None or key not in tables else [col for col in tables[key].columns if col not in ['HEADING', 'line_number', 'source_file']]
+        if not names:
+            continue
+
+        pattern = r'^.*(?<!\w)(' + '|'.join(re.escape(name) for name in sorted(names, key=len, reverse=True)) + r')(?!\w)'
+        # Many errors share a description, so each one is only searched once
+        codes, descriptions = factorize(index['desc'].to_numpy()[positions])
+        names = Series(descriptions).str.extract(pattern, expand=False)
+        columns[positions] = names.where(names.notna(), None).to_numpy()[codes]
+
+    index['column'] = columns
+
+    return index
+
+
+def _serialise_lines(tables, columns, counts):
+    """Yield the lines 'dataframe_to_AGS4()' would write for the tables,
+    counting the lines written for each group in 'counts'."""
+
+    import io
+
+    for key, df in tables.items():
+        counts[key] = 0
+
+        for _, task in _block_tasks({key: df}, {key: columns[key]}, warnings=False, verbose=False):
+            for line in io.StringIO(_format_block(task), newline=''):
+                counts[key] += 1
+                yield line
+
+
+def _text_table(key, df, columns, line, count):
+    """Return a table as it would be read back from the file written by
+    'dataframe_to_AGS4()' with 'get_line_numbers=True', along with its
+    headings and the line numbers of its GROUP and HEADING rows.
+
+    'line' is the line number of the GROUP row and 'count' the number of lines
+    written for the group (see '_serialise_lines()'). Each row takes up one
+    line unless an entry has a line-break in it, in which case the group is
+    written out and parsed again.
+    """
+
+    import io
+    import numpy as np
+    from pandas import DataFrame
+    from pandas.api.types import infer_dtype
+
+    if count != df.shape[0] + 3 or len(columns) == 0:
+        text = ''.join(_format_block(task) for _, task in _block_tasks({key: df}, {key: columns}, warnings=False, verbose=False))
+        parsed, headings, line_numbers = _AGS4_to_columns(io.StringIO(text), get_line_numbers=True, start=line)
+
+        return parsed[key], headings[key], line_numbers[key]
+
+    typed_columns = df.attrs.get('typed_columns', {})
+    data = {}
+
+    for col in columns:
+        values = _column_values(df[col], typed_columns.get(col))
+
+        # Entries that are not text are written with str(), as by csv.writer
+        if infer_dtype(values, skipna=False) != 'string':
+            values = np.array([str(value) for value in values], dtype=object)
+
+        data[col] = values
+
+    data['line_number'] = np.arange(line + 2, line + 2 + df.shape[0])
+
+    return DataFrame(data, copy=False), columns + ['line_number'], {'GROUP': line, 'HEADING': line + 1}
+
+
+def _check_lines(lines, ags_errors, preflight=False, start=1):
+    """Run the line checks of 'check_file()' on an iterable of lines, the
+    first of which is line number 'start'.
+
+    With preflight=True each line is also checked for signs of the AGS3
+    format, and the checks stop at the first such line.
+
+    Returns
+    -------
+    dict or tuple
+        The updated error dictionary, and with preflight=True whether an AGS3
+        like line was found. In that case the dictionary only holds that
+        error.
+    """
+
+    from python_ags4 import check
+
+    # Initiate group name and headings list
+    group = ''
+    headings = []
+
+    for i, line in enumerate(lines, start=start):
+
+        # Most lines in a large file are DATA rows with no errors. These are picked out with a
+        # compiled pattern and skipped, so the rules below only run on the lines that need them
+        if len(headings) == line.count('","') + 1 and _CLEAN_DATA_LINE.fullmatch(line) and line.isascii():
+            continue
+
+        if preflight:
+            ags3_errors = check.is_ags3_like(line, i, ags_errors={})
+
+            if 'AGS Format Rule 3' in ags3_errors:
+                return ags3_errors, True
+
+        # Track headings to be used with group checks
+        if line.strip('"').startswith("GROUP"):
+            # Reset group name and headings list at the beginning each group
+            group = ''
+            headings = []
+
+            try:
+                group = _split_line(line)[1]
+
+            except IndexError:
+                # GROUP name not available (Rule 19 should catch this error)
+                pass
+
+        elif line.strip('"').startswith("HEADING"):
+            headings = _split_line(line)
+
+        # Call line Checks
+        ags_errors = check.rule_1(line, i, ags_errors=ags_errors)
+        ags_errors = check.rule_2a(line, i, ags_errors=ags_errors)
+        ags_errors = check.rule_3(line, i, ags_errors=ags_errors)
+        ags_errors = check.rule_4_1(line, i, ags_errors=ags_errors)
+        ags_errors = check.rule_4_2(line, i, group=group, headings=headings, ags_errors=ags_errors)
+        ags_errors = check.rule_5(line, i, ags_errors=ags_errors)
+        ags_errors = check.rule_6(line, i, ags_errors=ags_errors)
+        ags_errors = check.rule_7_1(line, i, ags_errors=ags_errors)
+        ags_errors = check.rule_19(line, i, ags_errors=ags_errors)
+        ags_errors = check.rule_19a(line, i, group=group, ags_errors=ags_errors)
+        ags_errors = check.rule_19b_1(line, i, group=group, ags_errors=ags_errors)
+
+    if preflight:
+        return ags_errors, False
+
+    return ags_errors
+
+
+# Group and dictionary rules run by '_check_groups()' in this order, with the module each
+# rule is taken from ('check' for python_ags4, 'check_edit' for common.check_package_edit)
+# and the arguments it takes
+_GROUP_RULES = (('rule_2', 'check', ('tables', 'headings', 'line_numbers')),
+                ('rule_2b', 'check', ('tables', 'headings', 'line_numbers')),
+                ('rule_8', 'check_edit', ('tables', 'headings', 'line_numbers')),
+                ('rule_12', 'check', ('tables', 'headings')),
+                ('rule_13', 'check', ('tables', 'headings', 'line_numbers')),
+                ('rule_14', 'check', ('tables', 'headings', 'line_numbers')),
+                ('rule_15', 'check', ('tables', 'headings', 'line_numbers')),
+                ('rule_20', 'check', ('tables', 'headings', 'filepath')),
+                ('rule_7_2', 'check', ('headings', 'dictionary', 'line_numbers')),
+                ('rule_9', 'check', ('headings', 'dictionary', 'line_numbers')),
+                ('rule_10a', 'check_edit', ('tables', 'headings', 'dictionary', 'line_numbers')),
+                ('rule_10b', 'check', ('tables', 'headings', 'dictionary', 'line_numbers')),
+                ('rule_10c', 'check_edit', ('tables', 'headings', 'dictionary', 'line_numbers')),
+                ('rule_11', 'check', ('tables', 'headings', 'dictionary')),
+                ('rule_16', 'check_edit', ('tables', 'headings', 'dictionary')),
+                ('rule_17', 'check', ('tables', 'headings', 'dictionary')),
+                ('rule_18', 'check', ('tables', 'headings')),
+                ('rule_19b_2', 'check', ('tables', 'headings', 'dictionary', 'line_numbers')),
+                ('rule_19b_3', 'check', ('tables', 'headings', 'dictionary', 'line_numbers')))
+
+# Rules that check each group on its own, which '_check_groups()' can re-run for just the groups
+# that changed since the last check. Besides the group itself, each depends on the dictionary
+# (standard dictionary and DICT group), the parent group, or the ABBR and TRAN groups.
+_GROUP_RULE_INPUTS = {'rule_2': (),
+                      'rule_2b': (),
+                      'rule_8': (),
+                      'rule_7_2': ('dictionary',),
+                      'rule_9': ('dictionary',),
+                      'rule_10a': ('dictionary',),
+                      'rule_10b': ('dictionary',),
+                      'rule_10c': ('dictionary', 'parent'),
+                      'rule_16': ('ABBR', 'TRAN'),
+                      'rule_19b_2': ('dictionary',),
+                      'rule_19b_3': ('dictionary',)}
+
+# Rules that look at the errors found by the rules before them, and so are not run in parallel.
+# rule_18() relies on rule_9() to flag non-standard headings.
+_SERIAL_RULES = ('rule_18',)
+
+# Tables with fewer cells than this are checked in one process (see '_check_groups()')
+_PARALLEL_CHECK_CELLS = 2000000
+
+# Tables, headings, line numbers, file path and combined dictionary of the file
+# being checked, in each process of the pool used by '_check_groups()'
+_check_state = None
+
+
+def _check_groups(tables, headings, line_numbers, filepath, standard_AGS4_dictionary=None, ags_errors={},
+                  workers=None, timings=None, cache=None, stamps=None, starts=None):
+    """Run the group and dictionary checks of 'check_file()' on tables loaded
+    with 'get_line_numbers=True'.
+
+    With workers set, independent rules run at the same time in a pool of
+    processes that each receive the tables once. The errors are still merged
+    in the order of '_GROUP_RULES', so they are the same as when the rules
+    run one after the other.
+
+    With a CheckCache, the rules in '_GROUP_RULE_INPUTS' run group by group
+    and the errors found for a group are reused until the group ('stamps') or
+    one of the inputs of the rule changes. 'starts' has the line number of
+    the GROUP row of each group, to move the errors of groups that have
+    shifted in the file since. The other rules look at the whole file and
+    always run.
+
+    If 'timings' is a dictionary, the wall-clock time of each rule in
+    seconds is added to it under the name of the rule.
+
+    Returns
+    -------
+    tuple
+        The updated error dictionary and the path to the standard dictionary
+        that was used
+    """
+
+    from python_ags4 import check
+    from rich import print as rprint
+
+    # Pick path to standard dictionary
+    if standard_AGS4_dictionary in [None, '4.1.1', '4.1', '4.0.4', '4.0.3', '4.0']:
+        # Filepath to the standard dictionary will be picked based on version
+        # number if a valid version number is provided. If it is not specified
+        # at all, then the filepath will be selected based on the value of
+        # TRAN_AGS in the TRAN table.
+        standard_AGS4_dictionary = check.pick_standard_dictionary(tables=tables, dict_version=standard_AGS4_dictionary)
+
+    # Import standard dictionary into Pandas DataFrames (parsed once and then reused, see 'load_dictionary()')
+    tables_std_dict = load_dictionary(standard_AGS4_dictionary).tables
+
+    # Combine standard dictionary with DICT table in input file to create an extended dictionary
+    # This extended dictionary is used to check the file schema
+    dictionary = check.combine_DICT_tables(tables_std_dict, tables)
+
+    state = {'tables': tables, 'headings': headings, 'line_numbers': line_numbers,
+             'filepath': filepath, 'dictionary': dictionary}
+
+    if timings is None:
+        timings = {}
+
+    for rule, _, _ in _GROUP_RULES:
+        timings[rule] = 0.0
+
+    # List the rules to run, with the group to run each on (None for all of them), and the
+    # inputs that the errors of a group depend on
+    jobs = []
+
+    if cache is not None:
+        inputs = {'dictionary': (str(standard_AGS4_dictionary), stamps.get('DICT')),
+                  'ABBR': stamps.get('ABBR'),
+                  'TRAN': stamps.get('TRAN')}
+        groups = dictionary.loc[dictionary['DICT_TYPE'] == 'GROUP'].drop_duplicates('DICT_GRP')
+        parents = dict(zip(groups['DICT_GRP'], groups['DICT_PGRP']))
+
+    for rule, _, _ in _GROUP_RULES:
+        # Without an ABBR group, Rule 16 stops at the first group that needed it
+        if cache is None or rule not in _GROUP_RULE_INPUTS or (rule == 'rule_16' and 'ABBR' not in tables):
+            jobs.append((rule, None, None))
+            continue
+
+        for group in tables:
+            stamp = [stamps[group]]
+
+            for name in _GROUP_RULE_INPUTS[rule]:
+                stamp.append(stamps.get(parents.get(group)) if name == 'parent' else inputs[name])
+
+            jobs.append((rule, group, tuple(stamp)))
+
+    # Errors from the last check that can be reused, moved to the current line numbers
+    results = {}
+
+    for rule, group, stamp in jobs:
+        cached = None if group is None else cache.rules.get((rule, group))
+
+        if cached is not None and cached[0] == stamp:
+            results[(rule, group)] = (_shift_errors(cached[2], starts[group] - cached[1]), 0.0)
+
+    pending = [(rule, group) for rule, group, _ in jobs if (rule, group) not in results and rule not in _SERIAL_RULES]
+
+    # A pool only pays for itself once the tables are large
+    if workers is not None and sum(df.size for df in tables.values()) < _PARALLEL_CHECK_CELLS:
+        workers = None
+
+    rprint('[green]  Checking headings, groups and file schema...[/green]')
+
+    executor = None
+
+    if workers is not None and workers != 1 and pending:
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_check_worker, initargs=(state,))
+
+        for rule, group in pending:
+            results[(rule, group)] = executor.submit(_run_rule, rule, group=group)
+
+    try:
+        for rule, group, stamp in jobs:
+            if rule in _SERIAL_RULES:
+                ags_errors, timings[rule] = _run_rule(rule, state, ags_errors)
+                continue
+
+            result = results.get((rule, group))
+
+            if result is None:
+                errors, seconds = _run_rule(rule, state, group=group)
+            elif isinstance(result, tuple):
+                errors, seconds = result
+            else:
+                errors, seconds = result.result()
+
+            if group is not None and (rule, group) in pending:
+                cache.rules[(rule, group)] = (stamp, starts[group], errors)
+
+            timings[rule] += seconds
+
+            for key, items in errors.items():
+                ags_errors.setdefault(key, []).extend(items)
+
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return ags_errors, standard_AGS4_dictionary
+
+
+def _init_check_worker(state):
+    global _check_state
+    _check_state = state
+
+
+def _run_rule(rule, state=None, ags_errors=None, group=None):
+    """Run one of '_GROUP_RULES' and return the errors along with the time it took.
+
+    Without 'state', the rule runs on the tables sent to this process of the
+    pool (see '_init_check_worker()') and returns only the errors it found.
+    With 'group', the rule only looks at that group (the tables of the other
+    groups can still be looked up, e.g. the parent group by Rule 10c).
+    """
+
+    import time
+    from python_ags4 import check
+    from common import check_package_edit as check_edit
+
+    if state is None:
+        state = _check_state
+
+    if ags_errors is None:
+        ags_errors = {}
+
+    if group is not None:
+        state = {name: _GroupView(value, group) if name in ('tables', 'headings', 'line_numbers') else value
+                 for name, value in state.items()}
+
+    module, arguments = next((module, arguments) for name, module, arguments in _GROUP_RULES if name == rule)
+    function = getattr(check_edit if module == 'check_edit' else check, rule)
+
+    start = time.perf_counter()
+    ags_errors = function(*[state[argument] for argument in arguments], ags_errors=ags_errors)
+
+    return ags_errors, time.perf_counter() - start
+
+
+def _shift_errors(ags_errors, delta):
+    """Return a copy of an error dictionary with the line numbers moved by 'delta'."""
+
+    if delta == 0:
+        return ags_errors
+
+    return {rule: [dict(item, line=item['line'] if isinstance(item['line'], str) else item['line'] + delta) for item in items]
+            for rule, items in ags_errors.items()}
+
+
+# Dictionary functions #
+
+# Versions of the standard dictionary that ship with python_ags4
+_STANDARD_DICT_VERSIONS = ('4.1.1', '4.1', '4.0.4', '4.0.3', '4.0')
+
+# Optional cache that parsed dictionaries are kept in between sessions (see 'set_dictionary_cache()')
+_dictionary_cache = None
+
+
+def set_dictionary_cache(cache):
+    """Set the cache that parsed dictionaries are stored in between sessions.
+
+    Parameters
+    ----------
+    cache : object
+        Any object with 'get(filepath, name)' and 'put(filepath, name, obj)'
+        methods (e.g. common.cache_functions.ParseCache), or None to only
+        keep parsed dictionaries in memory
+    """
+
+    global _dictionary_cache
+    _dictionary_cache = cache
+
+
+def load_dictionary(dictionary=None, tables=None):
+    """Load an AGS4 dictionary, parsing each dictionary file only once.
+
+    Parsed dictionaries are kept in memory for the rest of the process and,
+    if a cache has been set with 'set_dictionary_cache()', on disk so that
+    later sessions do not parse them again either.
+
+    Parameters
+    ----------
+    dictionary : str or Path
+        Version of the standard dictionary ('4.1.1', '4.1', '4.0.4', '4.0.3',
+        '4.0') or path to an AGS4 file with a DICT group. If it is not
+        specified, the standard dictionary is picked based on the value of
+        TRAN_AGS in the TRAN table of 'tables'.
+    tables : dict
+        Dictionary of Pandas DataFrames used to pick the standard dictionary
+        when no dictionary is given (default None)
+
+    Returns
+    -------
+    AGS4Dictionary
+        Parsed dictionary (shared between callers, so it must not be modified)
+    """
+
+    import os
+    from python_ags4 import check
+
+    if dictionary is None or dictionary in _STANDARD_DICT_VERSIONS:
+        dictionary = check.pick_standard_dictionary(tables=tables, dict_version=dictionary)
+
+    stat = os.stat(dictionary)
+
+    return _load_dictionary(os.path.abspath(dictionary), stat.st_size, stat.st_mtime)
+
+
+@functools.lru_cache(maxsize=16)
+def _load_dictionary(filepath, size, mtime):
+    # Size and mtime are only part of the key so that an edited dictionary file is parsed again
+
+    compiled = None
+    if _dictionary_cache is not None:
+        compiled = _dictionary_cache.get(filepath, '_dictionary')
+
+    if compiled is None:
+        tables, _ = AGS4_to_dataframe(filepath)
+        compiled = (tables, _index_dictionary(tables))
+
+        if _dictionary_cache is not None:
+            _dictionary_cache.put(filepath, '_dictionary', compiled)
+
+    return AGS4Dictionary(filepath, *compiled)
+
+
+def _index_dictionary(tables):
+    """Map each heading in a DICT table to (group, DICT_STAT, DICT_DTYP, DICT_UNIT).
+
+    Headings that are defined in more than one group (e.g. LOCA_ID) are
+    mapped to the first group they appear in.
+    """
+
+    try:
+        DICT = tables['DICT']
+    except KeyError:
+        return {}
+
+    DICT = DICT.loc[DICT.DICT_TYPE == 'HEADING']
+
+    index = {}
+    for item in zip(DICT.DICT_HDNG, DICT.DICT_GRP, DICT.DICT_STAT, DICT.DICT_DTYP, DICT.DICT_UNIT):
+        index.setdefault(item[0], item[1:])
+
+    return index
+
+
+class AGS4Dictionary:
+    """AGS4 dictionary returned by 'load_dictionary()'.
+
+    'tables' holds the dataframes parsed from the dictionary file and
+    'headings' maps each heading to (group, DICT_STAT, DICT_DTYP, DICT_UNIT),
+    so that the type and unit of a heading can be looked up without
+    searching the DICT table.
+
+    e.g.
+    >>dictionary = load_dictionary('4.1.1')
+    >>dictionary.lookup('LOCA_NATE')
+    ('LOCA', 'OTHER', '2DP', 'm')
+    """
+
+    def __init__(self, filepath, tables, headings):
+        self.filepath = filepath
+        self.tables = tables
+        self.headings = headings
+
+    def lookup(self, heading):
+        """Return (group, DICT_STAT, DICT_DTYP, DICT_UNIT) for heading, or None if it is not in the dictionary."""
+
+        return self.headings.get(heading)
+
+
+# Helper functions/classes #
+
+def _open_file(filepath_or_buffer, encoding='utf-8', newline=None):
+    """Open an AGS4 file for reading unless a file like object is passed in.
+
+    Gzip compressed files (*.ags.gz) and members of zip archives are
+    decompressed as they are read (see 'open_AGS4()').
+
+    Returns
+    -------
+    tuple
+        File object and whether it should be closed by the caller
+    """
+
+    if _is_file_like(filepath_or_buffer):
+        return filepath_or_buffer, False
+
+    return open_AGS4(filepath_or_buffer, encoding=encoding, newline=newline), True
+
+
+def open_AGS4(filepath, encoding='utf-8', newline=None):
+    """Open a plain, gzip compressed or zipped AGS4 file as a text stream.
+
+    Compressed files are decompressed as they are read, without extracting
+    them to disk. A member of a zip archive is addressed by appending its
+    name to the path of the archive (e.g. 'Bundle.zip/Lab.ags'), as with
+    Python's zipimport. If the path of a zip archive is given on its own, it
+    has to contain a single AGS4 file.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to .ags, .ags.gz or .zip file, or to a member of a zip archive
+    encoding : str
+        Encoding of text file (default 'utf-8')
+    newline : str, optional
+        Passed on to open(), use '' to keep line endings as they are
+
+    Returns
+    -------
+    File object opened for reading text. UnicodeDecodeErrors are replaced.
+    """
+
+    import gzip
+    import io
+    import zipfile
+
+    zip_path = _split_zip_path(filepath)
+
+    if zip_path is not None:
+        archive, member = zip_path
+
+        with zipfile.ZipFile(archive) as z:
+            if member is None:
+                members = zip_members(archive)
+
+                if len(members) != 1:
+                    raise AGS4Error(f"{archive} contains {len(members)} AGS4 files, please select one of: {', '.join(members)}")
+
+                member = members[0]
+
+            # The member keeps the archive file open until it is closed
+            f = z.open(member)
+
+        if member.lower().endswith('.gz'):
+            f = gzip.GzipFile(fileobj=f)
+
+        return io.TextIOWrapper(f, encoding=encoding, errors="replace", newline=newline)
+
+    if str(filepath).lower().endswith('.gz'):
+        return gzip.open(filepath, "rt", encoding=encoding, errors="replace", newline=newline)
+
+    # Read file with errors="replace" to catch UnicodeDecodeErrors
+    return open(filepath, "r", encoding=encoding, errors="replace", newline=newline)
+
+
+def zip_members(filepath):
+    """List the AGS4 files (*.ags and *.ags.gz) in a zip archive.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to zip archive
+
+    Returns
+    -------
+    list
+        Names of the AGS4 files in the archive
+    """
+
+    import zipfile
+
+    with zipfile.ZipFile(filepath) as z:
+        return [name for name in z.namelist() if name.lower().endswith(('.ags', '.ags.gz'))]
+
+
+def is_compressed(filepath):
+    """Check whether a path is a gzip compressed AGS4 file, a zip archive or a
+    member of a zip archive. These can only be read from start to end, so they
+    cannot be indexed or loaded lazily.
+    """
+
+    if _is_file_like(filepath):
+        return False
+
+    return str(filepath).lower().endswith('.gz') or _split_zip_path(filepath) is not None
+
+
+def _split_zip_path(filepath):
+    """Split a path into a zip archive and the name of a member in it.
+
+    Returns
+    -------
+    tuple or None
+        Path to the archive and name of the member (None if the path is the
+        archive itself), or None if the path is not in a zip archive
+    """
+
+    import os
+    import re
+
+    filepath = str(filepath)
+
+    if filepath.lower().endswith('.zip'):
+        return filepath, None
+
+    for match in re.finditer(r'\.zip[\\/]', filepath, flags=re.IGNORECASE):
+        archive = filepath[:match.end() - 1]
+
+        if os.path.isfile(archive):
+            return archive, filepath[match.end():].replace('\\', '/')
+
+    return None
+
+
+def _add_meta_data(input_file, standard_AGS4_dictionary, ags_errors):
+    """Add meta data to the error list with 'check.add_meta_data()', which
+    cannot find the size of a file in a zip archive.
+    """
+
+    import os
+    from python_ags4 import check
+
+    zip_path = _split_zip_path(input_file)
+
+    if zip_path is None or zip_path[1] is None:
+        return check.add_meta_data(input_file, standard_AGS4_dictionary, ags_errors=ags_errors)
+
+    import zipfile
+
+    archive, member = zip_path
+
+    with zipfile.ZipFile(archive) as z:
+        size = z.getinfo(member).file_size
+
+    check.add_error_msg(ags_errors, 'Metadata', 'File Name', '', f'{os.path.basename(archive)}/{member}')
+    check.add_error_msg(ags_errors, 'Metadata', 'File Size', '', f'{int(size / 1024)} kB')
+
+    # Passing a file like object skips the name and size of the file
+    import io
+
+    return check.add_meta_data(io.StringIO(), standard_AGS4_dictionary, ags_errors=ags_errors)
+
+
+def _empty_dataframe():
+    """Return the dataframe used for a GROUP without a HEADING row."""
+
+    from pandas import DataFrame
+
+    return DataFrame({})
+
+
+class _ColumnBuffer:
+    """Preallocated column buffer that the rows of a single GROUP are written into.
+
+    Entries are stored in a 2D NumPy object array with one row per heading,
+    which grows in chunks as rows are appended. 'to_dataframe()' hands the
+    filled part of the array to Pandas as a single block without copying it.
+    """
+
+    chunk_rows = 4096
+
+    def __init__(self, headings, line_numbers=False):
+        import numpy as np
+
+        self.headings = list(headings)
+        self.rows = 0
+        self.interned = 0
+        self.values = np.empty((len(self.headings), self.chunk_rows), dtype=object)
+        self.line_numbers = np.empty(self.chunk_rows, dtype='int64') if line_numbers else None
+
+    def append(self, row, line_number=0):
+        if self.rows == self.values.shape[1]:
+            self._grow()
+
+        self.values[:, self.rows] = row
+
+        if self.line_numbers is not None:
+            self.line_numbers[self.rows] = line_number
+
+        self.rows += 1
+
+    def _grow(self):
+        import numpy as np
+
+        # Share repeated entries in the rows added since the buffer last grew, so duplicates are
+        # released as the group is read rather than at the end
+        self._intern()
+
+        # Double the capacity so that appending stays amortised O(1)
+        capacity = self.values.shape[1] * 2
+
+        values = np.empty((self.values.shape[0], capacity), dtype=object)
+        values[:, :self.rows] = self.values
+        self.values = values
+
+        if self.line_numbers is not None:
+            self.line_numbers = np.resize(self.line_numbers, capacity)
+
+    def _intern(self):
+        _intern_values(self.values[:, self.interned:self.rows])
+        self.interned = self.rows
+
+    def filled(self):
+        """Return a view of the filled part of the buffer."""
+
+        self._intern()
+
+        return self.values[:, :self.rows]
+
+    def to_dataframe(self, typed=False, types=None):
+        from pandas import DataFrame
+
+        values = self.filled()
+
+        # Only trim the spare capacity when it is a sizeable part of the buffer. This copies
+        # the references to the strings, not the strings themselves
+        if self.values.shape[1] > self.chunk_rows and self.rows < 0.75 * self.values.shape[1]:
+            values = values.copy()
+
+        # Numbers are converted in the buffer, before it is handed over, to avoid another copy
+        typed_columns = _type_values(values, self.headings, types=types) if typed is True else None
+
+        # The transpose is a view, which Pandas keeps as the values of a single object block
+        df = DataFrame(values.T, columns=self.headings, copy=False)
+
+        if typed_columns is not None:
+            df.attrs['typed_columns'] = typed_columns
+
+        if self.line_numbers is not None:
+            df['line_number'] = self.line_numbers[:self.rows].copy()
+
+        return df
+
+
+def _intern_values(values, max_ratio=0.5, sample_rows=1024):
+    """Make repeated entries in each row of a 2D object array (one row per
+    heading) refer to a single Python object, in place.
+
+    Every parsed entry is a separate string, so columns such as HEADING,
+    LOCA_ID or SAMP_TYPE hold the same few values many thousands of times.
+    Low cardinality rows are detected by the number of unique entries, first
+    in a sample and then in the whole row, and are replaced with references to
+    their unique values. The entries are still plain strings, so the tables
+    can be edited and compared as before.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        2D object array with one row per heading
+    max_ratio : float
+        Rows with more than this fraction of unique entries are left alone
+    sample_rows : int
+        Number of entries used to rule out high cardinality rows quickly
+    """
+
+    from pandas import factorize
+
+    if values.shape[1] < 2:
+        return
+
+    for column in values:
+        if len(set(column[:sample_rows])) > max_ratio * min(sample_rows, len(column)):
+            continue
+
+        codes, uniques = factorize(column)
+
+        if len(uniques) <= max_ratio * len(column):
+            column[:] = uniques[codes]
+
+
+def _is_file_like(obj):
+    """Check if object is file like
+
+    Returns
+    -------
+    bool
+        Return True if obj is file like, otherwise return False
     """
 
     if not (hasattr(obj, 'read') or hasattr(obj, 'write')):
@@ -864,5 +2928,767 @@ def _is_file_like(obj):
     return True
 
 
+class LazyTables(MutableMapping):
+    """Dictionary of AGS4 tables that are only parsed when first accessed.
+
+    The file is pre-scanned with 'AGS4_to_index()' and the dataframe for a
+    GROUP is loaded from its byte range the first time it is looked up.
+    Iterating over the values or items (e.g. when saving or checking the file)
+    loads the remaining tables on demand. Tables can be added, replaced and
+    deleted as with a normal dictionary.
+
+    An optional 'cache' object with 'get(filepath, name)' and
+    'put(filepath, name, obj)' methods (e.g. common.cache_functions.ParseCache)
+    is used to store the index and the parsed tables, so that reopening an
+    unchanged file does not tokenise it again. The cache is responsible for
+    returning None once the file has changed.
+
+    With typed=True the numeric columns of each table are converted as they
+    are loaded (see 'type_numeric_columns()').
+
+    Groups that are replaced or added are recorded in 'modified'. Tables that
+    are edited in place have to be marked with 'mark_modified()'.
+    'to_AGS4()' copies the blocks of the other groups from the file as they
+    are, so saving takes time in proportion to the groups that were changed.
+
+    e.g.
+    >>tables = LazyTables('Data.ags')
+    >>tables.row_count('SCPT')  # From the index, SCPT is not loaded
+    >>tables['LOCA']            # LOCA is parsed now
+    """
+
+    def __init__(self, filepath, encoding='utf-8', rename_duplicate_headers=True, cache=None, typed=False):
+        import os
+
+        self.filepath = filepath
+        self.encoding = encoding
+        self.rename_duplicate_headers = rename_duplicate_headers
+        self.cache = cache
+        self.typed = typed
+        self.repairs = []
+        self._stat = os.stat(filepath)
+        self.index = self._build_index()
+        self.headings = {key: entry['headings'] for key, entry in self.index.items() if entry['headings']}
+        self._tables = dict.fromkeys(self.index)
+        self.modified = set()
+
+    def __getitem__(self, key):
+        df = self._tables[key]
+
+        if df is None:
+            df = self._tables[key] = self._load(key)
+
+        return df
+
+    def __setitem__(self, key, value):
+        self._tables[key] = value
+        self.modified.add(key)
+
+    def __delitem__(self, key):
+        del self._tables[key]
+        self.modified.discard(key)
+
+    def __iter__(self):
+        return iter(self._tables)
+
+    def __len__(self):
+        return len(self._tables)
+
+    def __contains__(self, key):
+        # Avoid loading the table just to check that it is there
+        return key in self._tables
+
+    def is_loaded(self, key):
+        return self._tables[key] is not None
+
+    def mark_modified(self, key):
+        """Record that a table was edited in place, so that it is written out
+        again by 'to_AGS4()' rather than copied from the file."""
+
+        if key in self._tables:
+            self.modified.add(key)
+
+    def is_unchanged(self, key, headings=None):
+        """Check whether the block of a GROUP in the file can be copied as it
+        is when saving, i.e. the table has not been modified, its headings are
+        the same as in the file, and none of its rows had to be repaired.
+
+        Tables that are not loaded yet are only parsed if the index shows
+        that they may have line-breaks to repair.
+        """
+
+        entry = self.index.get(key)
+
+        if entry is None or key in self.modified or key not in self._tables:
+            return False
+
+        if headings is not None and key in headings and list(headings[key]) != entry['headings']:
+            return False
+
+        if self._tables[key] is None and entry.get('others', 1) != 0:
+            self[key]
+
+        return not any(repair['group'] == key for repair in self.repairs)
+
+    def to_AGS4(self, filepath, headings=None, workers=None, progress=None, chunk_size=4*1024*1024):
+        """Save the tables to an AGS4 file. The blocks of the groups that are
+        unchanged (see 'is_unchanged()') are copied from the original file
+        byte for byte without being loaded, and only the other groups are
+        formatted with 'dataframe_to_AGS4()'. Saving a file that has not been
+        changed gives an identical copy.
+
+        Parameters
+        ----------
+        filepath : str
+            Path to output file, which is gzip compressed if it ends with .gz.
+            It can be the file the tables were loaded from.
+        headings : dict, optional
+            Dictionary of lists with the headings of the tables to be written
+            in the correct order. All the columns of the other tables are
+            written in their current order.
+        workers : int, optional
+            Number of processes to format large modified groups with (see
+            'dataframe_to_AGS4()')
+        progress : callable, optional
+            Function called with the number of groups written so far after
+            each group is written
+        chunk_size : int
+            Number of bytes copied from the original file at a time
+        """
+
+        import os
+
+        headings = headings or {}
+        self._check_index()
+
+        keys = list(self._tables)
+        unchanged = {key for key in keys if self.is_unchanged(key, headings)}
+
+        if sum(self[key].size for key in keys if key not in unchanged) < _PARALLEL_WRITE_CELLS:
+            workers = None
+
+        # Written to a temporary file first, as unchanged groups may be copied from the file being replaced
+        temp = f'{filepath}.tmp'
+
+        if str(filepath).lower().endswith('.gz'):
+            import gzip
+            f = gzip.open(temp, 'wt', newline='', encoding=self.encoding)
+        else:
+            f = open(temp, 'w', newline='', encoding=self.encoding, buffering=_WRITE_BUFFER_SIZE)
+
+        try:
+            with f, open(self.filepath, 'rb') as source:
+                _write_tasks(f, self._save_tasks(source, keys, unchanged, headings, chunk_size), workers=workers, progress=progress)
+
+            os.replace(temp, filepath)
+
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+        # The file now matches the tables, so they can be copied from it next time
+        if os.path.normcase(os.path.abspath(filepath)) == os.path.normcase(os.path.abspath(self.filepath)):
+            self._check_index()
+            self.modified.clear()
+
+    def _save_tasks(self, source, keys, unchanged, headings, chunk_size):
+        """Blocks to be written by 'to_AGS4()', in the format of '_block_tasks()'."""
+
+        from rich import print as rprint
+
+        # Keep a byte order mark and blank lines at the start of the file
+        first = min((entry['offset'] for entry in self.index.values()), default=0)
+        source.seek(0)
+        prefix = source.read(first)
+
+        if prefix.replace(b'\xef\xbb\xbf', b'', 1).strip() == b'':
+            yield None, prefix
+
+        for n, key in enumerate(keys, start=1):
+            if key in unchanged:
+                rprint(f'[green]Copying unchanged... [bold]{key}[/bold][green]')
+
+                entry = self.index[key]
+                source.seek(entry['offset'])
+                remaining = entry['end'] - entry['offset']
+                last = b''
+
+                while remaining > 0:
+                    chunk = source.read(min(chunk_size, remaining))
+                    remaining -= len(chunk)
+                    last = chunk or last
+
+                    if not chunk:
+                        break
+
+                    yield None, chunk
+
+                # The last group in the file may not end with a line-break
+                if not last.endswith(b'\n') and n < len(keys):
+                    yield n, b'\r\n'
+                else:
+                    yield n, b''
+
+            else:
+                df = self[key]
+                columns = headings[key] if key in headings else list(df.columns)
+
+                for m, task in _block_tasks({key: df}, {key: columns}):
+                    yield (n if m is not None else None), task
+
+    def row_count(self, key):
+        """Number of rows (including UNIT and TYPE) in a table, taken from the index if it is not loaded."""
+
+        if self._tables[key] is None:
+            return self.index[key]['rows']
+
+        return self._tables[key].shape[0]
+
+    def load_all(self, workers=None):
+        """Load all the tables that have not been accessed yet.
+
+        Parameters
+        ----------
+        workers : int, optional
+            Number of processes used to parse the remaining groups (default
+            None, parse them one at a time in this process)
+        """
+
+        if workers is None:
+            for key in self:
+                self[key]
+            return
+
+        self._check_index()
+
+        groups = [key for key, df in self._tables.items() if df is None and key in self.index]
+
+        # Tables already in the cache do not need to be parsed again
+        for key in groups:
+            cached = self._cached(key)
+
+            if cached is not None:
+                self._tables[key] = cached[0]
+                self.repairs.extend(cached[1])
+
+        groups = [key for key in groups if self._tables[key] is None]
+
+        if groups:
+            tables, repairs = _parse_groups(self.filepath, self.index, groups, workers=workers, encoding=self.encoding,
+                                            rename_duplicate_headers=self.rename_duplicate_headers, typed=self.typed)
+            self._tables.update(tables)
+            self.repairs.extend(repairs)
+
+            for key in groups:
+                self._to_cache(key, tables[key], [item for item in repairs if item['group'] == key])
+
+        for key, df in self._tables.items():
+            if df is None:
+                self._tables[key] = _empty_dataframe()
+
+    def _check_index(self):
+        import os
+        from rich import print as rprint
+
+        # Offsets are no longer valid if the file was changed after the index was built
+        stat = os.stat(self.filepath)
+        if (stat.st_size, stat.st_mtime) != (self._stat.st_size, self._stat.st_mtime):
+            rprint(f"[yellow]  WARNING: {self.filepath} has changed since it was opened, re-indexing file.[/yellow]")
+            self._stat = stat
+            self.index = self._build_index()
+
+    def _build_index(self):
+        key = f'__index__{self.encoding}_{self.rename_duplicate_headers}'
+
+        if self.cache is not None:
+            index = self.cache.get(self.filepath, key)
+            if index is not None:
+                return index
+
+        index = AGS4_to_index(self.filepath, encoding=self.encoding, rename_duplicate_headers=self.rename_duplicate_headers)
+
+        if self.cache is not None:
+            self.cache.put(self.filepath, key, index)
+
+        return index
+
+    def _cached(self, key):
+        """Return the table and its repairs from the cache, or None if it is not there."""
+
+        if self.cache is None:
+            return None
+
+        return self.cache.get(self.filepath, self._cache_name(key))
+
+    def _to_cache(self, key, df, repairs):
+        if self.cache is not None:
+            self.cache.put(self.filepath, self._cache_name(key), (df, repairs))
+
+    def _cache_name(self, key):
+        # Tables parsed with different options are cached separately
+        return f'{key}_{self.encoding}_{self.rename_duplicate_headers}_{self.typed}'
+
+    def _load(self, key):
+        df, repairs = self.read_table(key)
+        self.repairs.extend(repairs)
+
+        return df
+
+    def read_table(self, key, on_chunk=None, chunk_rows=2048):
+        """Parse a table without storing it, so that it can be read in a
+        background thread while the other tables are in use.
+
+        Parameters
+        ----------
+        key : str
+            GROUP name
+        on_chunk : callable, optional
+            Called with a dataframe of each block of rows as they are parsed,
+            starting with 'chunk_rows' rows and doubling in size, so that the
+            first rows of a large table can be shown straight away
+        chunk_rows : int
+            Number of rows in the first block (default 2048)
+
+        Returns
+        -------
+        tuple
+            The complete dataframe and a list of repaired rows, to be passed
+            to 'set_loaded()'
+        """
+
+        import io
+        from pandas import concat
+
+        if key not in self.index:
+            return _empty_dataframe(), []
+
+        self._check_index()
+
+        if key not in self.index:
+            return _empty_dataframe(), []
+
+        cached = self._cached(key)
+
+        if cached is not None:
+            if on_chunk is not None:
+                on_chunk(cached[0])
+            return cached
+
+        entry = self.index[key]
+
+        with open(self.filepath, 'rb') as f:
+            f.seek(entry['offset'])
+            text = f.read(entry['end'] - entry['offset']).decode(self.encoding, errors='replace')
+
+        chunks = []
+        repairs = []
+
+        try:
+            for group, _, df in _iter_chunks(io.StringIO(text), chunk_rows=chunk_rows if on_chunk is not None else None, grow=True,
+                                             rename_duplicate_headers=self.rename_duplicate_headers, repairs=repairs,
+                                             start=entry['line'], typed=self.typed):
+                if group == key:
+                    chunks.append(df)
+
+                    if on_chunk is not None:
+                        on_chunk(df)
+
+        except Exception as e:
+            print(e)
+
+        if len(chunks) == 0:
+            df = _empty_dataframe()
+        elif len(chunks) == 1:
+            df = chunks[0]
+        else:
+            df = concat(chunks, ignore_index=True)
+
+        self._to_cache(key, df, repairs)
+
+        return df, repairs
+
+    def set_loaded(self, key, df, repairs):
+        """Store a table read with 'read_table()', unless it has been loaded
+        (and possibly edited) in the meantime.
+
+        Returns
+        -------
+        bool
+            True if the table was stored
+        """
+
+        if self._tables.get(key, False) is not None:
+            return False
+
+        self._tables[key] = df
+        self.repairs.extend(repairs)
+
+        return True
+
+
+class CheckCache:
+    """Results of the last check of a set of tables, group by group, for
+    'check_tables()' to reuse on the next check of the same tables.
+
+    'lines' holds the line errors of each group, 'tables' the text copy of
+    each group used by the group checks, and 'rules' the errors found by each
+    rule in '_GROUP_RULE_INPUTS' for each group. Every entry records the state
+    of the group when it was checked and the line number it started on.
+
+    e.g.
+    >>cache = CheckCache()
+    >>check_tables(tables, versions=versions, cache=cache)
+    >>versions['SAMP'] += 1  # After editing SAMP in place
+    >>check_tables(tables, versions=versions, cache=cache)  # Only SAMP is checked again
+    """
+
+    def __init__(self):
+        self.lines = {}
+        self.tables = {}
+        self.rules = {}
+
+    def prune(self, groups):
+        """Drop the results of groups that are not in 'groups' any more."""
+
+        for entries in (self.lines, self.tables):
+            for key in [key for key in entries if key not in groups]:
+                del entries[key]
+
+        for key in [key for key in self.rules if key[1] not in groups]:
+            del self.rules[key]
+
+    def clear(self):
+        self.lines.clear()
+        self.tables.clear()
+        self.rules.clear()
+
+
+class CellValidator:
+    """Checks the entries of one table as they are edited, so that errors can
+    be shown while typing without checking the whole file.
+
+    Each entry is checked against the TYPE and UNIT rows of its column (Rule 8,
+    with the same messages as 'check_tables()'), entries in UNIT and TYPE rows
+    and in PU and PA columns against the UNIT, TYPE and ABBR groups (Rules 15,
+    16 and 17), and KEY fields and ID columns against the other rows of the
+    table (Rules 10a and 8). The rows are put in hash tables by their KEY and
+    ID entries and the codes of the other groups in sets when they are first
+    needed, so that checking an entry afterwards takes the same time however
+    long the table is.
+
+    'versions' is a dictionary with a number for each group that is changed
+    whenever the group is edited (see 'check_tables()'), used to pick up edits
+    to the UNIT, TYPE, ABBR, TRAN and DICT groups.
+
+    e.g.
+    >>validator = CellValidator('SAMP', tables)
+    >>tables['SAMP'].loc[5, 'SAMP_TOP'] = '1.5'
+    >>validator.validate(tables['SAMP'], [(5, 'SAMP_TOP')])  # Cells to update
+    >>validator.checked[(5, 'SAMP_TOP')]
+    ['Value 1.5 in SAMP_TOP not of data type 2DP.']
+    """
+
+    def __init__(self, group, tables, versions=None):
+        self.group = group
+        self.tables = tables
+        self.versions = versions if versions is not None else {}
+        self.checked = {}
+        self._layout = None
+        self._codes = {}
+
+    def validate(self, df, cells):
+        """Check the entries of 'df', the table of the group, in 'cells' given
+        as (row index label, column name) pairs.
+
+        Returns
+        -------
+        set
+            Cells whose errors in 'checked' may have changed, which includes
+            the other rows with the same KEY or ID entries as an edited row
+        """
+
+        layout = (id(df), id(df.index), tuple(df.columns))
+
+        if layout != self._layout:
+            # Rows or columns were added, deleted or moved since the last edit
+            self._layout = layout
+            self._rows = {'UNIT': None, 'TYPE': None}
+            self._unique = {}
+            self._entries = {}
+            self.checked = {}
+
+            for heading in ('UNIT', 'TYPE'):
+                labels = df.index[df['HEADING'].to_numpy() == heading]
+                self._rows[heading] = labels[0] if len(labels) else None
+
+        changed = set()
+        cells = set(cells)
+        unique = self._unique_columns(df)
+
+        # Entries checked before in a column whose TYPE or UNIT changed are checked again
+        for label, col in list(cells):
+            if label in (self._rows['UNIT'], self._rows['TYPE']):
+                cells |= {cell for cell in self._entries if cell[1] == col}
+
+        for label, col in cells:
+            if label not in df.index or col not in df.columns:
+                continue
+
+            self._entries[(label, col)] = self._check_entry(df, label, col)
+            changed.add((label, col))
+
+            for name, columns in unique.items():
+                if col in columns or col == 'HEADING':
+                    changed |= self._move_row(df, name, columns, label)
+
+        for cell in changed:
+            # Other cells of the rows whose duplicates changed are checked on their own too
+            if cell not in self._entries:
+                self._entries[cell] = self._check_entry(df, *cell)
+
+            self.checked[cell] = self._entries[cell] + self._duplicates(df, unique, *cell)
+
+        return changed
+
+    def _check_entry(self, df, label, col):
+        """Return the errors of one entry that do not depend on the other rows."""
+
+        from pandas import DataFrame
+        from common import check_package_edit as check_edit
+
+        kind = df.at[label, 'HEADING']
+        value = self._value(df, label, col)
+
+        if col == 'HEADING':
+            return []
+
+        if kind == 'UNIT':
+            units = self._code_set('UNIT')
+            if units is not None and value not in ['', 'UNIT'] and value not in units:
+                return [f'Unit "{value}" not found in UNIT group.']
+            return []
+
+        if kind == 'TYPE':
+            types = self._code_set('TYPE')
+            if types is not None and value not in ['TYPE'] and value not in types:
+                return [f'Data type "{value}" not found in TYPE group.']
+            return []
+
+        if kind != 'DATA' or self._rows['TYPE'] is None:
+            return []
+
+        data_type = self._value(df, self._rows['TYPE'], col)
+        messages = []
+
+        # Rule 8 on the UNIT and TYPE rows and this row, which gives the same messages as for the
+        # whole table apart from ID uniqueness, checked with the other rows below
+        labels = [row for row in (self._rows['UNIT'], self._rows['TYPE']) if row is not None] + [label]
+        table = DataFrame({'HEADING': [df.at[row, 'HEADING'] for row in labels],
+                          col: [df.at[row, col] for row in labels]}, index=labels, dtype=object)
+        table.attrs = df.attrs
+        text, _, _ = _text_table(self.group, table, ['HEADING', col], 1, table.shape[0] + 3)
+        errors = check_edit.rule_8({self.group: text}, None, None, ags_errors={})
+
+        messages += [error['desc'] for error in errors.get('AGS Format Rule 8', []) if not error['desc'].endswith('is not unique.')]
+
+        units = self._code_set('UNIT')
+        abbreviations = self._code_set('ABBR', col)
+
+        if data_type == 'PU' and units is not None and value not in ['', 'UNIT'] and value not in units:
+            messages.append(f'Unit "{value}" not found in UNIT group.')
+
+        elif data_type == 'PA' and abbreviations is not None:
+            concatenator = self._code_set('TRAN_RCON')
+            entries = value.split(concatenator) if concatenator else [value]
+
+            for entry in entries:
+                if entry not in [''] and entry not in abbreviations:
+                    messages.append(f'"{entry}" under {col} in {self.group} not found in ABBR group.')
+
+        return messages
+
+    def _unique_columns(self, df):
+        """Columns whose entries have to be unique, by rule: the KEY fields
+        (with 'HEADING') and each ID column named after the group."""
+
+        columns = self._code_set('KEY')
+        unique = {}
+
+        if columns and set(columns).issubset(df.columns):
+            unique['key'] = [col for col in df.columns if col in columns or col == 'HEADING']
+
+        if self._rows['TYPE'] is not None:
+            for col in df.columns:
+                if col.startswith(self.group) and df.at[self._rows['TYPE'], col] == 'ID':
+                    unique[col] = [col]
+
+        return unique
+
+    def _index(self, df, name, columns):
+        """Return the hash table of the labels of the rows with each
+        combination of entries in 'columns', and the entries of each row
+        (built the first time, then kept up to date by '_move_row()')."""
+
+        if name not in self._unique:
+            entries = list(zip(*[self._text(df, df.index, col) for col in columns]))
+            rows = {}
+            for row, entry in zip(df.index, entries):
+                rows.setdefault(entry, set()).add(row)
+            self._unique[name] = (rows, dict(zip(df.index, entries)))
+
+        return self._unique[name]
+
+    def _move_row(self, df, name, columns, label):
+        """Move a row to its new entries in the hash table of the rows by
+        their 'columns', and return the cells of the rows whose duplicates
+        may have changed."""
+
+        rows, row_entries = self._index(df, name, columns)
+        old = row_entries.get(label)
+        new = tuple(self._value(df, label, col) for col in columns)
+
+        affected = {label}
+
+        if old is not None:
+            rows[old].discard(label)
+            affected |= rows[old]
+            if not rows[old]:
+                del rows[old]
+
+        rows.setdefault(new, set()).add(label)
+        row_entries[label] = new
+        affected |= rows[new]
+
+        return {(row, col) for row in affected for col in columns if col != 'HEADING'}
+
+    def _duplicates(self, df, unique, label, col):
+        """Return the errors of an entry that is duplicated in a KEY field
+        combination or an ID column."""
+
+        messages = []
+
+        if df.at[label, 'HEADING'] != 'DATA':
+            return messages
+
+        for name, columns in unique.items():
+            if col not in columns:
+                continue
+
+            rows, row_entries = self._index(df, name, columns)
+            entry = row_entries[label]
+
+            if len(rows[entry]) < 2:
+                continue
+
+            if name == 'key':
+                messages.append(f'Duplicate key field combination: {"|".join(entry)}')
+            elif entry[0] != '':
+                messages.append(f'Value {entry[0]} in {col} is not unique.')
+
+        return messages
+
+    def _code_set(self, name, heading=None):
+        """Return the codes defined in another group, e.g. the units in the
+        UNIT group, worked out again only after that group changes (None if
+        the group is missing)."""
+
+        source = {'UNIT': 'UNIT', 'TYPE': 'TYPE', 'ABBR': 'ABBR', 'TRAN_RCON': 'TRAN', 'KEY': 'DICT'}[name]
+        stamp = (self.versions.get(source), id(self.tables.get(source)))
+        cached = self._codes.get((name, heading))
+
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        table = self.tables.get(source)
+        data = table.loc[table['HEADING'] == 'DATA'] if table is not None else None
+
+        try:
+            if data is None and name != 'KEY':
+                # The group is missing, which the full check reports once instead of for each entry
+                codes = None
+            elif name == 'UNIT':
+                codes = set(data['UNIT_UNIT'].tolist())
+            elif name == 'TYPE':
+                codes = set(data['TYPE_TYPE'].tolist())
+            elif name == 'ABBR':
+                codes = set(data.loc[data['ABBR_HDNG'] == heading, 'ABBR_CODE'].tolist())
+            elif name == 'TRAN_RCON':
+                codes = data['TRAN_RCON'].values[0]
+            else:
+                codes = self._key_fields()
+
+        except (KeyError, IndexError, TypeError):
+            # The group or column is missing, which the full check reports
+            codes = set() if name != 'TRAN_RCON' else None
+
+        self._codes[(name, heading)] = (stamp, codes)
+
+        return codes
+
+    def _key_fields(self):
+        """Return the KEY fields of the group in the standard dictionary and
+        the DICT group."""
+
+        from python_ags4 import check
+
+        dictionary = check.combine_DICT_tables(load_dictionary(tables=self.tables).tables, self.tables)
+        is_key = dictionary.DICT_STAT.str.contains('key', case=False)
+
+        return dictionary.loc[(dictionary.DICT_GRP == self.group) & is_key, 'DICT_HDNG'].tolist()
+
+    def _text(self, df, labels, col):
+        """Return entries of a column as they are written to the file."""
+
+        from pandas.api.types import infer_dtype
+
+        column = df.loc[labels, col] if len(labels) != len(df) else df[col]
+        values = _column_values(column, df.attrs.get('typed_columns', {}).get(col))
+
+        if infer_dtype(values, skipna=False) != 'string':
+            values = [str(value) for value in values]
+
+        return list(values)
+
+    def _value(self, df, label, col):
+        """Return one entry as it is written to the file (see '_text()')."""
+
+        from pandas import isna
+
+        value = df.at[label, col]
+
+        if isinstance(value, str):
+            return value
+
+        if isna(value):
+            return ''
+
+        TYPE = df.attrs.get('typed_columns', {}).get(col)
+
+        if TYPE is not None and isinstance(value, float):
+            return format_numeric_value(value, TYPE)
+
+        return str(value)
+
+
+class _GroupView(Mapping):
+    """Read-only view of a dictionary of groups that only iterates over one
+    group, so that rules which loop over all the groups check just that one.
+    The other groups can still be looked up by name."""
+
+    def __init__(self, mapping, group):
+        self._mapping = mapping
+        self._group = group
+
+    def __getitem__(self, key):
+        return self._mapping[key]
+
+    def __iter__(self):
+        return iter((self._group,))
+
+    def __len__(self):
+        return 1
+
+
 class AGS4Error(Exception):
     pass
@@ -12,6 +12,7 @@ import os
 import pandas as pd
 from configparser import ConfigParser
 import webbrowser
+import multiprocessing
 import ctypes
 from rich import print as rprint
 import warnings
@@ -37,6 +38,11 @@ class MainWindow(QtWidgets.QMainWindow):
         self.lab_handler = LabHandler()
         self.error_handle = ErrorHandler()
         self.match_thread = ThreadHandler()
+        self.group_loader = GroupLoader()
+        self._tables_group: str = None
+        self._tables_model: PandasModel = None
+        self._partial: dict = {}
+        self._errors: pd.DataFrame = None
         self.player = QMediaPlayer()
         self.config = ConfigParser()
         
@@ -70,6 +76,9 @@ class MainWindow(QtWidgets.QMainWindow):
         self.tables_table.insert_rows.connect(lambda x: self.add_rows(x))
         self.tables_table.refreshed.connect(self.reload_table)
         self.tables_table.promote_sig.connect(self.promote)
+        self.listbox.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.listbox.doubleClicked.connect(self.go_to_error)
+        self.error_filter.textChanged.connect(self.filter_errors)
 
         'handler connects'
         self.gint_handler._disable.connect(self.disable_buttons)
@@ -84,6 +93,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ags_handler._enable_error_export.connect(lambda x: self.button_export_error.setEnabled(x))
         self.ags_handler._enable_results_export.connect(lambda x: self.button_export_results.setEnabled(x))
         self.ags_handler._set_model.connect(lambda x: self.update_result_model(x))
+        self.ags_handler._set_errors.connect(lambda x: self.show_errors(x))
         self.ags_handler._coin.connect(self.play_coin)
         self.ags_handler._progress_max.connect(lambda x: self.update_progress_max(x))
         self.ags_handler._progress_current.connect(lambda x: self.update_progress_bar(x))
@@ -95,6 +105,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.lab_handler._progress_current.connect(lambda x: self.update_progress_bar(x))
         self.error_handle.err.connect(self.error_handle.show_err)
         self.match_thread.finished.connect(self.lab_match_cleanup)
+        self.group_loader.chunk.connect(lambda tables, group, df: self.append_group_chunk(tables, group, df))
+        self.group_loader.loaded.connect(lambda tables, group, df, repairs: self.group_loaded(tables, group, df, repairs))
 
         '''Processor'''
         self.dataframe_processor = DataframeProcessor()
@@ -141,6 +153,8 @@ AGS file loaded.''')
         if len(self.ags_handler.file_location[0]) == 0:
             return
         self.ags_handler.ags_tables_from_file()
+        self.group_loader.reset(self.ags_handler.tables)
+        self._partial = {}
         if self.lab_select.currentText() == "Select a Lab":
             self.lab_select.removeItem(0)
             self.lab_select.setCurrentIndex(0)
@@ -196,25 +210,86 @@ AGS file loaded.''')
             self.match_unique_id_Enviro()
 
     def update_result_model(self, df):
+        self.error_filter.setEnabled(False)
         model = PandasModel(df)
         self.listbox.setModel(model)
         self.listbox.resizeColumnsToContents()
         self.listbox.horizontalHeader().hide()
 
+    def show_errors(self, errors: pd.DataFrame):
+        '''List the errors with the group, rule and line they were found on, and highlight the cells they are about in the table view'''
+        self._errors = errors
+        self.error_filter.setEnabled(True)
+        self.filter_errors(self.error_filter.text())
+        if self._tables_model is not None:
+            self._tables_model.set_error_cells(self.ags_handler.error_cells.get(self._tables_group))
+            self._tables_model.layoutChanged.emit()
+
+    def filter_errors(self, text: str):
+        '''Only list the errors with the text in their group, rule or description'''
+        if self._errors is None or not self.error_filter.isEnabled():
+            return
+        errors = self._errors
+        if text:
+            found = (errors['desc'].str.contains(text, case=False, regex=False) | errors['group'].str.contains(text, case=False, regex=False)
+                | errors['rule'].str.contains(text, case=False, regex=False))
+            errors = errors[found]
+        model = PandasModel(errors)
+        # errors that aren't on a line have '-' in place of the line number
+        model.sort_keys['line'] = lambda col: pd.to_numeric(col, errors='coerce')
+        self.listbox.setModel(model)
+        # the row and column are only used to go to the error
+        self.listbox.setColumnHidden(errors.columns.get_loc('row'), True)
+        self.listbox.setColumnHidden(errors.columns.get_loc('column'), True)
+        self.listbox.horizontalHeader().show()
+        self.listbox.resizeColumnsToContents()
+
+    def go_to_error(self, index):
+        '''Open the group of the error that was double-clicked in the table view and select the cell, row or column it is about'''
+        df = self.listbox.model().df
+        if 'row' not in df.columns or 'column' not in df.columns:
+            return
+        error = df.iloc[index.row()]
+        group = error['group']
+        if group not in self.ags_handler.tables:
+            return
+        self.view_tableview()
+        found = (self._headings_model.df.iloc[:,0] == group).to_numpy().nonzero()[0]
+        if len(found):
+            self.headings_table.setCurrentIndex(self._headings_model.index(found[0], 0))
+            self.headings_table.selectRow(found[0])
+        self.show_group(group)
+        table = self._tables_model.df
+        row = table.index.get_indexer([error['row']])[0] if pd.notna(error['row']) and table.index.is_unique else -1
+        column = table.columns.get_loc(error['column']) if error['column'] in table.columns else -1
+        if row >= 0:
+            cell = self._tables_model.index(row, max(column, 0))
+            self.tables_table.setCurrentIndex(cell)
+            self.tables_table.scrollTo(cell, QtWidgets.QAbstractItemView.PositionAtCenter)
+            if column < 0:
+                self.tables_table.selectRow(row)
+        elif column >= 0:
+            self.tables_table.selectColumn(column)
+            self.tables_table.scrollTo(self._tables_model.index(0, column))
+
     def check_ags(self):
+        self.wait_for_groups()
         self.ags_handler.check_ags()
 
     def export_errors(self):
         self.ags_handler.export_errors()
 
     def del_non_lab_tables(self):
+        self.wait_for_groups()
         self.ags_handler.del_non_lab_tables()
         self.setup_tables()
 
     def save_ags(self):
+        self.wait_for_groups()
         self.ags_handler.save_ags()
     
     def count_lab_results(self):
+        self.wait_for_groups()
         self.ags_handler.count_lab_results()
         
     def export_results(self):
@@ -227,7 +302,7 @@ AGS file loaded.''')
     def setup_tables(self):
         '''setting up the models for groups and tables'''
         table_keys = [k for k in self.ags_handler.tables.keys()]
-        table_shapes = [str(f"(x{v.shape[0] - 2})") for k,v in self.ags_handler.tables.items()]
+        table_shapes = [str(f"(x{self.ags_handler.row_count(k) - 2})") for k in table_keys]
         headings_with_shapes = list(zip(table_keys,table_shapes))
         headings_df = pd.DataFrame.from_dict(headings_with_shapes)
         headings_df.sort_values(0, ascending=True, kind='mergesort', inplace=True, key=lambda col: col.str.lower())
@@ -237,34 +312,97 @@ AGS file loaded.''')
         self.headings_table.resizeColumnsToContents()
         self.headings_table.horizontalHeader().hide()
 
-        self._tables_model = PandasModel(self.ags_handler.tables[f"{headings_df.iloc[0,0]}"])
+        self._tables_model = PandasModel(pd.DataFrame())
+        self._tables_model.modified.connect(lambda: self.ags_handler.mark_modified(self._tables_group))
         self.tables_table.setModel(self._tables_model)
-        self.tables_table.resizeColumnsToContents()
+        self.show_group(f"{headings_df.iloc[0,0]}")
         self.tables_table.horizontalHeader().sectionPressed.connect(self.tables_table.selectColumn)   #col sel
 
     def refresh_table(self):
         index = self.headings_table.selectionModel().currentIndex()
         self.headings_table.selectRow(index.row())
         value = index.sibling(index.row(),0).data()
-        self._tables_model.df = self.ags_handler.tables[value]
-        self._tables_model.original = self.ags_handler.tables[value].copy()
+        self.show_group(value)
+
+    def show_group(self, group: str):
+        '''Show a group in the table view. Groups that haven't been parsed yet are read in the background,
+        starting with the rows loaded so far, and the model grows as the rest of the rows come in'''
+        self._tables_group = group
+        self._tables_model.error_cells = self.ags_handler.error_cells.get(group)
+        self._tables_model.validator = None
+        self._tables_model.pending = set()
+        if self.ags_handler.is_loaded(group):
+            self._tables_model.loading = False
+            self._tables_model.validator = self.ags_handler.validator(group)
+            self._tables_model.df = self.ags_handler.tables[group]
+            self._tables_model.original = self.ags_handler.tables[group].copy()
+        else:
+            chunks = self._partial.setdefault(group, [])
+            self._tables_model.loading = True
+            if chunks:
+                self._tables_model.df = pd.concat(chunks, ignore_index=True)
+            else:
+                self._tables_model.df = pd.DataFrame(columns=self.ags_handler.headings.get(group, []))
+            self.group_loader.request(group)
         self._tables_model.layoutChanged.emit()
         self.tables_table.resizeColumnsToContents()
 
+    def append_group_chunk(self, tables, group: str, df: pd.DataFrame):
+        if tables is not self.ags_handler.tables:
+            return
+        self._partial.setdefault(group, []).append(df)
+        if group == self._tables_group and self._tables_model.loading:
+            first = self._tables_model.df.shape[0] == 0
+            self._tables_model.append_rows(df)
+            if first:
+                self.tables_table.resizeColumnsToContents()
+
+    def group_loaded(self, tables, group: str, df: pd.DataFrame, repairs: list):
+        if tables is not self.ags_handler.tables:
+            return
+        self._partial.pop(group, None)
+        if df is None:
+            # leave the group unloaded, it is read again the next time it is selected
+            return
+        tables.set_loaded(group, df, repairs)
+        if group == self._tables_group and group in tables:
+            self.show_group(group)
+
+    def wait_for_groups(self, groups: list = None):
+        '''Editing actions wait for the groups they touch to finish loading in the background (all groups if none are given)'''
+        QApplication.processEvents()
+        pending = [group for group in (groups if groups is not None else self.group_loader.pending()) if self.group_loader.is_pending(group)]
+        if not pending:
+            return
+        self.set_text(f'''Waiting for {', '.join(pending)} to finish loading...
+''')
+        loop = QtCore.QEventLoop()
+        def done(*args):
+            if not any(self.group_loader.is_pending(group) for group in pending):
+                loop.quit()
+        self.group_loader.loaded.connect(done)
+        if any(self.group_loader.is_pending(group) for group in pending):
+            loop.exec()
+        self.group_loader.loaded.disconnect(done)
+
     def reload_table(self):
+        self.wait_for_groups([self._tables_group])
         index = self.headings_table.selectionModel().currentIndex()
         self.headings_table.selectRow(index.row())
         value = index.sibling(index.row(),0).data()
         self.ags_handler.tables[value] = self._tables_model.df
+        self.ags_handler.mark_modified(value)
         self._tables_model.original = self.ags_handler.tables[value].copy()
         self._tables_model.layoutChanged.emit()
         self.tables_table.resizeColumnsToContents()
 
     def update_table_data(self):
+        self.wait_for_groups([self._tables_group])
         index = self.headings_table.selectionModel().currentIndex()
         self.headings_table.selectRow(index.row())
         value = index.sibling(index.row(),0).data()
         self.ags_handler.tables[value] = self.tables_table.model().df
+        self.ags_handler.mark_modified(value)
         self.tables_table.model().layoutChanged.emit()
         self.tables_table.resizeColumnsToContents()
 
@@ -272,15 +410,20 @@ AGS file loaded.''')
         self.tabWidget.setCurrentIndex(1)
 
     def delete_group(self, group: str):
+        self.wait_for_groups([group])
         try:
             del self.ags_handler.tables[group]
+            self.ags_handler.mark_modified(group)
         except Exception as e:
             print(e)
         self.setup_tables()
 
     def rename_group(self, groups: list):
+        self.wait_for_groups([groups[0]])
         try:
             self.ags_handler.tables[groups[1]] = self.ags_handler.tables.pop(groups[0])
+            self.ags_handler.mark_modified(groups[0])
+            self.ags_handler.mark_modified(groups[1])
         except Exception as e:
             print(e)
         self.setup_tables()
@@ -289,9 +432,11 @@ AGS file loaded.''')
         temp = {'HEADING': ["UNIT", "TYPE", "DATA"]}
         df = pd.DataFrame(data=temp)
         self.ags_handler.tables[group] = df
+        self.ags_handler.mark_modified(group)
         self.setup_tables()
 
     def add_rows(self, rows: list):
+        self.wait_for_groups([self._tables_group])
         index = rows[0]
         num_rows = rows[1]
         if self.headings_table.selectionModel().selection().indexes() == []:
@@ -315,6 +460,7 @@ AGS file loaded.''')
             new = pd.concat([new, self.ags_handler.tables[group].loc[index+1:]])
             new.reset_index(drop=True, inplace=True)
             self.ags_handler.tables[group] = new
+            self.ags_handler.mark_modified(group)
             self.refresh_table()
         except Exception as e:
             print(e)
@@ -392,6 +538,7 @@ AGS file loaded.''')
         if self.tables_table.model() is None:
             return
         else:
+            self.wait_for_groups([self._tables_group])
             df = self.tables_table.model().df.copy()
             table = self.tables_table
 
@@ -414,7 +561,9 @@ AGS file loaded.''')
             return ";"
 
     def handle_tables(self):
+        self.wait_for_groups()
         self.get_ags_tables()
+        self.ags_handler.untype_tables(self.ags_handler.ags_tables)
         self.lab_handler.ags_tables = self.ags_handler.ags_tables
         self.lab_handler.tables = self.ags_handler.tables
         self.lab_handler.spec = self.gint_handler.gint_spec
@@ -631,6 +780,9 @@ please wait...''')
 
     def lab_match_cleanup(self):
         self.ags_handler.tables = self.lab_handler.tables
+        # Matching edits the lab groups in place
+        for table in self.lab_handler.ags_tables:
+            self.ags_handler.mark_modified(table)
         self.remove_match_id()
         self.enable_buttons()
         self.tables_table.resizeColumnsToContents()
@@ -799,6 +951,52 @@ class ErrorHandler(QThread):
         #self.terminate()
 
 
+class GroupLoader(QThread):
+    '''Reads groups of a LazyTables in the background, handing over the rows as they are parsed'''
+    chunk = pyqtSignal(object, str, object)
+    loaded = pyqtSignal(object, str, object, object)
+
+    def __init__(self):
+        super(GroupLoader, self).__init__()
+        self.tables: object = None
+        self.queue: list = []
+        self.current: str = None
+        self.finished.connect(self.resume)
+
+    def reset(self, tables):
+        self.tables = tables
+        self.queue = []
+
+    def request(self, group: str):
+        if group != self.current and group not in self.queue:
+            self.queue.insert(0, group)
+        if not self.isRunning():
+            self.start()
+
+    def resume(self):
+        # a group can be requested just as the thread is finishing
+        if self.queue and not self.isRunning():
+            self.start()
+
+    def pending(self):
+        return ([self.current] if self.current is not None else []) + list(self.queue)
+
+    def is_pending(self, group: str):
+        return group is not None and (group == self.current or group in self.queue)
+
+    def run(self):
+        while self.queue:
+            tables = self.tables
+            group = self.current = self.queue.pop(0)
+            try:
+                df, repairs = tables.read_table(group, on_chunk=lambda df: self.chunk.emit(tables, group, df))
+            except Exception as e:
+                print(e)
+                df, repairs = None, []
+            self.current = None
+            self.loaded.emit(tables, group, df, repairs)
+
+
 class ThreadHandler(QThread):
     def __init__(self):
         super(ThreadHandler, self).__init__()
@@ -819,6 +1017,7 @@ def except_hook(cls, exception, traceback):
     sys.__excepthook__(cls, exception, traceback)
 
 def main():
+    multiprocessing.freeze_support()
     sys.excepthook = except_hook
     app = QtWidgets.QApplication([sys.argv])
     app.setWindowIcon(QtGui.QIcon("common/images/geo.ico"))
@@ -0,0 +1,195 @@
+import argparse
+import csv
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from rich import print as rprint
+import common.AGS4_package_edit as AGS4
+from common.cache_functions import ParseCache
+
+# Headless version of 'Check AGS for Errors' for many files at once, e.g.
+#   python -m common.batch_check "deliveries/2024-*" -o reports
+# Each file is checked in its own process, so the number of files checked at a time grows with the cores available
+
+AGS_EXTENSIONS = ('.ags', '.ags.gz')
+SUMMARY_COLUMNS = ['file', 'status', 'errors', 'dictionary', 'seconds', 'log', 'message']
+
+
+def find_files(patterns: list, recursive: bool = False) -> list:
+    '''Expand folders and glob patterns into the AGS files to check. Zip archives are expanded into the AGS files inside them'''
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            if recursive:
+                paths = sorted(os.path.join(root, name) for root, _, names in os.walk(pattern) for name in names)
+            else:
+                paths = sorted(entry.path for entry in os.scandir(pattern) if entry.is_file())
+        else:
+            paths = sorted(glob.glob(pattern, recursive=recursive))
+            if not paths:
+                # Kept so that it is reported as failed (e.g. a typo), or checked if it's a member of a zip archive
+                files.append(pattern)
+                continue
+
+        for path in paths:
+            if path.lower().endswith('.zip'):
+                files += [f'{path}/{member}' for member in AGS4.zip_members(path)]
+            elif path.lower().endswith(AGS_EXTENSIONS):
+                files.append(path)
+
+    return list(dict.fromkeys(files))
+
+
+def log_names(files: list) -> dict:
+    '''Name each error log after its file, numbering files with the same name from different folders'''
+    names = {}
+    used = set()
+    for filepath in files:
+        base = os.path.basename(filepath.replace('\\', '/').rstrip('/'))
+        name = f'{base}_errors.txt'
+        n = 1
+        while name.lower() in used:
+            n += 1
+            name = f'{base}_{n}_errors.txt'
+        used.add(name.lower())
+        names[filepath] = name
+    return names
+
+
+def error_log(ags_errors: dict) -> list:
+    '''Lines of the error log, the same as 'Export Error Log' in the GUI'''
+    lines = []
+    for rule, items in ags_errors.items():
+        if rule == 'Metadata':
+            continue
+        for error in items:
+            lines.append(f"Error in line: {error['line']}, group: {error['group']}, description: {error['desc']}")
+    if not lines:
+        lines.append("No errors found. Yay.")
+    return lines
+
+
+def _init_worker(cache_dir: str, verbose: bool):
+    # Each worker parses each standard dictionary once and keeps it (see AGS4.load_dictionary),
+    # sharing the parse cache on disk with the GUI and the other workers if there is one
+    AGS4.set_dictionary_cache(ParseCache(cache_dir) if cache_dir else None)
+    if not verbose:
+        # The dictionary picked for each file (e.g. when TRAN_AGS is missing) is listed in the summary instead
+        sys.stdout = open(os.devnull, 'w')
+        logging.getLogger('python_ags4').setLevel(logging.ERROR)
+
+
+def check_one(filepath: str, dictionary: str, log_path: str) -> dict:
+    '''Check one file and write its error log, returning its row of the summary'''
+    start = time.perf_counter()
+    result = {'file': filepath, 'status': 'failed', 'errors': 0, 'dictionary': '', 'seconds': 0.0,
+              'log': log_path, 'message': '', 'rules': {}, 'metadata': {}}
+    try:
+        ags_errors = AGS4.check_file(filepath, standard_AGS4_dictionary=dictionary)
+        lines = error_log(ags_errors)
+        metadata = {str(item['line']): item['desc'] for item in ags_errors.get('Metadata', [])}
+        result['rules'] = {rule: len(items) for rule, items in ags_errors.items() if rule != 'Metadata'}
+        result['errors'] = sum(result['rules'].values())
+        result['status'] = 'errors' if result['errors'] else 'ok'
+        result['metadata'] = metadata
+        result['dictionary'] = metadata.get('Dictionary', '')
+    except Exception as e:
+        # Files that can't be read or parsed (e.g. not an AGS file) are reported rather than stopping the batch
+        result['message'] = f'{type(e).__name__}: {e}'
+        lines = [f'Could not check file: {result["message"]}']
+
+    with open(log_path, 'w') as f:
+        for line in lines:
+            f.write("%s\n" % line)
+
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def check_files(files: list, output: str, workers: int = None, dictionary: str = None, cache_dir: str = None, verbose: bool = False) -> list:
+    '''Check files across a pool of processes, writing an error log for each one to output/logs'''
+    log_dir = os.path.join(output, 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    names = log_names(files)
+
+    if workers is None or workers < 1:
+        workers = os.cpu_count()
+
+    def size(filepath):
+        try:
+            return os.path.getsize(filepath)
+        except OSError:
+            return 0
+
+    # The largest files are started first so that a big file left until last doesn't hold up the whole batch
+    order = sorted(files, key=size, reverse=True)
+    results = {}
+
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(files))), initializer=_init_worker, initargs=(cache_dir, verbose)) as executor:
+        futures = {executor.submit(check_one, filepath, dictionary, os.path.join(log_dir, names[filepath])): filepath for filepath in order}
+        for n, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results[futures[future]] = result
+            colour = {'ok': 'green', 'errors': 'yellow', 'failed': 'red'}[result['status']]
+            rprint(f"[{colour}][{n}/{len(files)}] {result['file']}: {result['status']}, {result['errors']} error(s) in {result['seconds']:.2f}s[/{colour}]")
+
+    return [results[filepath] for filepath in files]
+
+
+def write_summary(results: list, output: str, seconds: float):
+    '''Write summary.json (with the error count of each rule and the metadata of each file) and summary.csv (one row per file)'''
+    summary = {
+        'files': len(results),
+        'ok': sum(result['status'] == 'ok' for result in results),
+        'with_errors': sum(result['status'] == 'errors' for result in results),
+        'failed': sum(result['status'] == 'failed' for result in results),
+        'errors': sum(result['errors'] for result in results),
+        'seconds': round(seconds, 3),
+        'results': results,
+    }
+    with open(os.path.join(output, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    with open(os.path.join(output, 'summary.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+
+    return summary
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m common.batch_check',
+        description='Check AGS files for errors without the GUI, several at a time, writing a summary of all files and an error log for each.')
+    parser.add_argument('paths', nargs='+', help='AGS files (.ags, .ags.gz, .zip), folders or glob patterns, e.g. "deliveries/**/*.ags"')
+    parser.add_argument('-o', '--output', default='ags_check_reports', help='folder to write summary.json, summary.csv and logs/ to (default: ags_check_reports)')
+    parser.add_argument('-r', '--recursive', action='store_true', help='include subfolders of folders, and ** in glob patterns')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='number of files checked at a time (default: number of cores)')
+    parser.add_argument('-d', '--dictionary', default=None, help="standard dictionary version ('4.1.1', '4.1', '4.0.4', '4.0.3', '4.0') or path to a dictionary file (default: picked from TRAN_AGS of each file)")
+    parser.add_argument('--cache-dir', default=None, help='parse cache folder to keep parsed dictionaries in between runs, e.g. common/assets/cache')
+    parser.add_argument('-v', '--verbose', action='store_true', help='show the progress messages of each check')
+    args = parser.parse_args(argv)
+
+    files = find_files(args.paths, recursive=args.recursive)
+    if not files:
+        rprint("[red]No AGS files found.[/red]")
+        return 2
+
+    rprint(f"[cyan]Checking {len(files)} AGS file(s)...[/cyan]")
+    start = time.perf_counter()
+    results = check_files(files, args.output, workers=args.workers, dictionary=args.dictionary, cache_dir=args.cache_dir, verbose=args.verbose)
+    summary = write_summary(results, args.output, time.perf_counter() - start)
+
+    rprint(f"[green]Checked {summary['files']} file(s) in {summary['seconds']:.1f}s: {summary['ok']} without errors, "
+           f"{summary['with_errors']} with errors, {summary['failed']} failed. Summary written to {os.path.abspath(args.output)}[/green]")
+
+    # Non-zero when anything needs looking at, so it can be used in scripts
+    return 0 if summary['ok'] == summary['files'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
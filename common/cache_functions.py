@@ -0,0 +1,131 @@
+import os
+import pickle
+import shutil
+import hashlib
+from rich import print as rprint
+
+
+class ParseCache:
+    '''Sidecar cache of parsed AGS tables, so reopening an unchanged file skips tokenising.
+
+    Each source file gets a folder named after a hash of its path, holding a meta.pkl with the size,
+    mtime and content hash of the file, and one pickle per cached item (the group index and each table).
+    The folder is cleared whenever the file no longer matches, and the least recently used folders are
+    removed once the cache grows past max_size bytes.'''
+
+    def __init__(self, directory: str, max_size: int = 2*1024**3):
+        self.directory: str = directory
+        self.max_size: int = max_size
+        self._valid: dict = {}
+
+    def get(self, filepath: str, name: str):
+        folder = self._entry(filepath)
+        try:
+            with open(os.path.join(folder, self._item_name(name)), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            rprint(f"[yellow]  WARNING: Could not read {name} from cache, it will be parsed again. {e}[/yellow]")
+            return None
+
+    def put(self, filepath: str, name: str, obj):
+        folder = self._entry(filepath)
+        path = os.path.join(folder, self._item_name(name))
+        try:
+            # Write to a temporary file first so a half-written pickle is never read back
+            # (named after the process, as batch checks share the cache between processes)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            rprint(f"[yellow]  WARNING: Could not write {name} to cache. {e}[/yellow]")
+            return
+        self._evict(keep=folder)
+
+    def invalidate(self, filepath: str):
+        folder = self._folder(filepath)
+        self._valid.pop(os.path.abspath(filepath), None)
+        shutil.rmtree(folder, ignore_errors=True)
+
+    def clear(self):
+        self._valid = {}
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _folder(self, filepath: str):
+        key = hashlib.blake2b(os.path.abspath(filepath).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.directory, key)
+
+    def _item_name(self, name: str):
+        # Group names are four uppercase characters, anything else is escaped to keep the file name valid
+        return ''.join(c if c.isalnum() or c == '_' else f'%{ord(c):02x}' for c in name) + '.pkl'
+
+    def _entry(self, filepath: str):
+        '''Return the cache folder for filepath, clearing it first if the file has changed since it was cached.'''
+        abspath = os.path.abspath(filepath)
+        folder = self._folder(filepath)
+        stat = os.stat(filepath)
+        signature = (stat.st_size, stat.st_mtime)
+
+        # The content hash is only worked out once per session while the file is unchanged
+        if self._valid.get(abspath) == signature:
+            return folder
+
+        meta_path = os.path.join(folder, 'meta.pkl')
+        meta = None
+        try:
+            with open(meta_path, 'rb') as f:
+                meta = pickle.load(f)
+        except Exception:
+            pass
+
+        content_hash = self._hash(filepath)
+        if meta is None or meta['path'] != abspath or meta['size'] != stat.st_size or meta['hash'] != content_hash:
+            if meta is not None:
+                rprint(f"[yellow]  {os.path.basename(filepath)} has changed since it was cached, clearing cache entry.[/yellow]")
+            shutil.rmtree(folder, ignore_errors=True)
+
+        os.makedirs(folder, exist_ok=True)
+        # Also rewritten when only the mtime changed, and touched so eviction sees it as recently used
+        tmp_path = f'{meta_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'path': abspath, 'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': content_hash}, f)
+        os.replace(tmp_path, meta_path)
+
+        self._valid[abspath] = signature
+        return folder
+
+    def _hash(self, filepath: str, chunk_size: int = 16*1024*1024):
+        content_hash = hashlib.blake2b(digest_size=32)
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                content_hash.update(chunk)
+        return content_hash.hexdigest()
+
+    def _evict(self, keep: str = None):
+        '''Remove the least recently used entries until the cache is under max_size. The entry being written is kept.'''
+        entries = []
+        total = 0
+        try:
+            folders = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+        except FileNotFoundError:
+            return
+
+        for folder in folders:
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(folder) if entry.is_file())
+                last_used = os.stat(os.path.join(folder, 'meta.pkl')).st_mtime
+            except OSError:
+                size, last_used = 0, 0
+            entries.append((last_used, folder, size))
+            total += size
+
+        for last_used, folder, size in sorted(entries):
+            if total <= self.max_size:
+                break
+            if os.path.normcase(folder) == os.path.normcase(keep or ''):
+                continue
+            shutil.rmtree(folder, ignore_errors=True)
+            self._valid = {path: signature for path, signature in self._valid.items() if self._folder(path) != folder}
+            total -= size
@@ -0,0 +1,416 @@
+# Copyright (C) 2020-2022  Asitha Senanayake
+#
+# This file is part of python_ags4.
+#
+# python_ags4 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# https://github.com/asitha-sena/python-ags4
+# https://gitlab.com/ags-data-format-wg/ags-python-library
+
+# Group rules from python_ags4's check module that take up most of the time
+# spent checking large files, rewritten as column operations. Each rule gives
+# exactly the same errors, in the same order, as the python_ags4 function of
+# the same name (see tests/test_check_parity.py). The other rules
+# are fast enough and are still called from python_ags4 directly.
+
+# Rules in this module, in the order they are run by 'check_file()'
+RULES = ('rule_8', 'rule_10a', 'rule_10c', 'rule_16')
+
+
+# Group Rules
+
+def rule_8(tables, headings, line_numbers, ags_errors={}):
+    """AGS Format Rule 8: Data variables shall be presented in units of measurements
+    and type that are described by the appropriate data field UNIT and data
+    field TYPE defined at the start of the GROUP.
+
+    Patterns are matched once for each distinct value in a column and SF
+    values are formatted once for each distinct number.
+    """
+
+    import numpy as np
+    import pandas as pd
+    from python_ags4.AGS4 import _format_SF
+    from python_ags4.check import add_error_msg
+
+    for group in tables:
+        df = tables[group]
+
+        try:
+            # Create dictionary of data types in table
+            data_types = df.filter(regex=r'[^line_number]').loc[df.HEADING.eq('TYPE'), :].to_dict('records')[0]
+            # Ditto for units, used in DT and T checks
+            data_units = df.filter(regex=r'[^line_number]').loc[df.HEADING.eq('UNIT'), :].to_dict('records')[0]
+
+            is_data = df.HEADING.eq('DATA')
+
+            for col, data_type in data_types.items():
+                # Non-empty DATA entries, the only ones that are checked
+                entries = is_data & ~df[col].eq('')
+
+                if 'DP' in data_type:
+                    i = int(data_type.strip('DP'))
+
+                    if i == 0:
+                        mask = entries & ~_match(df[col], r'^-?\d+\.?$')
+                    else:
+                        mask = entries & ~_match(df[col], f'^-?\\d+\\.\\d{{{i}}}$')
+
+                    for line_number, value in _rows(df, mask, col):
+                        msg = f'Value {value} in {col} not of data type {data_type}.'
+                        add_error_msg(ags_errors, 'AGS Format Rule 8', line_number, group, msg)
+
+                elif 'SCI' in data_type:
+                    i = int(data_type.strip('SCI'))
+                    mask = entries & ~_match(df[col], f'^-?\\d\\.\\d{{{i}}}[eE][+-]?\\d+$')
+
+                    for line_number, value in _rows(df, mask, col):
+                        msg = f'Value {value} in {col} not of data type {data_type}.'
+                        add_error_msg(ags_errors, 'AGS Format Rule 8', line_number, group, msg)
+
+                elif 'SF' in data_type:
+                    i = int(data_type.strip('SF'))
+
+                    # Convert column to numeric values and format each distinct number to the
+                    # required significant figures (zeros are skipped as their significant
+                    # figures cannot be determined)
+                    temp = pd.to_numeric(df[col], errors='coerce')
+                    filter_zeros = temp.ne(0.0)
+                    is_numeric = (is_data & temp.notna()).to_numpy()
+
+                    codes, uniques = pd.factorize(temp[is_numeric])
+                    formatted = np.array([_format_SF(value, data_type) for value in uniques.tolist()], dtype=object)
+
+                    # Compare correctly formatted strings with original strings, entries that are
+                    # not numbers never match and are shown with '?' as the expected value
+                    expected = np.full(len(df), '?', dtype=object)
+                    expected[is_numeric] = formatted[codes]
+                    matches = np.zeros(len(df), dtype=bool)
+                    matches[is_numeric] = df[col].to_numpy()[is_numeric] == expected[is_numeric]
+
+                    mask = (entries & ~matches & filter_zeros).to_numpy()
+
+                    for line_number, value, expected_val in zip(df['line_number'].to_numpy()[mask], df[col].to_numpy()[mask], expected[mask]):
+                        msg = f'Value {value} in {col} not of data type {data_type}. (Expected: {expected_val})'
+                        add_error_msg(ags_errors, 'AGS Format Rule 8', int(line_number), group, msg)
+
+                elif data_type == 'DT':
+                    data_unit = data_units[col]  # Need to consider the unit to complete this check
+                    # Prep1: The format to be used in the mask1 check (in pd.to_datatime) as 'ISO8601' does not work for time only formats
+                    if data_unit == 'hh:mm':
+                        dtformat = '%H:%M'
+                    elif data_unit == 'hh:mm:ss':
+                        dtformat = '%H:%M:%S'
+                    else:
+                        dtformat = 'ISO8601'  # ok if date (with year) is included
+
+                    # Prep2: The Regex match pattern corresponding to the UNIT to be used in the mask2 check
+                    pattern = ''
+                    for x in data_unit:
+                        if x in ['y', 'm', 'd', 'h', 's']:  # If one of these, assume it is for one of the 'values' in the date or time or time offset
+                            pattern = pattern + r'\d'
+                        elif x == '+':  # + should only appear in timezone offset. If it does, then both + or - are valid
+                            pattern = pattern + '[+-]'
+                        else:  # Anything else, only permit that character, literally.
+                            pattern = pattern + '[' + x + ']'
+
+                    # Prep3: for the mask1 check the timezone offset (after 'Z') is stripped out
+                    temp = df[col].str.split('Z', expand=True)[0]
+                    # mask1: check if string is recognised as a valid datetime (or just time if applicable)
+                    mask1 = entries & pd.to_datetime(temp, errors='coerce', format=dtformat).isna()
+                    # mask2: check if string complies with UNIT format
+                    mask2 = entries & ~_match(df[col], pattern, full=True)
+                    # Both checks above must be passed
+                    mask = mask1 | mask2
+
+                    for line_number, value in _rows(df, mask, col):
+                        msg = f'Value {value} in {col} does not match the specified format ({data_unit}) or is an invalid date/time.'
+                        add_error_msg(ags_errors, 'AGS Format Rule 8', line_number, group, msg)
+
+                elif data_type == 'T':
+                    data_unit = data_units[col]  # Need to consider the unit to complete this check
+                    # Prep: The Regex match pattern corresponding to the UNIT to be used in the mask check
+                    if data_unit == 'hh:mm':
+                        pattern = r'\d*\d\d:[0-5]\d'
+                    elif data_unit == 'hh:mm:ss':
+                        pattern = r'\d*\d:[0-5]\d:[0-5]\d'
+                    elif data_unit == 'mm:ss':
+                        pattern = r'[0-5]\d:[0-5]\d'
+                    else:  # Assumes hh:mm:ss if nothing provided
+                        pattern = r'\d*\d:[0-5]\d:[0-5]\d'
+                    mask = entries & ~_match(df[col], pattern, full=True)
+
+                    for line_number, value in _rows(df, mask, col):
+                        msg = f'Value {value} in {col} not in the specified elapsed time format ({data_unit}) or is an invalid elapsed time.'
+                        add_error_msg(ags_errors, 'AGS Format Rule 8', line_number, group, msg)
+
+                elif data_type == 'U':
+                    # Column can contain any numeric value
+                    mask = entries & pd.to_numeric(df[col], errors='coerce').isna()
+
+                    for line_number, value in _rows(df, mask, col):
+                        msg = f'Value {value} in {col} not of data type {data_type}. Numeric value expected.'
+                        add_error_msg(ags_errors, 'AGS Format Rule 8', line_number, group, msg)
+
+                elif data_type == 'YN':
+                    mask = entries & ~_match(df[col], r'^(Y|N|y|n)$')
+
+                    for line_number, value in _rows(df, mask, col):
+                        msg = f'Value {value} in {col} not of data type {data_type}.'
+                        add_error_msg(ags_errors, 'AGS Format Rule 8', line_number, group, msg)
+
+                elif data_type == 'DMS':
+                    mask = entries & ~_match(df[col], r'^-?\d+:[0-5]\d:[0-5]\d\.?\d*$')
+
+                    for line_number, value in _rows(df, mask, col):
+                        msg = f'Value {value} in {col} not of data type {data_type} or is an invalid value.'
+                        add_error_msg(ags_errors, 'AGS Format Rule 8', line_number, group, msg)
+
+                elif (data_type == 'ID') and col.startswith(group):
+                    mask = entries & df.duplicated(col, keep=False)
+
+                    for line_number, value in _rows(df, mask, col):
+                        msg = f'Value {value} in {col} is not unique.'
+                        add_error_msg(ags_errors, 'AGS Format Rule 8', line_number, group, msg)
+
+        except IndexError:
+            # No TYPE row in table
+            pass
+
+    return ags_errors
+
+
+def rule_10a(tables, headings, dictionary, line_numbers, ags_errors={}):
+    """AGS Format Rule 10a: KEY fields in a GROUP must be present (even if null). There should not be any dupliate KEY field combinations.
+    """
+
+    from python_ags4.check import add_error_msg
+
+    is_key = dictionary.DICT_STAT.str.contains('key', case=False)
+
+    for group in tables:
+        # Extract KEY fields from dictionary
+        key_fields = dictionary.loc[(dictionary.DICT_GRP == group) & is_key, 'DICT_HDNG'].tolist()
+
+        # Check for missing KEY fields
+        for heading in key_fields:
+            if heading not in headings[group]:
+                line_number = line_numbers[group]['HEADING']
+                msg = f'Key field {heading} not found.'
+                add_error_msg(ags_errors, 'AGS Format Rule 10a', line_number, group, msg)
+
+        # Check for duplicate KEY field combinations if all KEY fields are present
+        if set(key_fields).issubset(set(headings[group])):
+            # 'HEADING' column has to added explicity as it is not in the key field list
+            key_fields = ['HEADING'] + key_fields
+
+            df = tables[group]
+            mask = df.duplicated(key_fields, keep=False).to_numpy()
+
+            # Key entries are joined in the order of the columns in the table
+            columns = [df[x].to_numpy()[mask] for x in df.columns if x in key_fields]
+
+            for line_number, *entries in zip(df['line_number'].to_numpy()[mask], *columns):
+                duplicate_key_combo = '|'.join(entries)
+                msg = f'Duplicate key field combination: {duplicate_key_combo}'
+                add_error_msg(ags_errors, 'AGS Format Rule 10a', int(line_number), group, msg)
+
+    return ags_errors
+
+
+def rule_10c(tables, headings, dictionary, line_numbers, ags_errors={}):
+    """AGS Format Rule 10c: Each DATA row should have a parent entry in the parent GROUP.
+
+    Rows are looked up in the distinct key combinations of the parent group,
+    instead of merging the whole child and parent tables.
+    """
+
+    from python_ags4.check import add_error_msg
+
+    is_key = dictionary.DICT_STAT.str.contains('key', case=False)
+
+    for group in tables:
+        # Find parent group name
+        # Groups without parents as per the Standard Dictionary are skipped
+        if group not in ['PROJ', 'TRAN', 'ABBR', 'DICT', 'UNIT', 'TYPE', 'LOCA', 'FILE', 'LBSG', 'PREM', 'STND']:
+
+            try:
+                mask = (dictionary.DICT_TYPE == 'GROUP') & (dictionary.DICT_GRP == group)
+                parent_group = dictionary.loc[mask, 'DICT_PGRP'].to_list()[0]
+
+                # Check whether parent entries exist
+                if parent_group == '':
+                    add_error_msg(ags_errors, 'AGS Format Rule 10c', '-', group, 'Parent group left blank in dictionary.')
+
+                else:
+                    # Extract KEY fields from dictionary
+                    parent_key_fields = dictionary.loc[(dictionary.DICT_GRP == parent_group) & is_key, 'DICT_HDNG'].tolist()
+                    parent_df = tables[parent_group]
+
+                    child_key_fields = dictionary.loc[(dictionary.DICT_GRP == group) & is_key, 'DICT_HDNG'].tolist()
+                    child_df = tables[group]
+
+                    # Return error message if parent group does not have any key fields
+                    if not parent_key_fields:
+                        msg = f'No key fields have been defined in parent group ({parent_group}). '\
+                            'Please check DICT group.'
+                        add_error_msg(ags_errors, 'AGS Format Rule 10c', '-', group, msg)
+
+                    # Return error message if child group key fileds is not a superset of parent group key fields
+                    elif not set(child_key_fields).issuperset(set(parent_key_fields)):
+                        missing_key_fields = set(parent_key_fields).difference(set(child_key_fields))
+                        msg = f'{", ".join(missing_key_fields)} defined as key field(s) in the parent group ({parent_group}) '\
+                            'but not in the child group. Please check DICT group.'
+                        add_error_msg(ags_errors, 'AGS Format Rule 10c', '-', group, msg)
+
+                    else:
+                        # Check that both child and parent groups have the parent key fields
+                        if set(parent_key_fields).issubset(set(headings[group])) and set(parent_key_fields).issubset(headings[parent_group]):
+                            # Join the child key columns onto the distinct parent key combinations
+                            # to find the entries that are not in the parent table
+                            parent_keys = parent_df[parent_key_fields].drop_duplicates()
+                            merged = child_df[parent_key_fields].merge(parent_keys, how='left', on=parent_key_fields, indicator=True)
+                            orphans = (merged['_merge'] == 'left_only').to_numpy()
+
+                            # Key entries are joined in the order of the columns in the child table
+                            columns = [child_df[x].to_numpy()[orphans] for x in child_df.columns if x in parent_key_fields]
+
+                            for line_number, *entries in zip(child_df['line_number'].to_numpy()[orphans], *columns):
+                                msg = '|'.join(entries)
+                                msg = f'Parent entry for line not found in {parent_group}: {msg}'
+                                add_error_msg(ags_errors, 'AGS Format Rule 10c', int(line_number), group, msg)
+
+                        else:
+                            msg = f'Could not check parent entries due to missing key fields in {group} or {parent_group}. '\
+                                'Check error log under AGS Format Rule 10a.'
+                            line_number = line_numbers[group]['HEADING']
+                            add_error_msg(ags_errors, 'AGS Format Rule 10c', line_number, group, msg)
+                            # Missing key fields in child and/or parent groups. AGS Format Rule 10a should catch this error.
+
+            except IndexError:
+                msg = 'Could not check parent entries since group definitions not found in standard dictionary or DICT group.'
+                add_error_msg(ags_errors, 'AGS Format Rule 10c', '-', group, msg)
+
+            except KeyError:
+                add_error_msg(ags_errors, 'AGS Format Rule 10c', '-', group, f'Could not find parent group {parent_group}.')
+
+    return ags_errors
+
+
+def rule_16(tables, headings, dictionary, ags_errors={}):
+    """AGS Format Rule 16: Data file shall contain an ABBR group with definitions for all abbreviations used in the file.
+
+    The ABBR codes for each heading are collected into a set once, instead of
+    being looked up for every entry.
+    """
+
+    from python_ags4.check import add_error_msg
+
+    try:
+        # Load ABBR group
+        ABBR = tables['ABBR']
+
+        for group in tables:
+            df = tables[group]
+            TYPE = df.loc[df['HEADING'] == 'TYPE']
+            is_data = df['HEADING'] == 'DATA'
+
+            for heading in headings[group]:
+                # Check whether column is of data type PA
+                if 'PA' in TYPE[heading].tolist():
+                    # Convert entries in column to a set to drop duplicates
+                    entries = set(df.loc[is_data, heading].to_list())
+
+                    try:
+                        # Extract concatenated entries (if they exist) using TRAN_RCON (if it exists)
+                        concatenator = tables['TRAN'].loc[tables['TRAN']['HEADING'] == 'DATA', 'TRAN_RCON'].values[0]
+                        entries = [entry.split(concatenator) for entry in entries]
+
+                        # The split operation will result in a list of lists that has to be flattened
+                        entries = [item for sublist in entries for item in sublist]
+
+                    except KeyError:
+                        # KeyError will be raised if TRAN or TRAN_RCON does not exist. AGS Format Rule 14 will catch this error.
+                        pass
+
+                    except IndexError:
+                        # IndexError will be raised if no DATA rows in ABBR table. AGS Format Rule 14 will catch this error.
+                        pass
+
+                    except ValueError:
+                        # ValueError will be raised by entry.split(concatenator) if TRAN_RCON is empty.
+                        # This error should be caught by AGS Format Rule 11b.
+                        pass
+
+                    try:
+                        # Check whether entries in the column is defined in the ABBR table
+                        codes = None
+                        for entry in entries:
+                            if codes is None:
+                                codes = set(ABBR.loc[ABBR['ABBR_HDNG'] == heading, 'ABBR_CODE'].to_list())
+
+                            if entry not in codes and entry not in ['']:
+                                msg = f'"{entry}" under {heading} in {group} not found in ABBR group.'
+                                add_error_msg(ags_errors, 'AGS Format Rule 16', '-', group, msg)
+
+                    except KeyError:
+                        # ABBR_HDNG and/or ABBR_CODE column missing. AGS Format Rule 10a and 10b should catch this error.
+                        pass
+
+    except KeyError:
+        # ABBR table is not required if no columns of data type PA are found
+        for group in tables:
+            df = tables[group]
+
+            for heading in headings[group]:
+                # Check whether column is of data type PA
+                if 'PA' in df.loc[df['HEADING'] == 'TYPE', heading].tolist():
+                    add_error_msg(ags_errors, 'AGS Format Rule 16', '-', 'ABBR', 'ABBR group not found.')
+
+                    # Break out of function as soon as first column of data type PA is found to
+                    # avoid duplicate error entries
+                    return ags_errors
+
+    return ags_errors
+
+
+# Helper functions
+
+def _match(column, pattern, full=False):
+    """Return a boolean Series that is True where the entries in column match
+    the regular expression, from the start (as 'Series.str.match()') or in
+    full (as 'Series.str.fullmatch()'). The pattern is only applied once to
+    each distinct entry."""
+
+    import re
+    import numpy as np
+    import pandas as pd
+
+    regex = re.compile(pattern)
+    match = regex.fullmatch if full else regex.match
+
+    codes, uniques = pd.factorize(column)
+    found = np.array([match(value) is not None for value in uniques], dtype=bool)
+
+    return pd.Series(found[codes], index=column.index)
+
+
+def _rows(df, mask, col):
+    """Yield the line number (as int, so that the errors can be written with
+    json) and entry of each row selected by mask."""
+
+    mask = mask.to_numpy()
+
+    for line_number, value in zip(df['line_number'].to_numpy()[mask], df[col].to_numpy()[mask]):
+        yield int(line_number), value
@@ -1,8 +1,10 @@
 import pandas as pd
+import numpy as np
 from PyQt5.QtCore import QAbstractTableModel, QPersistentModelIndex, QModelIndex, QEvent, QTimer, pyqtSignal, QPoint, QObject, QPropertyAnimation
 from PyQt5.QtWidgets import QApplication, QTableView, QDoubleSpinBox, QMenu, QInputDialog, QPushButton, QWidget
-from PyQt5.QtGui import QKeySequence, QMouseEvent, QIcon, QPixmap
+from PyQt5.QtGui import QKeySequence, QMouseEvent, QIcon, QPixmap, QColor
 import PyQt5.QtCore as QtCore
+from common.AGS4_package_edit import format_numeric_value
 from dataclasses import dataclass
 from functools import cached_property
 import csv
@@ -12,6 +14,8 @@ import sys
 sys.stdout.reconfigure(encoding='utf-8')
 
 class PandasModel(QAbstractTableModel):
+    modified = pyqtSignal()
+
     def __init__(self, dataframe: pd.DataFrame):
         super().__init__()
         '''saving some commands to be used on subclass'''
@@ -22,6 +26,17 @@ class PandasModel(QAbstractTableModel):
         self.original = dataframe.copy()
         self.df = dataframe
         self.sort_state = 0
+        self.loading = False
+        self.error_cells = None
+        self.error_mask = None
+        self.sort_keys = {}
+        self.validator = None
+        self.pending = set()
+        self.validate_timer = QTimer()
+        self.validate_timer.setSingleShot(True)
+        self.validate_timer.setInterval(300)
+        self.validate_timer.timeout.connect(self.validate_pending)
+        self.layoutChanged.connect(self.update_error_mask)
         
     def rowCount(self, parent: QPersistentModelIndex) -> int:
         if self.df is None:
@@ -50,6 +65,9 @@ class PandasModel(QAbstractTableModel):
             x = self.df.iloc[index.row(), index.column()]
             if isinstance(x, str):
                 return x
+            elif isinstance(x, float) and x == x and self.df.columns[index.column()] in self.typed_columns():
+                # numbers loaded from a typed column are shown as they appear in the AGS
+                return format_numeric_value(x, self.typed_columns()[self.df.columns[index.column()]])
             elif self.is_numeric(x):
                 if isinstance(x, int):
                     return str(x) # don't put decimals on int
@@ -60,6 +78,96 @@ class PandasModel(QAbstractTableModel):
             else:
                 return str(x)
 
+        if role == QtCore.Qt.ItemDataRole.BackgroundRole and self.error_mask is not None:
+            if index.row() < self.error_mask.shape[0] and index.column() < self.error_mask.shape[1] and self.error_mask[index.row(), index.column()]:
+                return QColor('#ffc7ce')
+
+        if role == QtCore.Qt.ItemDataRole.ToolTipRole and self.validator is not None:
+            try:
+                errors = self.validator.checked.get((self.df.index[index.row()], self.df.columns[index.column()]))
+            except (IndexError, TypeError):
+                errors = None
+            if errors:
+                return '\n'.join(errors)
+
+        return None
+
+    def set_error_cells(self, cells):
+        '''Highlight the cells with errors, given as the index labels of their rows and their column names (None for the whole row)'''
+        self.error_cells = cells
+        self.update_error_mask()
+
+    def update_error_mask(self):
+        '''The cells to highlight are worked out whenever the table changes (edited, sorted, columns moved...), not each time a cell is painted'''
+        self.error_mask = None
+        if self.error_cells is None or self.df is None or self.df.shape[0] == 0 or not self.df.index.is_unique or not self.df.columns.is_unique:
+            return
+        labels, columns = self.error_cells
+        rows = self.df.index.get_indexer(labels)
+        cols = self.df.columns.get_indexer(columns)
+        mask = np.zeros(self.df.shape, dtype=bool)
+        cell = (rows >= 0) & (cols >= 0)
+        mask[rows[cell], cols[cell]] = True
+        # errors about a whole row, e.g. duplicate key fields
+        whole_row = (rows >= 0) & (cols < 0)
+        mask[rows[whole_row], :] = True
+        self.error_mask = mask
+        self.apply_validation(self.validator.checked if self.validator is not None else {})
+
+    def queue_validation(self, row, column):
+        '''Edited cells are collected and checked together once typing pauses, rather than on every keystroke'''
+        if self.validator is None:
+            return
+        self.pending.add((self.df.index[row], self.df.columns[column]))
+        self.validate_timer.start()
+
+    def validate_pending(self):
+        '''Check the edited cells (and the rows sharing their KEY/ID entries) and update their highlighting'''
+        if self.validator is None or not self.pending or self.df is None:
+            self.pending = set()
+            return
+        cells, self.pending = self.pending, set()
+        if not self.df.index.is_unique or not self.df.columns.is_unique:
+            return
+        changed = self.validator.validate(self.df, cells)
+        self.apply_validation(changed)
+        rows = self.df.index.get_indexer([cell[0] for cell in changed])
+        cols = self.df.columns.get_indexer([cell[1] for cell in changed])
+        shown = (rows >= 0) & (cols >= 0)
+        if shown.any():
+            self.dataChanged.emit(self.index(int(rows[shown].min()), int(cols[shown].min())), self.index(int(rows[shown].max()), int(cols[shown].max())))
+
+    def apply_validation(self, cells):
+        '''Set the highlighting of checked cells from the errors found while editing, on top of those from the last full check'''
+        if not cells or self.df is None or self.df.shape[0] == 0:
+            return
+        cells = list(cells)
+        rows = self.df.index.get_indexer([cell[0] for cell in cells])
+        cols = self.df.columns.get_indexer([cell[1] for cell in cells])
+        if self.error_mask is None or self.error_mask.shape != self.df.shape:
+            self.error_mask = np.zeros(self.df.shape, dtype=bool)
+        for row, col, cell in zip(rows, cols, cells):
+            if row >= 0 and col >= 0:
+                self.error_mask[row, col] = bool(self.validator.checked.get(cell))
+
+    def append_rows(self, dataframe: pd.DataFrame):
+        '''Add rows to the end of the table as they are loaded in the background'''
+        if dataframe.shape[0] == 0:
+            return
+        first = self.df.shape[0]
+        self.beginInsertRows(QModelIndex(), first, first + dataframe.shape[0] - 1)
+        self.df = pd.concat([self.df, dataframe], ignore_index=True) if first else dataframe
+        self.endInsertRows()
+
+    def typed_columns(self):
+        return self.df.attrs.get('typed_columns', {})
+
+    def sort_key(self, col_name):
+        '''Typed columns hold floats alongside the UNIT/TYPE text, so they are sorted by their numeric value'''
+        if col_name in self.sort_keys:
+            return self.sort_keys[col_name]
+        if col_name in self.typed_columns():
+            return lambda col: pd.to_numeric(col, errors='coerce')
         return None
 
     def setData(self, index, value, role):
@@ -70,7 +178,9 @@ class PandasModel(QAbstractTableModel):
         
         if role == QtCore.Qt.EditRole:
             self.df.iloc[index.row(),index.column()] = value
-            self.layoutChanged.emit()
+            self.dataChanged.emit(index, index)
+            self.modified.emit()
+            self.queue_validation(index.row(), index.column())
             return True
 
     # def headerData(self, section: int, orientation: Qt.Orientation, role: Qt.ItemDataRole):
@@ -101,6 +211,9 @@ class PandasModel(QAbstractTableModel):
     
 
     def flags(self, index: QModelIndex) -> QtCore.Qt.ItemFlag:
+        if self.loading:
+            # cells can't be edited until the whole group has loaded
+            return QtCore.Qt.ItemFlag.ItemIsEnabled | QtCore.Qt.ItemFlag.ItemIsSelectable
         return QtCore.Qt.ItemFlag.ItemIsEnabled | QtCore.Qt.ItemFlag.ItemIsSelectable | QtCore.Qt.ItemFlag.ItemIsEditable
     
     '''Overriding default sort method as it affects the interaction of the selection model on click, '''
@@ -110,8 +223,9 @@ class PandasModel(QAbstractTableModel):
     def _sort(self, Ncol, order):
         try:
             # self.layoutAboutToBeChanged.emit()
-            self.df.sort_values(self.df.columns[Ncol], ascending=order, inplace=True)
+            self.df.sort_values(self.df.columns[Ncol], ascending=order, inplace=True, key=self.sort_key(self.df.columns[Ncol]))
             self.layoutChanged.emit()
+            self.modified.emit()
         except Exception as e:
             print(e)
 
@@ -151,6 +265,8 @@ class PandasView(QTableView):
     def header_menu(self, position):
         menu = QMenu()
         model = self.model()
+        if model.loading:
+            return
         rename = menu.addAction(QIcon("common/images/edit.svg"),"Rename Header")
         insert_col = menu.addAction(QIcon("common/images/insert.svg"),"Insert Column")
         del_col = menu.addAction(QIcon("common/images/delete.svg"),"Delete Column")
@@ -172,18 +288,21 @@ class PandasView(QTableView):
                     model.df.rename(columns={f'{col_name}':f'{new_header[0]}'}, inplace=True)
                     self.resizeColumnsToContents()
                     model.layoutChanged.emit()
+                    model.modified.emit()
             if _action == insert_col:   
                 new_col = QInputDialog.getText(self," ","New column name:")
                 if new_col[1]:
                     try:
                         model.df.insert(index+1, new_col[0], value="")
                         model.layoutChanged.emit()
+                        model.modified.emit()
                         self.resizeColumnsToContents()
                     except Exception as e:
                         print(e)
             if _action == del_col:
                 model.df.drop(col_name, axis=1, inplace=True)
                 model.layoutChanged.emit()
+                model.modified.emit()
                 self.resizeColumnsToContents()
             if _action == move_right:
                 if index + 1 >= len(model.df.columns):
@@ -191,24 +310,28 @@ class PandasView(QTableView):
                 model.df.insert(index+1, col_name, model.df.pop(col_name))
                 self.resizeColumnsToContents()
                 model.layoutChanged.emit()
+                model.modified.emit()
             if _action == move_left:
                 if index - 1 < 1:
                     return
                 model.df.insert(index-1, col_name, model.df.pop(col_name))
                 self.resizeColumnsToContents()
                 model.layoutChanged.emit()
+                model.modified.emit()
             if _action == sort_asc:
                 model.sort_state = 1
-                model.df.sort_values(col_name, ascending=True, kind='mergesort', inplace=True)
+                model.df.sort_values(col_name, ascending=True, kind='mergesort', inplace=True, key=model.sort_key(col_name))
                 model.headerData(index, QtCore.Qt.Orientation.Horizontal, role=QtCore.Qt.ItemDataRole.DecorationRole)
                 self.resizeColumnsToContents()
                 model.layoutChanged.emit()
+                model.modified.emit()
             if _action == sort_des:
                 model.sort_state = 2
-                model.df.sort_values(col_name, ascending=False, kind='mergesort', inplace=True)
+                model.df.sort_values(col_name, ascending=False, kind='mergesort', inplace=True, key=model.sort_key(col_name))
                 model.headerData(index, QtCore.Qt.Orientation.Horizontal, role=QtCore.Qt.ItemDataRole.DecorationRole)
                 self.resizeColumnsToContents()
                 model.layoutChanged.emit()
+                model.modified.emit()
             if _action == refresh:
                 model.df = model.original.copy()
                 self.refreshed.emit()
@@ -216,6 +339,7 @@ class PandasView(QTableView):
                 # idx_bot = model.createIndex(model.df.shape[0],0)
                 # model.dataChanged.emit(idx_top, idx_bot)
                 model.layoutChanged.emit()
+                model.modified.emit()
                 self.resizeColumnsToContents()
                 model.sort_state = 0
                 model.headerData(index, QtCore.Qt.Orientation.Horizontal, role=QtCore.Qt.ItemDataRole.DecorationRole)
@@ -226,6 +350,8 @@ class PandasView(QTableView):
 
     '''TableView context menu for adding rows'''
     def row_menu(self, position):
+        if self.model().loading:
+            return
         menu = QMenu()
         insert_rows = menu.addAction(QIcon("common/images/insert.svg"),"Insert Rows")
         menu.addSeparator()
@@ -250,6 +376,8 @@ class PandasView(QTableView):
         if event.type() == QEvent.KeyPress and event.matches(QKeySequence.Copy):
             self.copy_selection()
             return True
+        elif event.type() == QEvent.KeyPress and self.model() is not None and self.model().loading and (event.matches(QKeySequence.Paste) or event.matches(QKeySequence.Delete)):
+            return True # no edits until the group has loaded
         elif event.type() == QEvent.KeyPress and event.matches(QKeySequence.Paste):
             self.paste_selection()
             return True
@@ -261,6 +389,8 @@ class PandasView(QTableView):
 
     def sort(self, idx):
         model = self.model()
+        if model.loading:
+            return
 
         #https://gist.github.com/StephenNneji/14bfc4e7a322ec89df7d30847fbf19b3
         #https://stackoverflow.com/questions/65179468/cannot-set-header-data-with-qtableview-custom-table-model
@@ -271,17 +401,19 @@ class PandasView(QTableView):
             '''Toggling between sort states, to sort ascending, descending, and back to original index on double click event'''
             if model.sort_state == 0:
                 model.sort_state = 1
-                model.df.sort_values(col_name, ascending=True, kind='mergesort', inplace=True)
+                model.df.sort_values(col_name, ascending=True, kind='mergesort', inplace=True, key=model.sort_key(col_name))
                 model.headerData(idx, QtCore.Qt.Orientation.Horizontal, role=QtCore.Qt.ItemDataRole.DecorationRole)
                 self.resizeColumnsToContents()
                 model.layoutChanged.emit()
+                model.modified.emit()
                 return
             if model.sort_state == 1:
                 model.sort_state = 2
-                model.df.sort_values(col_name, ascending=False, kind='mergesort', inplace=True)
+                model.df.sort_values(col_name, ascending=False, kind='mergesort', inplace=True, key=model.sort_key(col_name))
                 model.headerData(idx, QtCore.Qt.Orientation.Horizontal, role=QtCore.Qt.ItemDataRole.DecorationRole)
                 self.resizeColumnsToContents()
                 model.layoutChanged.emit()
+                model.modified.emit()
                 return
             if model.sort_state == 2:
                 model.sort_state = 0
@@ -289,6 +421,7 @@ class PandasView(QTableView):
                 model.headerData(idx, QtCore.Qt.Orientation.Horizontal, role=QtCore.Qt.ItemDataRole.DecorationRole)
                 self.resizeColumnsToContents()
                 model.layoutChanged.emit()
+                model.modified.emit()
                 return
         except Exception as e:
             print(e)
@@ -335,11 +468,13 @@ class PandasView(QTableView):
         if not col_check and not row_check: #deleting cells if the entire row or entire column is not selected
             for index in selection:
                 model.df.iloc[index.row(), index.column()] = ""
+                model.queue_validation(index.row(), index.column())
 
         idx_top = model.createIndex(0,0)
         idx_bot = model.createIndex(model.df.shape[0],0)
         model.dataChanged.emit(idx_top, idx_bot)
         model.layoutChanged.emit()
+        model.modified.emit()
         self.clearSelection()
         #self.viewport().repaint()
 
@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 import os
 import time
+from common.cache_functions import ParseCache
 import common.AGS4_package_edit as AGS4 # had to edit this to concat linebreaks - credits to python_ags4, asitha-sena, https://gitlab.com/ags-data-format-wg/ags-python-library
 from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QMessageBox, QWidget
@@ -77,6 +78,7 @@ class AGSHandler(QWidget):
     _enable_error_export = pyqtSignal(bool)
     _enable_results_export = pyqtSignal(bool)
     _set_model = pyqtSignal(pd.DataFrame)
+    _set_errors = pyqtSignal(pd.DataFrame)
     _coin = pyqtSignal()
     _table_setup = pyqtSignal()
     _progress_max = pyqtSignal(int)
@@ -92,8 +94,16 @@ class AGSHandler(QWidget):
         self.ags_tables: list = []
         self.result_list: list = []
         self.error_list: list = []
+        self.error_index: pd.DataFrame = None
+        self.error_cells: dict = {}
         self.results_with_samp_and_type: pd.DataFrame = None
         self.temp_file_name: str = ''
+        self.repairs: list = []
+        self.file_locations: list = []
+        self.parse_cache: ParseCache = None
+        self.table_versions: dict = {}
+        self.check_cache = AGS4.CheckCache()
+        self.validators: dict = {}
 
         self.result_tables = ['SAMP','SPEC','TRIG','TRIT','LNMC','LDEN','GRAG','GRAT',
         'CONG','CONS','CODG','CODT','LDYN','LLPL','LPDN','LPEN','LRES','LTCH','LTHC',
@@ -103,6 +113,15 @@ class AGSHandler(QWidget):
 
         self.core_tables = ["TRAN","PROJ","UNIT","ABBR","TYPE","DICT","LOCA"]
 
+        # Lab groups counted by Count Lab Results, in report order, with the column holding the test type of each result (None if not split by type)
+        self.lab_test_types = {'TRIG': 'TRIG_COND', 'LNMC': None, 'LDEN': None, 'GRAT': 'GRAT_TYPE', 'CONG': 'CONG_COND',
+        'LDYN': None, 'LLPL': None, 'LPDN': None, 'LPEN': None, 'LRES': None, 'LTCH': None, 'LVAN': None, 'RELD': None,
+        'SHBG': None, 'TREG': 'TREG_TYPE', 'DSSG': None, 'IRSG': None, 'PTST': None, 'GCHM': 'GCHM_CODE', 'RESG': None,
+        'ERES': 'ERES_TNAM', 'RCAG': None, 'RDEN': None, 'RUCS': None, 'RPLT': None, 'LHVN': None, 'TXTG': 'TXTG_TYPE',
+        'SSTG': 'SSTG_TYPE'}
+        # Groups with a row per reading rather than per test, listed once per sample (and per test type for GRAT)
+        self.lab_unique_results = ['GRAT', 'RPLT']
+
 
     def load_ags_file(self):
         self._disable.emit()
@@ -111,12 +130,46 @@ class AGSHandler(QWidget):
 ''')
 
         if not self.config.get('LastFolder','dir') == "":
-            self.file_location = QtWidgets.QFileDialog.getOpenFileNames(self,'Please insert AGS file...', self.config.get('LastFolder','dir'), '*.ags')
+            self.file_location = QtWidgets.QFileDialog.getOpenFileNames(self,'Please insert AGS file...', self.config.get('LastFolder','dir'), 'AGS files (*.ags *.ags.gz *.zip)')
         else:
-            self.file_location = QtWidgets.QFileDialog.getOpenFileNames(self,'Please insert AGS file...', os.getcwd(), '*.ags')
+            self.file_location = QtWidgets.QFileDialog.getOpenFileNames(self,'Please insert AGS file...', os.getcwd(), 'AGS files (*.ags *.ags.gz *.zip)')
         if not len(self.file_location[0]) == 0:
-            self.file_location = self.file_location[0][0]
+            self.file_locations = self.file_location[0]
+            self.file_location = self.file_locations[0]
             last_dir = str(os.path.dirname(self.file_location))
+            if len(self.file_locations) > 1:
+                # Several files are opened together as one merged dataset, including every AGS file in any archive
+                files = []
+                for path in self.file_locations:
+                    if path.lower().endswith('.zip'):
+                        files += [f'{path}/{member}' for member in AGS4.zip_members(path)]
+                    else:
+                        files.append(path)
+                self.file_locations = files
+            elif self.file_location.lower().endswith('.zip'):
+                # Point at the AGS file inside the archive, asking which one if there are several
+                members = AGS4.zip_members(self.file_location)
+                if len(members) == 0:
+                    self._update_text.emit('''No AGS file found in the zip archive!
+Please select an AGS with "Open File..."''')
+                    print("No AGS file found in the zip archive! Please select an AGS with 'Open File...'")
+                    self.file_location = ['']
+                    self._disable.emit()
+                    self._open.emit(True)
+                    return
+                if len(members) > 1:
+                    member, ok = QtWidgets.QInputDialog.getItem(None, 'Select AGS file', 'AGS files in archive:', members, 0, False)
+                    if not ok:
+                        self._update_text.emit('''No AGS file selected!
+Please select an AGS with "Open File..."''')
+                        self.file_location = ['']
+                        self._disable.emit()
+                        self._open.emit(True)
+                        return
+                else:
+                    member = members[0]
+                self.file_location = f'{self.file_location}/{member}'
+                self.file_locations = [self.file_location]
             self.config.set('LastFolder','dir',last_dir)
             with open('common/assets/settings.ini', 'w') as configfile: 
                 self.config.write(configfile)
@@ -131,8 +184,26 @@ Please select an AGS with "Open File..."''')
             return
         
     def ags_tables_from_file(self):
+        # Results of earlier checks belong to the previous file
+        self.table_versions = {}
+        self.check_cache.clear()
+        self.validators = {}
+        self.error_index = None
+        self.error_cells = {}
         try:
-            self.tables, self.headings = AGS4.AGS4_to_dataframe(self.file_location)
+            typed = self.config.getboolean('Load','typed_numeric',fallback=False)
+            if len(self.file_locations) > 1:
+                # Each file is parsed in its own process, then the groups are merged with a source_file column
+                self.tables, self.headings, self.repairs = AGS4.AGS4_files_to_dataframe(self.file_locations, workers=os.cpu_count(), typed=typed)
+                rprint(f"[green]Merged {len(self.file_locations)} AGS files.[/green]")
+            elif AGS4.is_compressed(self.file_location):
+                # Compressed files can only be read from start to end, so they are loaded in one go
+                self.tables, self.headings, self.repairs = AGS4.AGS4_to_dataframe(self.file_location, get_repair_report=True, typed=typed)
+            else:
+                # Only the group index is read here, each table is parsed when it is first used
+                self.tables = AGS4.LazyTables(self.file_location, cache=self.get_parse_cache(), typed=typed)
+                self.headings = self.tables.headings
+                self.repairs = self.tables.repairs
         except:
             print("Uh, something went wrong. Was that an AGS file? Send help.")
             self._open.emit(True)
@@ -142,6 +213,52 @@ Please select an AGS with "Open File..."''')
             self._enable.emit()
             return self.tables, self.headings
 
+    def get_parse_cache(self):
+        if not self.config.getboolean('Cache','enabled',fallback=True):
+            return None
+        if self.parse_cache is None:
+            self.parse_cache = ParseCache(self.config.get('Cache','dir',fallback='common/assets/cache'),
+                max_size=self.config.getint('Cache','max_size_mb',fallback=2048)*1024**2)
+        return self.parse_cache
+
+    def load_all_tables(self):
+        # Parse any groups not opened yet across all cores before the whole file is needed
+        if isinstance(self.tables, AGS4.LazyTables):
+            self.tables.load_all(workers=os.cpu_count())
+            self.repairs = self.tables.repairs
+
+    def mark_modified(self, table):
+        # Edited groups are written out again on save, the rest are copied from the original file,
+        # and checked again on the next check, the rest reuse the results of the last one
+        self.table_versions[table] = self.table_versions.get(table, 0) + 1
+        if isinstance(self.tables, AGS4.LazyTables):
+            self.tables.mark_modified(table)
+
+    def untype_tables(self, tables):
+        # Lab matching joins and compares sample depths as text, so typed numeric columns are turned back into the text of the file
+        for table in tables:
+            df = self.tables[table]
+            untyped = AGS4.untype_numeric_columns(df)
+            if untyped is not df:
+                self.tables[table] = untyped
+                self.mark_modified(table)
+
+    def validator(self, table):
+        # Edited cells are checked as they are typed in, against the rows and groups as they are now
+        if table not in self.validators or self.validators[table].tables is not self.tables:
+            self.validators[table] = AGS4.CellValidator(table, self.tables, self.table_versions)
+        return self.validators[table]
+
+    def is_loaded(self, table):
+        if isinstance(self.tables, AGS4.LazyTables):
+            return self.tables.is_loaded(table)
+        return True
+
+    def row_count(self, table):
+        if isinstance(self.tables, AGS4.LazyTables):
+            return self.tables.row_count(table)
+        return self.tables[table].shape[0]
+
     def get_ags_tables(self):
         self.ags_table_reset()
 
@@ -188,20 +305,31 @@ Please select an AGS with "Open File..."''')
                 print("No AGS file selected! Please select an AGS with 'Open File...'")
             else:
                 try:
-                    #errors = AGS4.check_file(self.file_location)
-                    '''need to get the latest data from self.tables to check errors, but dataframe_to_AGS4 method returns a file... so create a temp file to delete later'''
-                    AGS4.dataframe_to_AGS4(self.tables, self.tables, f'{os.getcwd()}\\_temp_.ags')
-                    errors = AGS4.check_file(f'{os.getcwd()}\\_temp_.ags')
+                    # The latest data in self.tables is checked in memory, the file is only used for its name and FILE folder
+                    self.load_all_tables()
+                    # The standard dictionary is parsed once and kept in the parse cache for later sessions
+                    AGS4.set_dictionary_cache(self.get_parse_cache())
+                    # Rules run across all cores on large files, the time each one took is listed afterwards.
+                    # Only groups edited since the last check (see mark_modified) are checked again
+                    timings = {}
+                    locations = {}
+                    errors = AGS4.check_tables(self.tables, filepath=self.file_location if len(self.file_locations) < 2 else None,
+                        workers=os.cpu_count(), timings=timings, versions=self.table_versions, cache=self.check_cache, locations=locations)
+                    slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:5]
+                    rprint("[green]Slowest checks: [/green]" + ', '.join(f"{rule} {seconds:.2f}s" for rule, seconds in slowest))
+                    # Each error is tied to the row and column of its table, to list, filter and highlight them in the table view
+                    self.error_index = AGS4.error_index(errors, locations, self.tables)
+                    in_rows = self.error_index[self.error_index['row'].notna()]
+                    self.error_cells = {group: (df['row'].to_numpy(dtype='int64'), df['column'].to_numpy())
+                                        for group, df in in_rows.groupby('group')}
+                    # Cells edited before this check are highlighted from its results from now on
+                    for validator in self.validators.values():
+                        validator.checked.clear()
                 except Exception as e:
                     print(e)
                     
         except ValueError as e:
             print(f'AGS Checker ended unexpectedly: {e}')
-            try:
-                if os.path.isfile(f'{os.getcwd()}\\_temp_.ags'):
-                    os.remove(f'{os.getcwd()}\\_temp_.ags')
-            except Exception as e:
-                print(e)
             return
         
         for rule, items in errors.items():
@@ -217,12 +345,6 @@ Please select an AGS with "Open File..."''')
 
         if errors:
             self._enable_error_export.emit(True)
-
-            try:    
-                if os.path.isfile(f'{os.getcwd()}\\_temp_.ags'):
-                    os.remove(f'{os.getcwd()}\\_temp_.ags')
-            except Exception as e:
-                print(e)
             self._enable.emit()
 
             if self.error_list == []:
@@ -230,12 +352,12 @@ Please select an AGS with "Open File..."''')
                 print("No errors found. Yay.")
                 self._update_text.emit("""AGS file contains no errors!
 """)        
+                err_df = pd.DataFrame.from_dict(self.error_list)
+                self._set_model.emit(err_df)
             else:
                 self._update_text.emit('''Error(s) found, check output or click 'Export Error Log'.
-''')
-
-            err_df = pd.DataFrame.from_dict(self.error_list)
-            self._set_model.emit(err_df)
+Double-click an error to go to it.''')
+                self._set_errors.emit(self.error_index)
 
 
     def export_errors(self):
@@ -266,9 +388,9 @@ Please select an AGS with "Open File..."''')
         self._disable.emit()
 
         if not self.config.get('LastFolder','dir') == "":
-            newFileName = QtWidgets.QFileDialog.getSaveFileName(self,'Save AGS file as...', self.config.get('LastFolder','dir'), '*.ags')
+            newFileName = QtWidgets.QFileDialog.getSaveFileName(self,'Save AGS file as...', self.config.get('LastFolder','dir'), 'AGS files (*.ags *.ags.gz)')
         else:
-            newFileName = QtWidgets.QFileDialog.getSaveFileName(self,'Save AGS file as...', os.getcwd(), '*.ags')
+            newFileName = QtWidgets.QFileDialog.getSaveFileName(self,'Save AGS file as...', os.getcwd(), 'AGS files (*.ags *.ags.gz)')
         try:
             newFileName = newFileName[0]
 
@@ -276,7 +398,22 @@ Please select an AGS with "Open File..."''')
 Saving AGS file...
 ------------------------------------------------------[/cyan]""")
             
-            AGS4.dataframe_to_AGS4(self.tables, self.tables, newFileName)
+            progress_total = (len(self.tables.keys())) * 100
+            self._progress_max.emit(progress_total)
+            self._progress_current.emit(0)
+
+            if isinstance(self.tables, AGS4.LazyTables):
+                # Groups that weren't changed are copied straight from the original file, only edited groups are written out again
+                headings = {k: list(self.tables[k].columns) for k in self.tables if self.tables.is_loaded(k)}
+                self.tables.to_AGS4(newFileName, headings, workers=os.cpu_count(),
+                    progress=lambda n: self._progress_current.emit(n * 100))
+            else:
+                # Columns are written in their current order, leaving out the source_file column added when several files are merged
+                headings = {k: [col for col in v.columns if col != 'source_file'] for (k,v) in self.tables.items()}
+
+                # Large files are formatted across all cores, groups are still written in their original order
+                AGS4.dataframe_to_AGS4(self.tables, headings, newFileName, workers=os.cpu_count(),
+                    progress=lambda n: self._progress_current.emit(n * 100))
             self._update_text.emit('''AGS saved.
 ''')
         
@@ -290,161 +427,70 @@ Saving AGS file...
         self._disable.emit()
 
         self.results_with_samp_and_type = pd.DataFrame()
-
-        lab_tables = ['TRIG','LNMC','LDEN','GRAT','CONG','LDYN','LLPL','LPDN','LPEN',
-        'LRES','LTCH','LVAN','RELD','SHBG','TREG','DSSG','IRSG','PTST','GCHM','RESG',
-        'ERES','RCAG','RDEN','RUCS','RPLT','LHVN','TXTG', 'SSTG'
-        ]
-
-        all_results = []
-        error_tables = []
         self.result_list = []
         self.ags_table_reset()
+        error_tables = []
+        all_results = []
 
-        for table in lab_tables:
+        # The results of every lab group go into one table, so that the counts of all groups are worked out together
+        frames = {}
+        for table, type_field in self.lab_test_types.items():
             if table in list(self.tables):
                 self.ags_tables.append(table)
-                
-        for table in lab_tables:
-            if table in self.ags_tables:
                 try:
-                    test_type_df = pd.DataFrame
-                    location = list(self.tables[table]['LOCA_ID'][2:])
-                    samp_id = list(self.tables[table]['SAMP_ID'][2:])
-                    samp_ref = list(self.tables[table]['SPEC_REF'][2:])
-                    samp_depth = list(self.tables[table]['SPEC_DPTH'][2:])
-
-                    lab_field = [col for col in self.tables[table].columns if 'LAB' in col]
-                    if not lab_field == []:
-                        lab_field = str(lab_field[0])
-                    lab = self.tables[table][lab_field].iloc[2:]
-
-                    if 'GCHM' in table:
-                        test_type_df = pd.DataFrame.from_dict(list(self.tables[table]['GCHM_CODE'][2:]))
-                    elif 'TRIG' in table:
-                        test_type_df = pd.DataFrame.from_dict(list(self.tables[table]['TRIG_COND'][2:]))
-                    elif 'CONG' in table:
-                        test_type_df = pd.DataFrame.from_dict(list(self.tables[table]['CONG_COND'][2:]))
-                    elif 'TREG' in table:
-                        test_type_df = pd.DataFrame.from_dict(list(self.tables[table]['TREG_TYPE'][2:]))
-                    elif 'ERES' in table:
-                        test_type_df = pd.DataFrame.from_dict(list(self.tables[table]['ERES_TNAM'][2:]))
-                    elif 'TXTG' in table:
-                        test_type_df = pd.DataFrame.from_dict(list(self.tables[table]['TXTG_TYPE'][2:]))
-                    elif 'SSTG' in table:
-                        test_type_df = pd.DataFrame.from_dict(list(self.tables[table]['SSTG_TYPE'][2:]))
-                    elif 'GRAT'in table:
-                        test_type = list(self.tables[table]['GRAT_TYPE'][2:])
-                        #turning into a dataframe to drop all the duplcicates per test type per sample, using the test type from that list as the count
-                        samp_with_table = list(zip(location,samp_id,samp_ref,samp_depth,test_type))
-                        result_table = pd.DataFrame.from_dict(samp_with_table)
-                        result_table.drop_duplicates(inplace=True)
-                        result_table.columns = ['POINT','ID','REF','DEPTH','TYPE']
-                        tt = result_table['TYPE'].to_list()
-                        test_type_df = pd.DataFrame.from_dict(tt)
-                    if not type(lab) == list and lab.empty:
-                        lab = list(samp_id)
-                        for x in range(0,len(lab)):
-                            lab[x] = ""
-
-                    if test_type_df.empty:
-                        test_type = []
-                    else:
-                        test_type = list(test_type_df[0])
-
-                    samples = list(zip(location,samp_id,samp_ref,samp_depth,test_type,lab))
-                    table_results = pd.DataFrame.from_dict(samples)
-                    if table == 'GRAT':
-                        table_results.drop_duplicates(inplace=True)
-        
-                    if not len(test_type) == 0:
-                        table_results.loc[-1] = [table,'','','','','']
-                        table_results.index = table_results.index + 1
-                        table_results.sort_index(inplace=True)
-                        num_test = test_type_df.value_counts()
-                        test_counts = pd.DataFrame(num_test)
-                        head = []
-                        val = []
-                        for y in test_counts.index.tolist():
-                            head.append(y[0])
-                        for z in test_counts.values.tolist():
-                            val.append(z)
-                        count = list(zip(head,val))
-                        lab_count_off = [x for x in lab if x == "Offshore"]
-                        lab_count_off = len(lab_count_off)
-                        lab_count_none = [x for x in lab if x == ""]
-                        lab_count_none = len(lab_count_none)
-                        lab_count_on = [x for x in lab if not x == "Offshore" and not x == ""]
-                        lab_count_on = len(lab_count_on)
-                        if not lab_count_none == 0:
-                            if "GRAT" in table:
-                                valcount = len(list(set(list(zip(samp_id,samp_depth)))))
-                                #valcount = table_results.shape[0] - 1
-                                count = [f"{count}, Onshore:{valcount}"]
-                            else:
-                                count = [f"{count}, Offshore:{lab_count_off}, Onshore:{lab_count_on}, None:{lab_count_none}"]
-                        else:
-                            if lab_count_off == 0 and not lab_count_on == 0:
-                                count = [f"{count}, Onshore:{lab_count_on}"]
-                            elif lab_count_on == 0 and not lab_count_off == 0:
-                                count = [f"{count}, Offshore:{lab_count_off}"]
-                            else:
-                                count = [f"{count}, Offshore:{lab_count_off}, Onshore:{lab_count_on}"]
-                    else:
-                        test_type = list(samp_id)
-                        for x in range(0,len(test_type)):
-                            test_type[x] = ""
-                        count = str(len(samp_id))
-                        lab_count_off = [x for x in lab if x == "Offshore"]
-                        lab_count_off = len(lab_count_off)
-                        lab_count_none = [x for x in lab if x == ""]
-                        lab_count_none = len(lab_count_none)
-                        lab_count_on = [x for x in lab if not x == "Offshore" and not x == ""]
-                        lab_count_on = len(lab_count_on)
-                        if not lab_count_none == 0:
-                            count = [f"Offshore:{lab_count_off}, Onshore:{lab_count_on}, None:{lab_count_none}"]
-                        else:
-                            if lab_count_off == 0 and not lab_count_on == 0:
-                                count = [f"Onshore:{lab_count_on}"]
-                            elif lab_count_on == 0 and not lab_count_off == 0:
-                                count = [f"Offshore:{lab_count_off}"]
-                            else:
-                                count = [f"Offshore:{lab_count_off}, Onshore:{lab_count_on}"]
-                        sample = list(zip(location,samp_id,samp_ref,samp_depth,test_type,lab))
-                        table_results_2 = pd.DataFrame.from_dict(sample)
-                        if table == 'RPLT':
-                            table_results_2.drop_duplicates(inplace=True)
-                            count = table_results_2.shape[0]
-                            lab_count_off = [x for x in lab if x == "Offshore"]
-                            lab_count_off = len(lab_count_off)
-                            lab_count_none = [x for x in lab if x == ""]
-                            lab_count_none = len(lab_count_none)
-                            lab_count_on = [x for x in lab if not x == "Offshore" and not x == ""]
-                            lab_count_on = len(lab_count_on)
-                            if not lab_count_none == 0:
-                                count = [f"Offshore:{lab_count_off}, Onshore:{lab_count_on}, None:{lab_count_none}"]
-                            else:
-                                if lab_count_off == 0 and not lab_count_on == 0:
-                                    count = [f"Onshore:{lab_count_on}"]
-                                elif lab_count_on == 0 and not lab_count_off == 0:
-                                    count = [f"Offshore:{lab_count_off}"]
-                                else:
-                                    count = [f"Offshore:{lab_count_off}, Onshore:{lab_count_on}"]
-                        table_results_2.loc[-1] = [table,'','','','','']
-                        table_results_2.index = table_results_2.index + 1
-                        table_results_2.sort_index(inplace=True)
-                        table_results = pd.concat([table_results, table_results_2])
-                    type_list = []
-                    type_list.append(str(table))
-                    for x in range(0,len(count)):
-                        type_list.append(count[x])
-                    all_results.append(type_list)
-
-                    self.results_with_samp_and_type = pd.concat([self.results_with_samp_and_type, table_results])
-
+                    frames[table] = self.lab_results(table, type_field)
                 except Exception as e:
                     error_tables.append(str(e))
 
+        if frames:
+            results = pd.concat([frame[['TYPE','LAB']] for frame in frames.values()], ignore_index=True)
+            sizes = [len(frame) for frame in frames.values()]
+            results['GROUP'] = pd.Categorical.from_codes(np.repeat(np.arange(len(frames)), sizes), categories=list(frames))
+
+            # Lab is counted over every row: "Offshore", blank for none, anything else (including missing) is an onshore lab
+            lab_counts = results.groupby(['GROUP','LAB'], observed=True, dropna=False).size()
+            lab_values = lab_counts.index.get_level_values('LAB')
+            lab_kind = np.where(lab_values == 'Offshore', 'Offshore', np.where(lab_values == '', 'None', 'Onshore'))
+            lab_counts = lab_counts.groupby([lab_counts.index.get_level_values('GROUP'), lab_kind], observed=True).sum().unstack(fill_value=0)
+            lab_counts = lab_counts.reindex(columns=['Offshore','Onshore','None'], fill_value=0)
+
+            # Tests are counted by type, GRAT once per sample and type rather than per sieve size
+            results['COUNTED'] = True
+            if 'GRAT' in frames:
+                start = sum(sizes[:list(frames).index('GRAT')])
+                results.loc[start:start + len(frames['GRAT']) - 1, 'COUNTED'] = ~frames['GRAT'].duplicated(['POINT','ID','REF','DEPTH','TYPE']).to_numpy()
+            type_counts = results.groupby(['GROUP','TYPE'], observed=True)['COUNTED'].sum()
+            type_counts = {table: counts.droplevel(0) for table, counts in type_counts.groupby(level=0, observed=True)}
+
+            listed = []
+            for table, frame in frames.items():
+                off, on, none = (int(lab_counts.at[table, kind]) for kind in ['Offshore','Onshore','None'])
+                if not none == 0:
+                    labs = f"Offshore:{off}, Onshore:{on}, None:{none}"
+                elif off == 0 and not on == 0:
+                    labs = f"Onshore:{on}"
+                elif on == 0 and not off == 0:
+                    labs = f"Offshore:{off}"
+                else:
+                    labs = f"Offshore:{off}, Onshore:{on}"
+
+                if self.lab_test_types[table]:
+                    # Most common test types first, e.g. [('UU', [12]), ('CU', [3])]
+                    counts = type_counts.get(table, pd.Series(dtype='int64')).sort_values(ascending=False)
+                    count = [(test_type, [int(n)]) for test_type, n in counts.items()]
+                    if table == 'GRAT' and not none == 0:
+                        labs = f"Onshore:{frame[['ID','DEPTH']].drop_duplicates().shape[0]}"
+                    labs = f"{count}, {labs}"
+                all_results.append([table, labs])
+
+                # Every result is listed under a row with its group name, numbered by its row in the group
+                if table in self.lab_unique_results:
+                    frame = frame[~frame.duplicated()]
+                listed += [pd.DataFrame([[table,'','','','','']], columns=frame.columns, index=[0]), frame]
+
+            self.results_with_samp_and_type = pd.concat(listed)
+            self.results_with_samp_and_type.columns = range(6)
+
         if error_tables != []:
             print(f"Table(s) not found:  {str(error_tables)}")
 
@@ -464,6 +510,18 @@ Saving AGS file...
         self._enable_results_export.emit(True)
         self._enable.emit()
 
+    def lab_results(self, table, type_field):
+        '''The sample, test type and lab of each result in a lab group, numbered from 1 below its UNIT and TYPE rows'''
+        df = AGS4.untype_numeric_columns(self.tables[table]).iloc[2:]
+        columns = {'POINT': df['LOCA_ID'], 'ID': df['SAMP_ID'], 'REF': df['SPEC_REF'], 'DEPTH': df['SPEC_DPTH'],
+                   'TYPE': df[type_field] if type_field else ''}
+        if df.empty:
+            raise ValueError(f"No results in {table}")
+        lab_field = [col for col in df.columns if 'LAB' in col]
+        columns['LAB'] = df[lab_field[0]] if lab_field else ''
+        return pd.DataFrame({name: col.to_numpy() if isinstance(col, pd.Series) else col for name, col in columns.items()},
+                            index=pd.RangeIndex(1, len(df) + 1))
+
         
     def export_results(self):
         self._disable.emit()
@@ -583,7 +641,8 @@ Check the AGS with "View data".''')
         if fname[0] == '':
             return
 
-        final_dataframes = [(k,v) for (k,v) in self.tables.items() if not v.empty]
+        # Typed numeric columns are written as the text in the AGS file, e.g. 1.50 rather than 1.5
+        final_dataframes = [(k,AGS4.untype_numeric_columns(v)) for (k,v) in self.tables.items() if not v.empty]
         final_dataframes = dict(final_dataframes)
         empty_dataframes = [k for (k,v) in self.tables.items() if v.empty]
 
@@ -644,6 +703,7 @@ class DataframeProcessor:
             return first_row, first_col
 
     def fill_df(self, df, table):
+        df = AGS4.untype_numeric_columns(df)
         df.replace([None, ''], np.nan, inplace=True)
 
         def convert_float_ints(col): # need vals as nan to use ffill(), but adding nan to cols with ints and empty strings turns col to float - this will convert floats to int in those cols
@@ -675,6 +735,7 @@ class DataframeProcessor:
         table.model().layoutChanged.emit()
 
     def replace_df(self, df, table, find_text, replace_text, df_radio, col_radio, cell_radio):
+        df = AGS4.untype_numeric_columns(df, self.edited_columns(df, table, df_radio, col_radio, cell_radio))
         if not cell_radio:
             df_head = df.iloc[:2].copy()
             df = df.iloc[2:].copy()
@@ -715,6 +776,8 @@ class DataframeProcessor:
         table.model().layoutChanged.emit()
 
     def format_df(self, df, table, decimal_places, df_radio, col_radio, cell_radio):
+        # Rounded entries are saved as rounded here, rather than in the format of the TYPE of a typed numeric column
+        df = AGS4.untype_numeric_columns(df, self.edited_columns(df, table, df_radio, col_radio, cell_radio))
         if not cell_radio:
             df_head = df.iloc[:2].copy()
             df = df.iloc[2:].copy()
@@ -755,6 +818,7 @@ class DataframeProcessor:
         if not column:
             return
 
+        df = AGS4.untype_numeric_columns(df, [column])
         split_columns = df[column].str.split(delimiter, expand=True)
 
         if split_columns.shape[1] > 1:
@@ -917,6 +981,15 @@ class DataframeProcessor:
         return False
 
 
+    def edited_columns(self, df, table, df_radio, col_radio, cell_radio):
+        # Typed numeric columns (see [Load] typed_numeric) are turned back into text before they are edited as text
+        if df_radio:
+            return None
+        if col_radio:
+            return self.get_current_columns_multiple(table) or []
+        cell_iloc = self.get_current_cell_iloc(table)
+        return [df.columns[col] for (row, col) in cell_iloc] if cell_iloc else []
+
     def get_current_cell_iloc(self, table):
         indexes = table.selectionModel().selectedIndexes()
         if not indexes:
@@ -0,0 +1,209 @@
+import contextlib
+import io
+import logging
+import random
+import warnings
+
+import pandas as pd
+import pytest
+from python_ags4 import check
+
+import common.AGS4_package_edit as AGS4
+from common import check_package_edit as check_edit
+
+# The rules in common.check_package_edit must give exactly the same errors, with the same
+# line numbers and in the same order, as the python_ags4 rules they replace
+
+HEADER = '''"GROUP","PROJ"
+"HEADING","PROJ_ID","PROJ_NAME","PROJ_LOC","PROJ_CLNT","PROJ_CONT","PROJ_ENG","PROJ_MEMO","FILE_FSET"
+"UNIT","","","","","","","",""
+"TYPE","ID","X","X","X","X","X","X","X"
+"DATA","121415","ACME Gas Works Redevelopment","Anytown","ACME Enterprises","ACME Drilling Ltd","","",""
+
+"GROUP","TRAN"
+"HEADING","TRAN_ISNO","TRAN_DATE","TRAN_PROD","TRAN_STAT","TRAN_DESC","TRAN_AGS","TRAN_RECV","TRAN_DLIM","TRAN_RCON","TRAN_REM","FILE_FSET"
+"UNIT","","yyyy-mm-dd","","","","","","","","",""
+"TYPE","X","DT","X","X","X","X","X","X","X","X","X"
+"DATA","1","2021-01-01","ACME","DRAFT","","4.1","Client","|","+","",""
+
+"GROUP","UNIT"
+"HEADING","UNIT_UNIT","UNIT_DESC","UNIT_REM","FILE_FSET"
+"UNIT","","","",""
+"TYPE","X","X","X","X"
+"DATA","m","metre","",""
+"DATA","yyyy-mm-dd","year month day","",""
+"DATA","%","percent","",""
+
+"GROUP","TYPE"
+"HEADING","TYPE_TYPE","TYPE_DESC","FILE_FSET"
+"UNIT","","",""
+"TYPE","X","X","X"
+"DATA","ID","Unique Identifier",""
+"DATA","X","Text",""
+"DATA","DT","Date time",""
+"DATA","2DP","Value; 2 decimal places",""
+"DATA","PA","Text listed in ABBR Group",""
+"DATA","0DP","Value; 0 decimal places",""
+
+"GROUP","ABBR"
+"HEADING","ABBR_HDNG","ABBR_CODE","ABBR_DESC","ABBR_LIST","ABBR_REM","FILE_FSET"
+"UNIT","","","","","",""
+"TYPE","X","X","X","X","X","X"
+"DATA","SAMP_TYPE","U","Undisturbed","","",""
+"DATA","SAMP_TYPE","B","Bulk","","",""
+"DATA","LOCA_TYPE","CP","Cable percussion","","",""
+'''
+
+# Headings, UNIT and TYPE of the groups filled with random rows
+GROUPS = {
+    'LOCA': (['LOCA_ID', 'LOCA_TYPE', 'LOCA_NATE', 'LOCA_NATN'],
+             ['', '', 'm', 'm'],
+             ['ID', 'PA', '2DP', '2DP']),
+    'SAMP': (['LOCA_ID', 'SAMP_TOP', 'SAMP_REF', 'SAMP_TYPE', 'SAMP_ID', 'SAMP_REM', 'SAMP_XXXX'],
+             ['', 'm', '', '', '', '', ''],
+             ['ID', '2DP', 'X', 'PA', 'ID', 'X', 'X']),
+    'LNMC': (['LOCA_ID', 'SAMP_TOP', 'SAMP_REF', 'SAMP_TYPE', 'SAMP_ID', 'SPEC_REF', 'SPEC_DPTH', 'LNMC_MC'],
+             ['', 'm', '', '', '', '', 'm', '%'],
+             ['ID', '2DP', 'X', 'PA', 'ID', 'X', '2DP', '0DP']),
+}
+
+# Entries, TYPEs and UNITs that the rules treat differently
+VALUES = ['', '1', '1.0', '1.00', '-1.23', '0', '0.0', '-0', 'abc', '1e3', '1.2E+03', '1.23e-4', '12:30', '123:45:59',
+          '12:60', '99:59:59', '2020-01-01', '2020-13-01', '2020-01-01T12:00', '2020-01-01T12:00:00Z+01:00', 'Y', 'N', 'y',
+          'x', '10:30:15.5', '-10:30:15', 'A', 'B', 'U', 'CP', 'A+B', 'C+A', 'U+B', '?', '  ', '1.', '0.1230', '0.00123',
+          '123000', '1.5e-10', 'nan', 'NaN', '1,0', 'A+', '+']
+TYPES = ['2DP', '0DP', '1DP', '3DP', '2SF', '3SF', '1SCI', '2SCI', 'DT', 'T', 'U', 'YN', 'DMS', 'ID', 'PA', 'X', 'XN']
+UNITS = ['', 'yyyy-mm-dd', 'hh:mm', 'hh:mm:ss', 'mm:ss', 'yyyy-mm-ddThh:mm', 'yyyy-mm-ddThh:mm:ssZ+hh:mm', 'm']
+
+# A few of each key field, so that random rows have duplicate keys and missing parents
+LOCA_IDS = ['BH1', 'BH2', 'BH3', 'BH4']
+DEPTHS = ['1.00', '2.00', '3.50', '3.5']
+REFS = ['1', '2', '3']
+SAMP_TYPES = ['U', 'B', 'D']
+
+
+def _line(entries):
+    return ','.join(f'"{entry}"' for entry in entries)
+
+
+def _random_row(rng, group):
+    headings = GROUPS[group][0]
+    row = {'LOCA_ID': rng.choice(LOCA_IDS), 'LOCA_TYPE': rng.choice(['CP', 'RC']), 'SAMP_TOP': rng.choice(DEPTHS),
+           'SAMP_REF': rng.choice(REFS), 'SAMP_TYPE': rng.choice(SAMP_TYPES), 'SPEC_REF': rng.choice(REFS),
+           'SPEC_DPTH': rng.choice(DEPTHS)}
+    return [row[heading] if heading in row else rng.choice(VALUES) for heading in headings]
+
+
+def random_ags(rng):
+    """AGS4 text with the standard groups above and LOCA, SAMP and LNMC filled with random rows."""
+    lines = [HEADER]
+    for group, (headings, units, types) in GROUPS.items():
+        lines.append(_line(['GROUP', group]))
+        lines.append(_line(['HEADING'] + headings))
+        lines.append(_line(['UNIT'] + units))
+        lines.append(_line(['TYPE'] + types))
+        for _ in range(rng.randint(0, 12)):
+            lines.append(_line(['DATA'] + _random_row(rng, group)))
+        lines.append('')
+    return '\n'.join(lines) + '\n'
+
+
+def mutate(rng, tables, headings):
+    """Change the TYPE, UNIT and entries of the random groups in place, as edits in the GUI would, and sometimes
+    repeat rows, change TRAN_RCON or drop whole groups."""
+    for group in GROUPS:
+        if group not in tables:
+            continue
+        df = tables[group]
+        columns = headings[group][1:-1]
+        for col in columns:
+            if rng.random() < 0.6:
+                df.loc[df['HEADING'] == 'TYPE', col] = rng.choice(TYPES)
+            if rng.random() < 0.4:
+                df.loc[df['HEADING'] == 'UNIT', col] = rng.choice(UNITS)
+
+        data = df.index[df['HEADING'] == 'DATA']
+        if len(data):
+            for _ in range(rng.randint(0, 30)):
+                df.loc[rng.choice(data), rng.choice(columns)] = rng.choice(VALUES)
+            if rng.random() < 0.3:
+                row = df.loc[[rng.choice(data)]].copy()
+                row['line_number'] = 999
+                tables[group] = pd.concat([df, row], ignore_index=True)
+
+    if rng.random() < 0.3:
+        tables['TRAN'].loc[tables['TRAN']['HEADING'] == 'DATA', 'TRAN_RCON'] = rng.choice(['+', '', ';'])
+    for group in ['ABBR', 'LOCA', 'SAMP']:
+        if rng.random() < 0.1:
+            tables.pop(group, None)
+            headings.pop(group, None)
+
+
+def compare_rules(tables, headings, line_numbers):
+    """Run each rule in common.check_package_edit and the python_ags4 rule it replaces on the same tables,
+    returning the errors of both as {rule: (local, original)}."""
+    results = {}
+    with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter('ignore')
+        dictionary = check.combine_DICT_tables(AGS4.load_dictionary('4.1.1').tables, tables)
+        arguments = {'rule_8': (tables, headings, line_numbers),
+                     'rule_10a': (tables, headings, dictionary, line_numbers),
+                     'rule_10c': (tables, headings, dictionary, line_numbers),
+                     'rule_16': (tables, headings, dictionary)}
+
+        for rule in check_edit.RULES:
+            # Each gets its own copy, in case either one changes the tables it is given
+            args = tuple({k: v.copy() for k, v in arg.items()} if arg is tables else arg for arg in arguments[rule])
+            local = getattr(check_edit, rule)(*args, ags_errors={})
+            args = tuple({k: v.copy() for k, v in arg.items()} if arg is tables else arg for arg in arguments[rule])
+            original = getattr(check, rule)(*args, ags_errors={})
+            results[rule] = (local, original)
+    return results
+
+
+def load(text):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return AGS4.AGS4_to_dataframe(io.StringIO(text), get_line_numbers=True)
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def assert_same_errors(results):
+    for rule, (local, original) in results.items():
+        # Line numbers and messages first, so that a failure shows what is different
+        lines = {group: [(error['line'], error['desc']) for error in errors] for group, errors in local.items()}
+        expected = {group: [(error['line'], error['desc']) for error in errors] for group, errors in original.items()}
+        assert lines == expected, rule
+        assert local == original, rule
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_random_tables(seed):
+    rng = random.Random(seed)
+    tables, headings, line_numbers = load(random_ags(rng))
+    assert_same_errors(compare_rules(tables, headings, line_numbers))
+
+
+@pytest.mark.parametrize('seed', range(120))
+def test_mutated_tables(seed):
+    rng = random.Random(seed)
+    tables, headings, line_numbers = load(random_ags(rng))
+    mutate(rng, tables, headings)
+    assert_same_errors(compare_rules(tables, headings, line_numbers))
+
+
+def test_errors_are_found():
+    # The random tables have to give errors in each rule, or the tests above would pass without checking anything
+    found = {rule: 0 for rule in check_edit.RULES}
+    for seed in range(40):
+        rng = random.Random(seed)
+        tables, headings, line_numbers = load(random_ags(rng))
+        mutate(rng, tables, headings)
+        for rule, (local, original) in compare_rules(tables, headings, line_numbers).items():
+            found[rule] += sum(len(errors) for errors in original.values())
+    assert all(found.values()), found